@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""Benchmarks for the shader switcher's hot paths on synthetic shader libraries.
+
+Runs headless: everything lives in a scratch HOME, Ghostty is replaced by a fake
+/proc root, and the GTK-side benchmarks only need GObject/Gio (no display). When
+PyGObject is missing those benchmarks are reported as skipped.
+
+    shader-bench.py --sizes 10,1000 --output before.json
+    shader-bench.py --sizes 10,1000 --compare before.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import queue
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_SIZES = (10, 1000, 10000, 50000)
+DEFAULT_CONFIG_LINES = (10, 1000, 10000, 100000)
+SEARCH_QUERIES = ("itime", "texture blur", "crt", "scanline glow", "crtblm")
+
+SHADER_TEMPLATE = """// {name} - generated benchmark shader
+// Knobs: strength={strength} radius={radius}
+#define STRENGTH {strength}
+#define RADIUS {radius}
+
+{helpers}
+void mainImage(out vec4 fragColor, in vec2 fragCoord) {{
+    vec2 uv = fragCoord / iResolution.xy;
+    vec4 color = texture(iChannel0, uv);
+{body}
+    fragColor = color;
+}}
+"""
+
+HELPER_TEMPLATE = """float {fn}(vec2 p, float t) {{
+    // helper {i}: {flavour}
+    float v = sin(p.x * {a:.2f} + t) * cos(p.y * {b:.2f} - t);
+    return smoothstep(0.0, 1.0, v * STRENGTH);
+}}
+"""
+
+BODY_LINES = (
+    "    color.rgb += {fn}(uv, iTime) * 0.{k};",
+    "    color += texture(iChannel0, uv + vec2({a:.3f}, 0.0) / iResolution.xy) * 0.1;",
+    "    color.rgb *= 1.0 - 0.{k} * sin(uv.y * iResolution.y * 3.14159);",
+    "    for (int i = 0; i < {n}; i++) {{ color += texture(iChannel0, uv + float(i) * RADIUS / iResolution.xy) * 0.01; }}",
+)
+FLAVOURS = ("scanline", "bloom", "glow", "blur", "crt", "vignette", "noise", "chromatic")
+
+
+def generate_library(directory, count, rng):
+    """Write count shaders of roughly 1-12 KB each"""
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        flavour = rng.choice(FLAVOURS)
+        name = f"{flavour}_{index:05d}.glsl"
+        helper_count = rng.randint(1, 20)
+        helpers = "\n".join(
+            HELPER_TEMPLATE.format(fn=f"{flavour}{i}", i=i, flavour=rng.choice(FLAVOURS),
+                                   a=rng.uniform(1, 40), b=rng.uniform(1, 40))
+            for i in range(helper_count))
+        body = "\n".join(
+            rng.choice(BODY_LINES).format(fn=f"{flavour}{rng.randrange(helper_count)}", k=rng.randint(1, 9),
+                                          a=rng.uniform(-2, 2), n=rng.randint(2, 16))
+            for _ in range(rng.randint(2, 30)))
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(SHADER_TEMPLATE.format(name=name, strength=rng.randint(1, 9), radius=rng.randint(1, 8),
+                                           helpers=helpers, body=body))
+
+
+def generate_config(path, lines, shader_path, rng):
+    keys = ("font-size", "cursor-style", "background-opacity", "window-padding-x", "keybind")
+    content = [f"# generated benchmark config, {lines} lines"]
+    shader_line = lines // 2
+    for i in range(1, lines):
+        if i == shader_line:
+            content.append(f'custom-shader = "{shader_path}"')
+        elif i % 7 == 0:
+            content.append(f"# comment {i}")
+        else:
+            content.append(f"{rng.choice(keys)} = {rng.randint(0, 100)}")
+    with open(path, 'w') as f:
+        f.write("\n".join(content) + "\n")
+
+
+def summarize(name, params, samples):
+    samples_ms = sorted(s * 1000 for s in samples)
+    return {
+        "name": name,
+        "params": params,
+        "unit": "ms",
+        "runs": len(samples_ms),
+        "min": round(samples_ms[0], 4),
+        "median": round(statistics.median(samples_ms), 4),
+        "mean": round(statistics.fmean(samples_ms), 4),
+        "p95": round(samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))], 4),
+    }
+
+
+def measure(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class Bench:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.results = []
+        self.skipped = []
+        self.rng = random.Random(args.seed)
+
+        # shaderlib resolves every path from HOME at import time, so point it at the scratch tree first
+        os.environ["HOME"] = workdir
+        sys.path.insert(0, HERE)
+        import shaderlib
+        self.lib = shaderlib
+        self.gui = self._load_gui()
+
+        proc_root = os.path.join(workdir, "proc")
+        os.makedirs(os.path.join(proc_root, "4242"), exist_ok=True)
+        with open(os.path.join(proc_root, "4242", "comm"), 'w') as f:
+            f.write("ghostty\n")
+        self.signals = []
+        self.tracker = shaderlib.GhosttyProcessTracker(proc_root, kill=lambda pid, sig: self.signals.append(sig))
+
+    def _load_gui(self):
+        try:
+            spec = importlib.util.spec_from_file_location("shader_switch", os.path.join(HERE, "shader-switch.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            return module
+        except (ImportError, ValueError) as e:
+            print(f"GTK benchmarks skipped: {e}", file=sys.stderr)
+            return None
+
+    def record(self, name, params, samples):
+        result = summarize(name, params, samples)
+        self.results.append(result)
+        print(f"  {name:<34} {json.dumps(params):<24} median {result['median']:10.3f} ms  "
+              f"p95 {result['p95']:10.3f} ms", file=sys.stderr)
+
+    def skip(self, name, reason):
+        self.skipped.append({"name": name, "reason": reason})
+
+    # --- Library-size benchmarks ---
+
+    def run_library(self, size):
+        print(f"library: {size} shaders", file=sys.stderr)
+        shader_dir = os.path.join(self.workdir, f"lib-{size}")
+        if not os.path.isdir(shader_dir):
+            generate_library(shader_dir, size, self.rng)
+        params = {"shaders": size}
+        repeat = self.args.repeat if size <= 10000 else max(1, self.args.repeat // 3)
+        cache_path = os.path.join(self.workdir, f"cache-{size}.json")
+
+        def clear_cache():
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+        self.record("scan_cold", params, measure(lambda: self._scan(shader_dir, cache_path), repeat, clear_cache))
+        self._scan(shader_dir, cache_path)
+        self.record("scan_warm", params, measure(lambda: self._scan(shader_dir, cache_path), repeat))
+
+        index = self.lib.ShaderIndex(cache_path)
+        metas = [(e.name, e.path, index.lookup(e.path)) for e in os.scandir(shader_dir)]
+        search_index = self.lib.ShaderSearchIndex()
+
+        def build_search():
+            search_index.__init__()
+            for name, path, meta in metas:
+                search_index.add(path, name, meta["hash"], meta["tokens"])
+        self.record("search_index_build", params, measure(build_search, repeat))
+        for query in SEARCH_QUERIES:
+            self.record("search_query", {**params, "query": query},
+                        measure(lambda: search_index.search(query), self.args.repeat))
+
+        if self.gui is None:
+            for name in ("ShaderItem", "refresh_all_lists", "on_search_changed"):
+                self.skip(name, "PyGObject not available")
+            return
+        self.record("ShaderItem_cached", params,
+                    measure(lambda: [self.gui.ShaderItem(n, p, m) for n, p, m in metas], repeat))
+        self.record("ShaderItem_uncached", params,
+                    measure(lambda: [self.gui.ShaderItem(n, p) for n, p, _ in metas], repeat))
+
+        app = self._headless_app(shader_dir, cache_path)
+        app.all_shader_items = []
+        self.record("refresh_all_lists_first", params, measure(lambda: self._refresh(app), 1))
+        self.record("refresh_all_lists", params, measure(lambda: self._refresh(app), repeat))
+        for query in SEARCH_QUERIES:
+            entry = FakeEntry(query)
+
+            def search(entry=entry):
+                app._search_term = ""
+                app.on_search_changed(entry)
+                self.gui.GLib.source_remove(app._search_source)
+                app._run_search()
+                app.all_model.get_n_items()
+            self.record("on_search_changed", {**params, "query": query}, measure(search, self.args.repeat))
+        app.shader_scanner.shutdown()
+
+    def _scan(self, shader_dir, cache_path):
+        library = self.lib.ShaderLibrary(self.lib.ShaderIndex(cache_path), root=shader_dir)
+        scanner = self.lib.ShaderScanner(library)
+        done = queue.Queue()
+        scanner.scan(library.local, lambda fn, *a: fn(*a), lambda *a: None, lambda *a: done.put(a))
+        done.get()
+        scanner.shutdown()
+
+    def _headless_app(self, shader_dir, cache_path):
+        gui = self.gui
+        gui.SHADER_DIR = shader_dir
+
+        class HeadlessSwitcher(gui.ShaderSwitcher):
+            def update_status_label(self):
+                pass
+
+            def show_toast(self, message, is_error=False, timeout=None):
+                pass
+
+        app = HeadlessSwitcher()
+        app.settings = {"smart_reload": True}
+        app.shader_index = self.lib.ShaderIndex(cache_path)
+        app.library = self.lib.ShaderLibrary(app.shader_index, root=shader_dir)
+        app.shader_scanner = self.lib.ShaderScanner(app.library)
+        app.ghostty_tracker = self.tracker
+        app.scan_progress = app.scan_revealer = NullWidget()
+        return app
+
+    def _refresh(self, app):
+        loop = self.gui.GLib.MainLoop()
+        original = app._on_scan_done
+
+        def on_done(*args):
+            original(*args)
+            loop.quit()
+            return False
+        app._on_scan_done = on_done
+        app.refresh_all_lists()
+        loop.run()
+        app._on_scan_done = original
+
+    # --- Config-size benchmarks ---
+
+    def run_config(self, lines):
+        print(f"config: {lines} lines", file=sys.stderr)
+        params = {"config_lines": lines}
+        config_path = self.lib.CONFIG_PATH
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        shader_path = os.path.join(self.lib.SHADER_DIR, "crt.glsl")
+        generate_config(config_path, lines, shader_path, self.rng)
+
+        paths = [shader_path, os.path.join(self.lib.SHADER_DIR, "bloom.glsl")]
+        self.record("write_shader_config", params,
+                    measure(lambda: self.lib.write_shader_config(random.choice(paths), config_path), self.args.repeat))
+        self.record("config_current_shader_cold", params,
+                    measure(lambda: self.lib.GhosttyConfig(config_path).current_shader(), self.args.repeat))
+        config = self.lib.GhosttyConfig(config_path)
+        config.current_shader()
+        self.record("config_current_shader_cached", params,
+                    measure(config.current_shader, self.args.repeat))
+
+        if self.gui is None:
+            for name in ("_write_shader_to_config_safe", "get_current_shader_from_config"):
+                self.skip(name, "PyGObject not available")
+            return
+        app = self._headless_app(self.lib.SHADER_DIR, os.path.join(self.workdir, "cache-config.json"))
+        self.record("_write_shader_to_config_safe", params,
+                    measure(lambda: app._write_shader_to_config_safe(random.choice(paths)), self.args.repeat))
+        self.record("get_current_shader_from_config", params,
+                    measure(app.get_current_shader_from_config, self.args.repeat))
+        app.shader_scanner.shutdown()
+
+    # --- Watcher ---
+
+    def run_watcher(self):
+        if self.gui is None:
+            self.skip("watcher_reaction", "PyGObject not available")
+            return
+        print("watcher", file=sys.stderr)
+        GLib = self.gui.GLib
+        shader_dir = os.path.join(self.workdir, "watched")
+        os.makedirs(shader_dir, exist_ok=True)
+        loop = GLib.MainLoop()
+        state = {}
+
+        def on_changes(changes):
+            state["latency"] = time.perf_counter() - state["start"]
+            loop.quit()
+
+        watcher = self.gui.ShaderWatcher(on_changes)
+        watcher.start_watching()
+        watcher.watch_source(self.lib.DirectorySource(shader_dir))
+        samples = []
+        for i in range(self.args.repeat):
+            state["start"] = time.perf_counter()
+            with open(os.path.join(shader_dir, f"edit_{i % 3}.glsl"), 'w') as f:
+                f.write(f"// edit {i}\n")
+            GLib.timeout_add(2000, loop.quit)
+            loop.run()
+            if "latency" in state:
+                samples.append(state.pop("latency"))
+        watcher.stop_watching()
+        if samples:
+            self.record("watcher_reaction", {"coalesce_ms": watcher.COALESCE_MS}, samples)
+
+
+class FakeEntry:
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+
+class NullWidget:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def compare(results, baseline_path, threshold):
+    """Print median deltas against a previous run; returns the number of regressions"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    key = lambda r: (r["name"], json.dumps(r["params"], sort_keys=True))
+    previous = {key(r): r for r in baseline.get("results", [])}
+    regressions = 0
+    print(f"Compared with {baseline_path}:", file=sys.stderr)
+    for result in results:
+        old = previous.get(key(result))
+        if not old or not old["median"]:
+            continue
+        change = (result["median"] - old["median"]) / old["median"]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {result['name']:<34} {json.dumps(result['params']):<24} {old['median']:10.3f} -> "
+              f"{result['median']:10.3f} ms ({change:+.1%}){flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Ghostty shader switcher on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated shader library sizes")
+    parser.add_argument("--config-lines", default=",".join(map(str, DEFAULT_CONFIG_LINES)),
+                        help="comma-separated Ghostty config sizes in lines")
+    parser.add_argument("--repeat", type=int, default=9, help="samples per benchmark")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON results to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative median slowdown reported as a regression")
+    parser.add_argument("--keep", action="store_true", help="keep the generated scratch directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="shader-bench-")
+    try:
+        bench = Bench(args, workdir)
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            bench.run_library(size)
+        for lines in (int(s) for s in args.config_lines.split(",") if s):
+            bench.run_config(lines)
+        bench.run_watcher()
+    finally:
+        if args.keep:
+            print(f"Scratch data kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "gtk": bench.gui is not None,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": bench.results,
+        "skipped": bench.skipped,
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    if args.compare:
+        return 1 if compare(bench.results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
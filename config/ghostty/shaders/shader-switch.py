@@ -1,122 +1,482 @@
 #!/usr/bin/env python3
+import sys
+import time
+_STARTUP_T0 = time.perf_counter()
+
+from shaderlib import CLI_COMMANDS, run_cli
+
+# The command line never needs GTK, so dispatch before the GUI imports anything
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS + ("-h", "--help"):
+    sys.exit(run_cli(sys.argv[1:]))
+
 import os
 import signal
-import json
 import subprocess
 import random
 import shutil
-import threading
-import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
-import sys
 
 import gi
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 from gi.repository import Gtk, Gio, GLib, Adw, Gdk, GObject
 
+from shaderlib import (
+    SHADER_DIR, CONFIG_PATH,
+    SHADER_EXTENSIONS, PACK_EXTENSIONS, RECENT_LIMIT, ANIMATION_CONFIG_KEY, POWER_SUPPLY_ROOT,
+    ShaderIndex, ShaderLibrary, library_sources, ShaderSearchIndex, ShaderScanner, ShaderValidator, ThumbnailRenderer, ShaderProfiler,
+    GhosttyConfig, GhosttyProcessTracker, PowerSupply, PowerPolicy, ShaderBuilder, ShaderBuildError, UsageHistory,
+    StateStore, find_duplicates, pick_survivor, consolidate_duplicates, SnapshotStore, format_size,
+    snapshot_retention,
+    write_shader_config, shader_animation, shader_animated, power_policy, open_uevent_socket, drain_uevents,
+    combine_animation, stack_cost, match_stack, random_weighting,
+)
+
 # --- Configuration ---
 APP_ID = "com.github.vanilla.GhosttyShaderSwitcher"
-CONFIG_DIR = os.path.expanduser("~/.config/ghostty-shader-switcher")
-SHADER_DIR = os.path.expanduser("~/.config/ghostty/shaders")
-CONFIG_PATH = os.path.expanduser("~/.config/ghostty/config")
-FAVORITES_PATH = os.path.join(CONFIG_DIR, "favorites.json")
-RECENT_PATH = os.path.join(CONFIG_DIR, "recent.json")
-APP_SETTINGS_PATH = os.path.join(CONFIG_DIR, "settings.json")
-SHADER_CACHE_PATH = os.path.join(CONFIG_DIR, "shader_cache.json")
-GHOSTTY_CONFIG_KEY = "custom-shader"
+STARTUP_PROFILE_ENV = "SHADER_SWITCH_PROFILE_STARTUP"
+SEARCH_DEBOUNCE_MS = 120
+LIVE_BROWSE_DEBOUNCE_MS = 350
+THUMBNAIL_MEMORY_LIMIT = 256
+POWER_SETTLE_MS = 500
+
+class StartupTimer:
+    """Startup phase breakdown, printed to stderr when SHADER_SWITCH_PROFILE_STARTUP is set.
+
+    A numeric value is treated as a budget in milliseconds for reaching an interactive window.
+    """
+    def __init__(self, t0):
+        value = os.environ.get(STARTUP_PROFILE_ENV, "")
+        self.enabled = bool(value)
+        self.budget_ms = float(value) if value.replace(".", "", 1).isdigit() else None
+        self.t0 = t0
+        self.marks = []
+        self.reported = False
+
+    def mark(self, label):
+        if self.enabled:
+            self.marks.append((label, time.perf_counter()))
+
+    def report(self, interactive_label):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        previous = self.t0
+        lines = ["Startup breakdown (ms):"]
+        for label, t in self.marks:
+            lines.append(f"  {label:<28} {(t - previous) * 1000:8.1f} {(t - self.t0) * 1000:9.1f}")
+            previous = t
+        interactive = next((t for label, t in self.marks if label == interactive_label), None)
+        if interactive is not None and self.budget_ms is not None:
+            elapsed = (interactive - self.t0) * 1000
+            verdict = "within" if elapsed <= self.budget_ms else "OVER"
+            lines.append(f"  {interactive_label}: {elapsed:.1f} ms, {verdict} the {self.budget_ms:.0f} ms budget")
+        print("\n".join(lines), file=sys.stderr)
 
 
 class ShaderItem(GObject.Object):
     __gtype_name__ = "ShaderItem"
     name = GObject.Property(type=str)
     path = GObject.Property(type=str)
+    source = GObject.Property(type=str, default="")
+    packed = GObject.Property(type=bool, default=False)
     size_str = GObject.Property(type=str)
     modified_str = GObject.Property(type=str)
     is_favorite = GObject.Property(type=bool, default=False)
     is_active = GObject.Property(type=bool, default=False)
     preview_text = GObject.Property(type=str, default="")
-
-    def __init__(self, name, path):
+    content_hash = GObject.Property(type=str, default="")
+    normalized_hash = GObject.Property(type=str, default="")
+    validation = GObject.Property(type=str, default="")
+    validation_message = GObject.Property(type=str, default="")
+    render_cost = GObject.Property(type=float, default=-1.0)
+    cost_score = GObject.Property(type=int, default=-1)
+    cost_tier = GObject.Property(type=str, default="")
+    animated = GObject.Property(type=bool, default=False)
+    includes = GObject.Property(type=bool, default=False)
+    multi_tap_blur = GObject.Property(type=bool, default=False)
+
+    def __init__(self, name, path, meta=None, source=None):
         super().__init__()
         self.name = name
         self.path = path
-        try:
-            stat = os.stat(path)
-            self.size_str = f"{stat.st_size / 1024:.1f} KB"
-            self.modified_str = datetime.fromtimestamp(stat.st_mtime).strftime("%d %b %Y")
-            
-            # Cache shader preview
+        if source is not None:
+            # Pack members have no file of their own until they are applied
+            self.source = source.key
+            self.packed = not source.writable
+        if meta is None:
             try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()[:5]  # First 5 lines for preview
-                    self.preview_text = ''.join(lines).strip()
-            except:
-                self.preview_text = "Preview unavailable"
-        except FileNotFoundError:
+                meta = ShaderIndex.read_metadata(path, os.stat(path))
+            except OSError:
+                meta = None
+        self.apply_metadata(meta)
+
+    def apply_metadata(self, meta):
+        """Copy index metadata onto the item, touching only properties that changed"""
+        if meta is None:
             self.size_str = "N/A"
             self.modified_str = "File not found"
             self.preview_text = "File not found"
+            self.content_hash = ""
+            self.normalized_hash = ""
+            return
+        analysis = meta.get("analysis") or {}
+        for prop, value in (("size_str", meta["size_str"]), ("modified_str", meta["modified_str"]),
+                            ("preview_text", meta["preview"]), ("content_hash", meta.get("hash") or ""),
+                            ("normalized_hash", meta.get("normalized_hash") or ""),
+                            ("cost_score", analysis.get("score", -1)), ("cost_tier", analysis.get("tier", "")),
+                            ("animated", analysis.get("animated", False)),
+                            ("includes", analysis.get("includes", False)),
+                            ("multi_tap_blur", analysis.get("blur", False))):
+            if getattr(self, prop) != value:
+                setattr(self, prop, value)
+
+    def apply_validation(self, result):
+        """Show a cached (valid, message) result; None means not validated yet"""
+        validation, message = ("", "") if result is None else ("valid" if result[0] else "invalid", result[1])
+        if self.validation != validation:
+            self.validation = validation
+        if self.validation_message != message:
+            self.validation_message = message
 
 
 class ShaderWatcher:
+    """Event-driven watcher for the shader library and CONFIG_PATH built on Gio.FileMonitor.
+
+    Each library source has its own monitors: one per folder of a directory source, and the
+    archive itself for a pack mounted as an extra root. Shader edits arrive as per-file changes;
+    a changed pack or a new folder asks for a rescan of just that source.
+    """
+    COALESCE_MS = 40
+
     def __init__(self, callback):
         self.callback = callback
         self.watching = False
-        self.last_check = {}
-        
+        self.monitors = []
+        self.source_monitors = {}
+        self.rescan = set()
+        self.include_monitors = {}
+        self.dependency_monitors = {}
+        self.dependencies_changed = set()
+        self.pending = {}
+        self.renamed = []
+        self.config_changed = False
+        self.flush_source = 0
+
     def start_watching(self):
         if self.watching:
             return
         self.watching = True
-        threading.Thread(target=self._watch_loop, daemon=True).start()
-    
+        config_monitor = Gio.File.new_for_path(CONFIG_PATH).monitor_file(
+            Gio.FileMonitorFlags.WATCH_MOVES, None)
+        config_monitor.connect("changed", self._on_config_event)
+        config_monitor.set_rate_limit(self.COALESCE_MS)
+        self.monitors = [config_monitor]
+
+    def watch_source(self, source):
+        """Monitor the folders source's last walk found (or its archive), replacing earlier monitors"""
+        if not self.watching:
+            return
+        if source.writable:
+            wanted = set(source.directories)
+        else:
+            # Packs inside a watched folder are covered by that folder's monitor
+            wanted = set() if source.parent else {source.zip_path}
+        monitors = self.source_monitors.setdefault(source.key, {})
+        for path in list(monitors):
+            if path not in wanted:
+                monitors.pop(path).cancel()
+        for path in wanted - monitors.keys():
+            gfile = Gio.File.new_for_path(path)
+            if source.writable:
+                monitor = gfile.monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+                monitor.connect("changed", self._on_shader_dir_event, source)
+            else:
+                monitor = gfile.monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+                monitor.connect("changed", self._on_pack_event, source)
+            monitor.set_rate_limit(self.COALESCE_MS)
+            monitors[path] = monitor
+
+    def unwatch_source(self, source):
+        for monitor in self.source_monitors.pop(source.key, {}).values():
+            monitor.cancel()
+
+    def watched_directories(self):
+        return {os.path.realpath(path) for monitors in self.source_monitors.values() for path in monitors}
+
+    def watch_config_files(self, paths):
+        """Also monitor files pulled in through config-file includes"""
+        if not self.watching:
+            return
+        wanted = {os.path.abspath(p) for p in paths} - {os.path.abspath(CONFIG_PATH)}
+        for path in list(self.include_monitors):
+            if path not in wanted:
+                self.include_monitors.pop(path).cancel()
+        for path in wanted - self.include_monitors.keys():
+            monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            monitor.set_rate_limit(self.COALESCE_MS)
+            monitor.connect("changed", self._on_config_event)
+            self.include_monitors[path] = monitor
+
+    def watch_dependencies(self, paths):
+        """Also monitor #include files of built shaders that live outside the watched folders"""
+        if not self.watching:
+            return
+        watched = self.watched_directories()
+        wanted = {p for p in paths if os.path.dirname(p) not in watched}
+        for path in list(self.dependency_monitors):
+            if path not in wanted:
+                self.dependency_monitors.pop(path).cancel()
+        for path in wanted - self.dependency_monitors.keys():
+            monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            monitor.set_rate_limit(self.COALESCE_MS)
+            monitor.connect("changed", self._on_dependency_event, path)
+            self.dependency_monitors[path] = monitor
+
     def stop_watching(self):
         self.watching = False
-    
-    def _watch_loop(self):
-        while self.watching:
-            try:
-                if os.path.exists(SHADER_DIR):
-                    current_files = {}
-                    for file_path in Path(SHADER_DIR).glob("*"):
-                        if file_path.suffix.lower() in ('.glsl', '.frag', '.vert', '.fs', '.vs'):
-                            current_files[str(file_path)] = file_path.stat().st_mtime
-                    
-                    if current_files != self.last_check:
-                        self.last_check = current_files
-                        GLib.idle_add(self.callback)
-                
-                time.sleep(1)  # Check every second
-            except Exception:
-                pass
+        source_monitors = [m for monitors in self.source_monitors.values() for m in monitors.values()]
+        for monitor in (self.monitors + source_monitors + list(self.include_monitors.values())
+                        + list(self.dependency_monitors.values())):
+            monitor.cancel()
+        self.monitors = []
+        self.source_monitors = {}
+        self.include_monitors = {}
+        self.dependency_monitors = {}
+        self.dependencies_changed.clear()
+        if self.flush_source:
+            GLib.source_remove(self.flush_source)
+            self.flush_source = 0
+        self.pending.clear()
+        self.renamed.clear()
+        self.rescan.clear()
+        self.config_changed = False
+
+    @staticmethod
+    def _is_shader(path):
+        return path is not None and path.lower().endswith(SHADER_EXTENSIONS)
+
+    def _on_shader_dir_event(self, monitor, file, other_file, event_type, source):
+        events = Gio.FileMonitorEvent
+        path = file.get_path()
+        other_path = other_file.get_path() if other_file and event_type == events.RENAMED else None
+        structural = event_type in (events.CREATED, events.MOVED_IN, events.DELETED, events.MOVED_OUT, events.RENAMED)
+        for changed in (path, other_path):
+            if changed is None or self._is_shader(changed):
+                continue
+            if changed.lower().endswith(PACK_EXTENSIONS):
+                # New and removed packs change what the folder mounts; an edited one is rescanned alone
+                self.rescan.add(source.key if structural else changed)
+                self._schedule_flush()
+            elif structural and (os.path.isdir(changed) or changed in self.source_monitors.get(source.key, {})):
+                # A folder came or went: walk the source again to pick up its shaders and monitors
+                self.rescan.add(source.key)
+                self._schedule_flush()
+        if event_type == events.RENAMED:
+            new_path = other_file.get_path() if other_file else None
+            if self._is_shader(path):
+                self._record(path, "deleted")
+            if self._is_shader(new_path):
+                self._record(new_path, "created")
+                if self._is_shader(path):
+                    self.renamed.append((path, new_path))
+            return
+        if not self._is_shader(path):
+            return
+        if event_type in (events.CREATED, events.MOVED_IN):
+            self._record(path, "created")
+        elif event_type in (events.CHANGED, events.CHANGES_DONE_HINT, events.ATTRIBUTE_CHANGED):
+            self._record(path, "modified")
+        elif event_type in (events.DELETED, events.MOVED_OUT):
+            self._record(path, "deleted")
+
+    def _on_pack_event(self, monitor, file, other_file, event_type, source):
+        self.rescan.add(source.key)
+        self._schedule_flush()
+
+    def _on_config_event(self, monitor, file, other_file, event_type):
+        self.config_changed = True
+        self._schedule_flush()
+
+    def _on_dependency_event(self, monitor, file, other_file, event_type, path):
+        self.dependencies_changed.add(path)
+        self._schedule_flush()
+
+    def _record(self, path, kind):
+        """Merge an event into the pending burst so save-rename-chmod collapses to one change"""
+        previous = self.pending.get(path)
+        if previous == "created" and kind == "modified":
+            kind = "created"
+        elif previous == "created" and kind == "deleted":
+            del self.pending[path]
+            self._schedule_flush()
+            return
+        elif previous == "deleted" and kind == "created":
+            kind = "modified"
+        self.pending[path] = kind
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self.flush_source:
+            self.flush_source = GLib.timeout_add(self.COALESCE_MS, self._flush)
+
+    def _flush(self):
+        self.flush_source = 0
+        changes = {"created": set(), "modified": set(), "deleted": set(),
+                   "renamed": self.renamed, "config": self.config_changed,
+                   "dependencies": self.dependencies_changed, "rescan": self.rescan}
+        for path, kind in self.pending.items():
+            changes[kind].add(path)
+        self.pending = {}
+        self.renamed = []
+        self.rescan = set()
+        self.config_changed = False
+        self.dependencies_changed = set()
+        if self.watching:
+            self.callback(changes)
+        return False
+
+
+class ApplyScheduler:
+    """Coalesces bursts of shader applies so only the latest request is written and reloads are rate-limited"""
+    RELOAD_DELAY_MS = 100
+
+    def __init__(self, write, reload, min_interval_ms=400):
+        self.write = write
+        self.reload = reload
+        self.min_interval_ms = min_interval_ms
+        self.pending = None
+        self.apply_source = 0
+        self.reload_source = 0
+        self.last_apply = 0.0
+
+    def is_pending(self):
+        return bool(self.apply_source)
+
+    def request(self, request, delay_ms=0):
+        """Queue request for write(); a newer request replaces one that is still queued.
+
+        delay_ms debounces the request (used by live browse); otherwise the request runs as soon
+        as min_interval_ms has passed since the previous apply.
+        """
+        self.pending = request
+        if self.apply_source:
+            if not delay_ms:
+                return
+            GLib.source_remove(self.apply_source)
+        elapsed_ms = (time.monotonic() - self.last_apply) * 1000
+        wait = max(delay_ms, int(self.min_interval_ms - elapsed_ms), 0)
+        self.apply_source = GLib.timeout_add(wait, self._apply)
+
+    def flush(self):
+        """Run a queued apply and its reload right away, e.g. before quitting"""
+        if self.apply_source:
+            GLib.source_remove(self.apply_source)
+            self._apply()
+        if self.reload_source:
+            GLib.source_remove(self.reload_source)
+            self._reload()
+
+    def cancel(self):
+        for source in (self.apply_source, self.reload_source):
+            if source:
+                GLib.source_remove(source)
+        self.apply_source = self.reload_source = 0
+        self.pending = None
+
+    def _apply(self):
+        self.apply_source = 0
+        request, self.pending = self.pending, None
+        self.last_apply = time.monotonic()
+        self.write(request)
+        # Send reload signal with delay to prevent crashes; one reload covers every write before it
+        if not self.reload_source:
+            self.reload_source = GLib.timeout_add(self.RELOAD_DELAY_MS, self._reload)
+        return False
+
+    def _reload(self):
+        self.reload_source = 0
+        self.reload()
+        return False
 
 
 class ShaderSwitcher(Adw.Application):
     def __init__(self):
         super().__init__(application_id=APP_ID)
+        self.startup_timer = StartupTimer(_STARTUP_T0)
+        self.startup_timer.mark("imports")
         self.window = None
         self.settings = None
         self.toast_overlay = None
         self.search_revealer = None
         self.shutting_down = False
         self.all_shader_items = []
+        self._items_by_name = {}
+        self._items_by_path = {}
         self.favorites = set()
-        self.recent_shaders = []
+        self.usage = UsageHistory()
+        self._usage_version = None
         self._active_shader_name = None
-        self.all_list_box = Gtk.ListBox()
-        self.favorites_list_box = Gtk.ListBox()
-        self.recent_list_box = Gtk.ListBox()
-        self.all_search_entry = Gtk.SearchEntry()
+        # Every custom-shader entry in the config, in chain order; _active_shader_name is the first
+        self._active_chain = []
+        self.stacks = {}
+        self._stack_rows = {}
+        self.stacks_group = None
+        self.duplicates_group = None
+        self._duplicate_groups = None
+        self._duplicate_rows = []
+        self._search_term = ""
+        self._search_scores = None
+        self._search_source = 0
+        self.search_index = ShaderSearchIndex()
+        self._most_used_rank = {}
+        self._favorites_snapshot = frozenset()
+        self._create_models()
+        self.all_search_entry = None
         self.shader_watcher = ShaderWatcher(self.on_shader_directory_changed)
-        self.ghostty_process_cache = {}
-        self.last_ghostty_check = 0
+        self.shader_index = ShaderIndex()
+        self.library = ShaderLibrary(self.shader_index)
+        self.ghostty_config = GhosttyConfig(on_reload=self.shader_watcher.watch_config_files)
+        self.shader_scanner = ShaderScanner(self.library)
+        self.shader_validator = ShaderValidator()
+        self._validation_targets = {}
+        self.thumbnail_renderer = ThumbnailRenderer()
+        self.shader_profiler = ShaderProfiler(self.shader_index)
+        self._profile_generation = 0
+        self.shader_builder = ShaderBuilder()
+        self.snapshot_store = SnapshotStore()
+        self._snapshot_window = None
+        self._snapshots_group = None
+        self._snapshot_rows = []
+        self._thumbnail_textures = OrderedDict()
+        self._thumbnail_rows = {}
+        self._thumbnail_loading = set()
+        self._bound_rows = set()
+        self._scan_progress = {}
+        self._pending_random = False
+        self.ghostty_tracker = GhosttyProcessTracker()
+        self.apply_scheduler = ApplyScheduler(self._on_apply_due, self._on_reload_due)
+        self.shader_list_views = []
+        self.row_menu = self._create_row_menu()
+        self._row_menu_item = None
+        self.state = StateStore(on_error=self._on_state_error)
+        self.power_policy = PowerPolicy(self.state)
+        self.power_supply = None
+        self._power_socket = None
+        self._power_watch_id = 0
+        self._power_monitors = []
+        self._power_check_id = 0
+        self._power_animation = None
+        self._in_background = False
+        self._quit_requested = False
 
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
 
     def _signal_handler(self, signum, frame):
+        self._quit_requested = True
         self.shutting_down = True
         self.shader_watcher.stop_watching()
         if self.window: self.window.close()
@@ -125,7 +485,7 @@ class ShaderSwitcher(Adw.Application):
     def do_startup(self):
         Adw.Application.do_startup(self)
         self.load_app_settings()
-        self.load_data_files()
+        self.apply_scheduler.min_interval_ms = self.settings.get("reload_min_interval_ms", 400)
         self.create_actions()
         self.setup_keyboard_shortcuts()
         style_manager = Adw.StyleManager.get_default()
@@ -133,6 +493,7 @@ class ShaderSwitcher(Adw.Application):
         if color_scheme == 1: style_manager.set_color_scheme(Adw.ColorScheme.FORCE_LIGHT)
         elif color_scheme == 2: style_manager.set_color_scheme(Adw.ColorScheme.FORCE_DARK)
         else: style_manager.set_color_scheme(Adw.ColorScheme.DEFAULT)
+        self.startup_timer.mark("do_startup")
 
     def setup_keyboard_shortcuts(self):
         shortcuts = [
@@ -142,7 +503,8 @@ class ShaderSwitcher(Adw.Application):
             ("app.escape", ["Escape"]),
             ("app.apply_first", ["Return"]),
             ("app.toggle_favorite", ["<Control>d"]),
-            ("app.quick_disable", ["<Control><Shift>d"])
+            ("app.quick_disable", ["<Control><Shift>d"]),
+            ("app.quit", ["<Control>q"])
         ]
         
         for action_name, accels in shortcuts:
@@ -169,6 +531,10 @@ class ShaderSwitcher(Adw.Application):
                 action = Gio.SimpleAction.new("quick_disable", None)
                 action.connect("activate", lambda *args: self.disable_shader_quick())
                 self.add_action(action)
+            elif action_simple_name == "quit":
+                action = Gio.SimpleAction.new("quit", None)
+                action.connect("activate", self.quit_app)
+                self.add_action(action)
             
             self.set_accels_for_action(action_name, accels)
 
@@ -183,16 +549,45 @@ class ShaderSwitcher(Adw.Application):
             self.window.set_content(self.toast_overlay)
             main_content = self._create_main_ui()
             self.toast_overlay.set_child(main_content)
+            self.startup_timer.mark("window built")
             
-            self._active_shader_name = self.get_current_shader_from_config()
-            self.refresh_all_lists()
-            self.shader_watcher.start_watching()
-            
-            if self.settings.get("random_on_startup", False): 
-                self.set_random_shader()
+            self.window.present()
+            self.startup_timer.mark("window presented")
+            # Everything that touches the disk waits until the first frame is on screen
+            frame_clock = self.window.get_frame_clock()
+            if frame_clock:
+                self._first_paint_handler = frame_clock.connect("after-paint", self._on_first_paint)
+            else:
+                GLib.idle_add(self._finish_startup)
+            return
                 
         self.window.present()
 
+    def _on_first_paint(self, frame_clock):
+        frame_clock.disconnect(self._first_paint_handler)
+        self.startup_timer.mark("first paint")
+        GLib.idle_add(self._finish_startup)
+
+    def _finish_startup(self):
+        self.load_data_files()
+        self.library.set_extra_roots(library_sources(self.settings))
+        self.thumbnail_renderer.max_bytes = self.settings.get("thumbnail_cache_mb", 64) * 1024 * 1024
+        self.shader_validator.set_command(ShaderValidator.resolve_command(self.settings.get("validator_command", "")))
+        self._load_active_from_config()
+        self._refresh_stacks()
+        self.update_status_label()
+        # Picked once the first scan has delivered the shader list
+        self._pending_random = self.settings.get("random_on_startup", False)
+        self.refresh_all_lists()
+        self.shader_watcher.start_watching()
+        self.shader_watcher.watch_config_files(self.ghostty_config.files)
+        if self.settings.get("build_shaders", False):
+            self.shader_watcher.watch_dependencies(self.shader_builder.dependencies())
+        self.ghostty_config.watched = True
+        self._start_power_watch()
+        self.startup_timer.mark("interactive")
+        return False
+
     def setup_custom_css(self):
         css_provider = Gtk.CssProvider()
         css = """
@@ -204,6 +599,9 @@ class ShaderSwitcher(Adw.Application):
             background: linear-gradient(45deg, @accent_color, @success_color);
             color: white;
         }
+        .shader-thumbnail {
+            border-radius: 6px;
+        }
         .shader-preview-box {
             background: alpha(@window_bg_color, 0.5);
         }
@@ -216,13 +614,299 @@ class ShaderSwitcher(Adw.Application):
         )
 
     def on_window_close(self, window):
+        if not self._quit_requested and self.settings.get("run_in_background", True) \
+                and power_policy(self.settings) != "off":
+            # Keep enforcing the battery policy; launching the app again shows this window
+            window.set_visible(False)
+            if not self._in_background:
+                self.hold()
+                self._in_background = True
+            return True
+        self.apply_scheduler.flush()
         self.shutting_down = True
         self.shader_watcher.stop_watching()
+        self.ghostty_config.watched = False
+        self.shader_scanner.shutdown()
+        self.shader_validator.shutdown()
+        self.thumbnail_renderer.shutdown()
+        self.shader_profiler.shutdown()
+        self.ghostty_tracker.close()
+        self.usage.save()
+        self.state.close()
+        self._stop_power_watch()
+        if self._in_background:
+            self._in_background = False
+            self.release()
         return False
 
-    def on_shader_directory_changed(self):
-        if not self.shutting_down:
-            self.refresh_all_lists()
+    def quit_app(self, *args):
+        self._quit_requested = True
+        if self.window:
+            self.window.close()
+        else:
+            self.quit()
+
+    def _start_power_watch(self):
+        """Follow AC/battery changes through kernel uevents; custom roots (fake sysfs trees) use file monitors"""
+        self._stop_power_watch()
+        root = self.settings.get("power_supply_root") or POWER_SUPPLY_ROOT
+        self.power_supply = PowerSupply(root)
+        if power_policy(self.settings) != "off":
+            self._power_socket = open_uevent_socket()
+            if self._power_socket:
+                self._power_watch_id = GLib.io_add_watch(self._power_socket.fileno(), GLib.PRIORITY_DEFAULT,
+                                                         GLib.IO_IN, self._on_power_uevent)
+            # Real sysfs attributes never raise inotify events, so monitors only help for plain files
+            if root != POWER_SUPPLY_ROOT:
+                for path in [root] + [os.path.join(root, name) for name in self.power_supply.supplies()]:
+                    try:
+                        monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.NONE, None)
+                    except GLib.Error:
+                        continue
+                    monitor.connect("changed", self._on_power_file_changed, path == root)
+                    self._power_monitors.append(monitor)
+        # Also restores a shader left engaged by a previous run once the policy is off
+        self._check_power()
+
+    def _stop_power_watch(self):
+        if self._power_watch_id:
+            GLib.source_remove(self._power_watch_id)
+            self._power_watch_id = 0
+        if self._power_socket:
+            self._power_socket.close()
+            self._power_socket = None
+        for monitor in self._power_monitors:
+            monitor.cancel()
+        self._power_monitors = []
+        if self._power_check_id:
+            GLib.source_remove(self._power_check_id)
+            self._power_check_id = 0
+
+    def _on_power_uevent(self, fd, condition):
+        if drain_uevents(self._power_socket):
+            self._schedule_power_check()
+        return True
+
+    def _on_power_file_changed(self, monitor, file, other_file, event_type, is_root):
+        if is_root and event_type in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.DELETED):
+            # A supply appeared or went away; watch the new set of directories
+            GLib.idle_add(self._start_power_watch)
+            return
+        self._schedule_power_check()
+
+    def _schedule_power_check(self):
+        # Plugging in fires a burst of events for the adapter and the battery; act once they settle
+        if not self._power_check_id:
+            self._power_check_id = GLib.timeout_add(POWER_SETTLE_MS, self._check_power)
+
+    def _check_power(self):
+        self._power_check_id = 0
+        if self.shutting_down or self.power_supply is None:
+            return False
+        current = list(self._active_chain)
+        current = current if len(current) > 1 else (current[0] if current else None)
+        action = self.power_policy.update(self.settings, self.power_supply.read(), current)
+        if action:
+            self._apply_power_action(*action)
+        return False
+
+    def _apply_power_action(self, kind, policy, saved_shader):
+        self._power_animation = "false" if kind == "engage" and policy == "static" else None
+        if kind == "engage" and policy == "cheap":
+            chain = [self.settings.get("power_cheap_shader")]
+        elif kind == "engage" and policy == "disable":
+            chain = []
+        else:
+            # Stopping animation keeps the user's shader or stack; restoring brings it back
+            saved = saved_shader if isinstance(saved_shader, list) else [saved_shader] if saved_shader else []
+            # Older versions saved paths rather than names
+            chain = [self.library.name_for_path(name) if os.path.isabs(name) else name for name in saved]
+        
+        if len(chain) > 1:
+            self._apply_chain(chain, match_stack(self.stacks, chain), manual=False)
+        elif chain:
+            self.set_shader(chain[0], record=False, force=True)
+        elif self._active_shader_name or self.get_current_shader_from_config():
+            self._active_shader_name = None
+            self._active_chain = []
+            self.apply_scheduler.request((None, None, False))
+            self._update_all_lists()
+        
+        if kind == "engage":
+            labels = {"cheap": f"switched to {chain[0] if chain else ''}", "static": "animation stopped", "disable": "shader disabled"}
+            self.show_toast(f"🔋 On battery: {labels[policy]}")
+        else:
+            self.show_toast("🔌 On AC power: shader restored")
+
+    def _on_manual_shader_choice(self):
+        """A shader picked by hand wins over the battery policy until the next time AC is connected"""
+        self.power_policy.override()
+        self._power_animation = None
+
+    def on_shader_directory_changed(self, changes):
+        if self.shutting_down:
+            return
+        if changes["config"]:
+            self.ghostty_config.invalidate()
+            # A queued apply is newer than what the config file says
+            if not self.apply_scheduler.is_pending():
+                self._load_active_from_config()
+                self.update_status_label()
+            # The command line appends to the usage log when it applies a shader
+            self.usage.load()
+        self.apply_shader_changes(changes)
+        for key in changes["rescan"]:
+            source = self.library.source(key)
+            if source is not None:
+                self._scan_source(source)
+        self._rebuild_active(changes["modified"] | changes["deleted"] | changes["dependencies"])
+
+    def _rebuild_active(self, changed_paths):
+        """Re-apply the active shaders when an edit touched them or one of their #include files"""
+        if not changed_paths or not self.settings.get("build_shaders", False) or self.apply_scheduler.is_pending():
+            return
+        affected = set()
+        for path in changed_paths:
+            affected |= self.shader_builder.dependents(path)
+        active = {os.path.abspath(self.library.path_for(name)) for name in self._active_chain}
+        if affected & active:
+            self._reapply_active()
+
+    def _reapply_active(self):
+        if len(self._active_chain) > 1:
+            self._apply_chain(self._active_chain, match_stack(self.stacks, self._active_chain), True, False)
+        elif self._active_chain:
+            self.set_shader(self._active_chain[0], record=False, force=True)
+
+    def apply_shader_changes(self, changes):
+        """Update the shader items in place from a watcher change set instead of rescanning"""
+        items = self._items_by_path
+        removed, added, touched = [], [], set()
+        for path in changes["deleted"]:
+            if path in items:
+                removed.append(items[path])
+            self.search_index.remove(path)
+            source = self.library.source_for_path(path)
+            if source is not None:
+                source.index.forget(path)
+                touched.add(source)
+        for path in changes["created"] | changes["modified"]:
+            source = self.library.source_for_path(path)
+            meta = source.index.lookup(path) if source else None
+            if meta is None:
+                if path in items:
+                    removed.append(items[path])
+                self.search_index.remove(path)
+                continue
+            touched.add(source)
+            item = None if path in changes["deleted"] else items.get(path)
+            if item:
+                item.apply_metadata(meta)
+            else:
+                item = ShaderItem(source.name_for(path), path, meta, source)
+                added.append(item)
+            self._apply_derived(item)
+            self.search_index.add(path, item.name, meta.get("hash"), meta.get("tokens"))
+        self._remove_shader_items(removed)
+        self._add_shader_items(added)
+        for source in touched:
+            source.index.save()
+        self._update_all_lists()
+        changed = [items[p] for p in changes["created"] | changes["modified"] if p in items]
+        self._validate_items(changed)
+        self._refresh_cost_views({item.name for item in changed + removed})
+        self._refresh_duplicates()
+        self._sync_active_animation()
+
+    def _show_file_changes(self, paths):
+        """Reflect files the app itself wrote or deleted that no monitor will report"""
+        watched = self.shader_watcher.watched_directories()
+        paths = {path for path in paths if os.path.realpath(os.path.dirname(path)) not in watched}
+        if any(path.lower().endswith(PACK_EXTENSIONS) for path in paths):
+            self._scan_source(self.library.local)
+        paths = {path for path in paths if path.lower().endswith(SHADER_EXTENSIONS)}
+        if not paths:
+            return
+        existing = {path for path in paths if os.path.exists(path)}
+        self.apply_shader_changes({"created": existing, "modified": set(), "deleted": paths - existing,
+                                   "renamed": [], "config": False, "dependencies": set(), "rescan": set()})
+
+    def _sync_active_animation(self):
+        """Rewrite custom-shader-animation when an edit changed whether the active shader animates"""
+        if not self._active_chain or self.apply_scheduler.is_pending():
+            return
+        known = {item.name for item in self.all_shader_items}
+        wanted = self._chain_animation(self._active_chain) if known.issuperset(self._active_chain) else None
+        if wanted and (self.ghostty_config.get(ANIMATION_CONFIG_KEY) or [None])[-1] != wanted:
+            self._reapply_active()
+        if self._search_term:
+            self._run_search()
+
+    def _create_models(self):
+        """One shared store; the three pages are filtered and sorted views over it"""
+        self.shader_store = Gio.ListStore(item_type=ShaderItem)
+        name_sorter = Gtk.StringSorter.new(Gtk.PropertyExpression.new(ShaderItem, None, "name"))
+        name_sorter.set_ignore_case(True)
+        
+        self.search_filter = Gtk.CustomFilter.new(self._search_filter_func)
+        self.search_sorter = Gtk.CustomSorter.new(self._search_sort_func, None)
+        self.cost_sorter = Gtk.CustomSorter.new(self._cost_sort_func, None)
+        all_sorter = Gtk.MultiSorter()
+        all_sorter.append(self.search_sorter)
+        all_sorter.append(self.cost_sorter)
+        all_sorter.append(name_sorter)
+        self.analysis_filter = Gtk.CustomFilter.new(self._analysis_filter_func)
+        all_filter = Gtk.EveryFilter()
+        all_filter.append(self.search_filter)
+        all_filter.append(self.analysis_filter)
+        self.all_model = Gtk.SortListModel(
+            model=Gtk.FilterListModel(model=self.shader_store, filter=all_filter),
+            sorter=all_sorter)
+        
+        self.favorites_filter = Gtk.CustomFilter.new(lambda item: item.is_favorite)
+        self.favorites_model = Gtk.SortListModel(
+            model=Gtk.FilterListModel(model=self.shader_store, filter=self.favorites_filter),
+            sorter=name_sorter)
+        
+        self.most_used_filter = Gtk.CustomFilter.new(lambda item: item.name in self._most_used_rank)
+        self.most_used_sorter = Gtk.CustomSorter.new(
+            lambda a, b, _: self._most_used_rank[a.name] - self._most_used_rank[b.name], None)
+        self.most_used_model = Gtk.SortListModel(
+            model=Gtk.FilterListModel(model=self.shader_store, filter=self.most_used_filter),
+            sorter=self.most_used_sorter)
+
+    def _add_shader_items(self, items):
+        """Append new items to the store; the views sort for themselves, so existing rows never move"""
+        if not items:
+            return
+        self.shader_store.splice(len(self.all_shader_items), 0, items)
+        self.all_shader_items.extend(items)
+        for item in items:
+            self._items_by_name[item.name] = item
+            self._items_by_path[item.path] = item
+
+    def _remove_shader_items(self, items):
+        """Remove items from the store, one splice per run of adjacent positions"""
+        doomed = set(items)
+        if not doomed:
+            return
+        runs = []
+        for position, item in enumerate(self.all_shader_items):
+            if item not in doomed:
+                continue
+            if runs and sum(runs[-1]) == position:
+                runs[-1][1] += 1
+            else:
+                runs.append([position, 1])
+        # all_shader_items mirrors the store, so positions stay valid when removing from the end
+        for position, count in reversed(runs):
+            self.shader_store.splice(position, count, [])
+            del self.all_shader_items[position:position + count]
+        for item in doomed:
+            if self._items_by_name.get(item.name) is item:
+                del self._items_by_name[item.name]
+            if self._items_by_path.get(item.path) is item:
+                del self._items_by_path[item.path]
 
     def _create_main_ui(self):
         main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -233,18 +917,32 @@ class ShaderSwitcher(Adw.Application):
         quick_actions = self._create_quick_actions()
         main_box.append(quick_actions)
         
+        self.scan_progress = Gtk.ProgressBar(show_text=True, margin_start=12, margin_end=12, margin_top=6)
+        self.scan_revealer = Gtk.Revealer(transition_type=Gtk.RevealerTransitionType.SLIDE_DOWN,
+                                          child=self.scan_progress)
+        main_box.append(self.scan_revealer)
+        
         self.view_stack = Adw.ViewStack()
         view_switcher = Adw.ViewSwitcher(stack=self.view_stack, policy=Adw.ViewSwitcherPolicy.WIDE)
         
-        all_page = self._create_shader_page(self.all_list_box, is_main_list=True)
-        favorites_page = self._create_shader_page(self.favorites_list_box)
-        recent_page = self._create_shader_page(self.recent_list_box)
-        settings_page = self._create_settings_page()
-        
+        self.all_search_entry = Gtk.SearchEntry()
+        all_page = self._create_shader_page(self.all_model, is_main_list=True)
         self.view_stack.add_titled_with_icon(all_page, "all", "All Shaders", "view-grid-symbolic")
-        self.view_stack.add_titled_with_icon(favorites_page, "favorites", "Favorites", "star-symbolic")
-        self.view_stack.add_titled_with_icon(recent_page, "recent", "Recent", "document-open-recent-symbolic")
-        self.view_stack.add_titled_with_icon(settings_page, "settings", "Settings", "preferences-system-symbolic")
+        
+        # The other pages are built the first time they are shown
+        self._lazy_pages = {
+            "favorites": lambda: self._create_shader_page(self.favorites_model),
+            "most_used": lambda: self._create_shader_page(self.most_used_model),
+            "stacks": self._create_stacks_page,
+            "duplicates": self._create_duplicates_page,
+            "settings": self._create_settings_page,
+        }
+        self.view_stack.add_titled_with_icon(Adw.Bin(), "favorites", "Favorites", "star-symbolic")
+        self.view_stack.add_titled_with_icon(Adw.Bin(), "most_used", "Most Used", "document-open-recent-symbolic")
+        self.view_stack.add_titled_with_icon(Adw.Bin(), "stacks", "Stacks", "view-list-symbolic")
+        self.view_stack.add_titled_with_icon(Adw.Bin(), "duplicates", "Duplicates", "edit-copy-symbolic")
+        self.view_stack.add_titled_with_icon(Adw.Bin(), "settings", "Settings", "preferences-system-symbolic")
+        self.view_stack.connect("notify::visible-child-name", self._on_page_shown)
         
         switcher_box = Gtk.Box(halign=Gtk.Align.CENTER, margin_top=8, margin_bottom=8)
         switcher_box.append(view_switcher)
@@ -255,6 +953,12 @@ class ShaderSwitcher(Adw.Application):
         self.all_search_entry.connect("activate", self.on_search_activate)
         return main_box
 
+    def _on_page_shown(self, view_stack, _):
+        name = view_stack.get_visible_child_name()
+        builder = self._lazy_pages.pop(name, None)
+        if builder:
+            view_stack.get_child_by_name(name).set_child(builder())
+
     def _create_quick_actions(self):
         quick_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6, 
                            halign=Gtk.Align.CENTER)
@@ -281,8 +985,8 @@ class ShaderSwitcher(Adw.Application):
         
         status_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8, halign=Gtk.Align.CENTER)
         self.status_icon = Gtk.Image()
-        self.status_label = Gtk.Label(css_classes=["heading"])
-        self.shader_stats_label = Gtk.Label()
+        self.status_label = Gtk.Label(css_classes=["heading"], label="Ghostty Shader Switcher")
+        self.shader_stats_label = Gtk.Label(label="Loading shaders…")
         
         status_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=2)
         status_vbox.append(self.status_label)
@@ -296,6 +1000,18 @@ class ShaderSwitcher(Adw.Application):
         search_btn.connect("clicked", self.toggle_search)
         header_bar.pack_start(search_btn)
         
+        sort_dropdown = Gtk.DropDown.new_from_strings(["Name", "Render Cost", "Estimated Cost"])
+        sort_dropdown.set_tooltip_text("Sort Shaders By")
+        sort_dropdown.set_selected(self.settings.get("sort_by", 0))
+        sort_dropdown.connect("notify::selected", self._on_sort_changed)
+        header_bar.pack_start(sort_dropdown)
+        
+        filter_dropdown = Gtk.DropDown.new_from_strings(["All", "Low Cost", "Animated", "Static", "Multi-tap Blur"])
+        filter_dropdown.set_tooltip_text("Show Only")
+        filter_dropdown.set_selected(self.settings.get("filter_by", 0))
+        filter_dropdown.connect("notify::selected", self._on_filter_changed)
+        header_bar.pack_start(filter_dropdown)
+        
         menu_btn = Gtk.MenuButton(icon_name="open-menu-symbolic", tooltip_text="Menu")
         menu = Gio.Menu()
         menu.append("Open Shader Folder", "app.open_folder")
@@ -303,7 +1019,9 @@ class ShaderSwitcher(Adw.Application):
         menu.append("Create New Shader", "app.create_shader")
         
         advanced_section = Gio.Menu()
-        advanced_section.append("Backup Shaders", "app.backup_shaders")
+        advanced_section.append("Snapshot Shaders", "app.backup_shaders")
+        advanced_section.append("Restore from Snapshot…", "app.show_snapshots")
+        advanced_section.append("Profile Render Cost", "app.profile_shaders")
         advanced_section.append("Check Ghostty Status", "app.check_ghostty")
         menu.append_section("Advanced", advanced_section)
         
@@ -312,7 +1030,7 @@ class ShaderSwitcher(Adw.Application):
         
         return header_bar
 
-    def _create_shader_page(self, list_box, is_main_list=False):
+    def _create_shader_page(self, model, is_main_list=False):
         page_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         
         if is_main_list:
@@ -332,8 +1050,12 @@ class ShaderSwitcher(Adw.Application):
             page_box.append(self.search_revealer)
         
         scrolled_window = Gtk.ScrolledWindow(vexpand=True, hscrollbar_policy=Gtk.PolicyType.NEVER)
-        list_box.set_selection_mode(Gtk.SelectionMode.SINGLE)
-        list_box.connect("row-activated", self.on_row_activated)
+        selection = Gtk.SingleSelection(model=model, autoselect=False)
+        list_view = Gtk.ListView(model=selection, factory=self._create_shader_factory(),
+                                 single_click_activate=not self.settings.get("live_browse", False))
+        list_view.connect("activate", self.on_row_activated)
+        selection.connect("selection-changed", self._on_browse_selection_changed, list_view)
+        self.shader_list_views.append(list_view)
         
         status_page = Adw.StatusPage(vexpand=True, icon_name="folder-documents-symbolic", 
                                    title="No Shaders Found", 
@@ -351,58 +1073,239 @@ class ShaderSwitcher(Adw.Application):
         button_box.append(create_shader_btn)
         status_page.set_child(button_box)
         
-        list_box.set_placeholder(status_page)
-        scrolled_window.set_child(list_box)
-        page_box.append(scrolled_window)
+        scrolled_window.set_child(list_view)
+        
+        # ListView has no placeholder, so swap between the list and the status page
+        content_stack = Gtk.Stack(vexpand=True)
+        content_stack.add_named(scrolled_window, "list")
+        content_stack.add_named(status_page, "empty")
+        
+        def on_items_changed(model, *args):
+            content_stack.set_visible_child_name("list" if model.get_n_items() else "empty")
+        model.connect("items-changed", on_items_changed)
+        on_items_changed(model)
+        
+        page_box.append(content_stack)
         
         return page_box
 
-    def _create_shader_row(self, item):
-        adw_row = Adw.ActionRow(title=item.name, 
-                                 subtitle=f"Modified: {item.modified_str}  •  Size: {item.size_str}")
-        
-        fav_btn = Gtk.ToggleButton(active=item.is_favorite, 
-                                  valign=Gtk.Align.CENTER, tooltip_text="Toggle Favorite")
-        fav_btn.set_icon_name("starred-symbolic" if item.is_favorite else "non-starred-symbolic")
-        fav_btn.connect("toggled", self.on_favorite_toggled, item)
+    @staticmethod
+    def _row_subtitle(item):
+        subtitle = f"Modified: {item.modified_str}  •  Size: {item.size_str}"
+        if item.render_cost >= 0:
+            subtitle += f"  •  Cost: {item.render_cost:.1f} ms"
+        elif item.cost_tier:
+            subtitle += f"  •  Est. cost: {item.cost_tier} ({item.cost_score})"
+        if item.animated:
+            subtitle += "  •  Animated"
+        if item.packed:
+            subtitle += "  •  Read-only pack"
+        return subtitle
+
+    def _create_shader_factory(self):
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self._on_shader_row_setup)
+        factory.connect("bind", self._on_shader_row_bind)
+        factory.connect("unbind", self._on_shader_row_unbind)
+        return factory
+
+    def _on_shader_row_setup(self, factory, list_item):
+        """Build one recyclable row; the shader it shows is attached in bind"""
+        adw_row = Adw.ActionRow()
+        adw_row.item = None
+        adw_row.notify_handler = 0
+        
+        fav_btn = Gtk.ToggleButton(valign=Gtk.Align.CENTER, tooltip_text="Toggle Favorite")
+        fav_btn.connect("clicked", lambda b: self.on_favorite_toggled(b, adw_row.item))
         adw_row.add_prefix(fav_btn)
         
+        thumbnail = Gtk.Picture(content_fit=Gtk.ContentFit.COVER, can_shrink=True, width_request=64,
+                                height_request=40, valign=Gtk.Align.CENTER, overflow=Gtk.Overflow.HIDDEN,
+                                css_classes=["shader-thumbnail"], visible=self.settings.get("show_thumbnails", True))
+        adw_row.add_prefix(thumbnail)
+        adw_row.thumbnail_hash = None
+        
         active_icon = Gtk.Image(icon_name="media-playback-start-symbolic", 
-                               visible=item.is_active, tooltip_text="Currently Active")
+                               visible=False, tooltip_text="Currently Active")
         adw_row.add_prefix(active_icon)
         
+        validation_badge = Gtk.Label(valign=Gtk.Align.CENTER, visible=False, css_classes=["caption"])
+        adw_row.add_suffix(validation_badge)
+        
         button_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
         
         edit_btn = Gtk.Button(icon_name="document-edit-symbolic", 
                              valign=Gtk.Align.CENTER, tooltip_text="Edit Shader File")
-        edit_btn.connect("clicked", self.edit_shader, item)
+        edit_btn.connect("clicked", lambda b: self.edit_shader(b, adw_row.item))
         
         duplicate_btn = Gtk.Button(icon_name="edit-copy-symbolic", 
                                   valign=Gtk.Align.CENTER, tooltip_text="Duplicate Shader")
-        duplicate_btn.connect("clicked", self.duplicate_shader, item)
+        duplicate_btn.connect("clicked", lambda b: self.duplicate_shader(b, adw_row.item))
         
         delete_btn = Gtk.Button(icon_name="user-trash-symbolic", css_classes=["destructive-action"], 
                                valign=Gtk.Align.CENTER, tooltip_text="Delete Shader File")
-        delete_btn.connect("clicked", self._on_delete_clicked, item)
+        delete_btn.connect("clicked", lambda b: self._on_delete_clicked(b, adw_row.item))
+        
+        more_btn = Gtk.MenuButton(icon_name="view-more-symbolic", valign=Gtk.Align.CENTER,
+                                  tooltip_text="More Options", menu_model=self.row_menu)
+        more_btn.set_create_popup_func(lambda b: self._on_row_menu_opened(adw_row.item))
         
         apply_btn = Gtk.Button(label="Apply", icon_name="checkmark-symbolic", 
                               valign=Gtk.Align.CENTER, tooltip_text="Apply This Shader")
-        apply_btn.connect("clicked", lambda b: self.set_shader(item.name))
+        apply_btn.connect("clicked", lambda b: self.set_shader(adw_row.item.name))
         
         button_box.append(edit_btn)
         button_box.append(duplicate_btn)
         button_box.append(delete_btn)
+        button_box.append(more_btn)
         button_box.append(apply_btn)
         adw_row.add_suffix(button_box)
         
-        list_box_row = Gtk.ListBoxRow()
-        list_box_row.set_child(adw_row)
-        list_box_row.shader_name = item.name
-        
-        if item.is_active:
-            list_box_row.add_css_class("active-shader-row")
-            
-        return list_box_row
+        adw_row.fav_btn = fav_btn
+        adw_row.edit_btn = edit_btn
+        adw_row.delete_btn = delete_btn
+        adw_row.active_icon = active_icon
+        adw_row.thumbnail = thumbnail
+        adw_row.validation_badge = validation_badge
+        list_item.set_child(adw_row)
+
+    def _create_row_menu(self):
+        menu = Gio.Menu()
+        animation_section = Gio.Menu()
+        for label, mode in (("Automatic", "auto"), ("Animate When Focused", "true"),
+                            ("Always Animate", "always"), ("Never Animate", "false")):
+            animation_section.append(label, f"app.shader_animation::{mode}")
+        menu.append_section("Animation", animation_section)
+        self._stack_menu_section = Gio.Menu()
+        menu.append_section("Stacks", self._stack_menu_section)
+        return menu
+
+    def _on_row_menu_opened(self, item):
+        self._row_menu_item = item
+        mode = self.settings.get("shader_animation", {}).get(item.name, "auto")
+        self.lookup_action("shader_animation").set_state(GLib.Variant("s", mode))
+
+    def _on_shader_animation_activate(self, action, parameter):
+        """Store a per-shader custom-shader-animation override and rewrite the config if it is active"""
+        item = self._row_menu_item
+        if item is None:
+            return
+        mode = parameter.get_string()
+        action.set_state(parameter)
+        overrides = self.settings.setdefault("shader_animation", {})
+        if mode == "auto":
+            overrides.pop(item.name, None)
+        else:
+            overrides[item.name] = mode
+        self.save_app_settings()
+        if item.name in self._active_chain:
+            self._sync_active_animation()
+
+    def _on_shader_row_bind(self, factory, list_item):
+        adw_row = list_item.get_child()
+        item = list_item.get_item()
+        adw_row.item = item
+        adw_row.set_title(item.name)
+        self._bound_rows.add(adw_row)
+        self._sync_shader_row(adw_row, item)
+        adw_row.notify_handler = item.connect("notify", lambda i, pspec: self._sync_shader_row(adw_row, i))
+
+    def _on_shader_row_unbind(self, factory, list_item):
+        adw_row = list_item.get_child()
+        if adw_row.item is not None and adw_row.notify_handler:
+            adw_row.item.disconnect(adw_row.notify_handler)
+        self._release_row_thumbnail(adw_row)
+        self._bound_rows.discard(adw_row)
+        adw_row.item = None
+        adw_row.notify_handler = 0
+
+    def _bind_row_thumbnail(self, row, item):
+        """Show the item's thumbnail from memory, disk or a background render, in that order"""
+        content_hash = item.content_hash if self.settings.get("show_thumbnails", True) else None
+        if row.thumbnail_hash == content_hash:
+            return
+        self._release_row_thumbnail(row)
+        row.thumbnail.set_visible(content_hash is not None)
+        row.thumbnail.set_paintable(None)
+        if not content_hash:
+            return
+        row.thumbnail_hash = content_hash
+        self._thumbnail_rows.setdefault(content_hash, set()).add(row)
+        texture = self._thumbnail_textures.get(content_hash)
+        if texture is not None:
+            self._thumbnail_textures.move_to_end(content_hash)
+            row.thumbnail.set_paintable(texture)
+            return
+        png_path = self.thumbnail_renderer.lookup(content_hash)
+        if png_path:
+            self._read_thumbnail(content_hash, png_path)
+        elif item.validation != "invalid" and not item.packed:
+            self.thumbnail_renderer.request(item.path, content_hash, GLib.idle_add, self._on_thumbnail_rendered)
+
+    def _release_row_thumbnail(self, row):
+        content_hash = row.thumbnail_hash
+        row.thumbnail_hash = None
+        rows = self._thumbnail_rows.get(content_hash)
+        if rows is None:
+            return
+        rows.discard(row)
+        if not rows:
+            del self._thumbnail_rows[content_hash]
+            self.thumbnail_renderer.cancel(content_hash, self._on_thumbnail_rendered)
+
+    def _on_thumbnail_rendered(self, content_hash, png_path, error):
+        if png_path and content_hash in self._thumbnail_rows and not self.shutting_down:
+            self._read_thumbnail(content_hash, png_path)
+        return False
+
+    def _read_thumbnail(self, content_hash, png_path):
+        if content_hash in self._thumbnail_loading:
+            return
+        self._thumbnail_loading.add(content_hash)
+
+        def on_loaded(file, result):
+            self._thumbnail_loading.discard(content_hash)
+            try:
+                data, _ = file.load_bytes_finish(result)
+                texture = Gdk.Texture.new_from_bytes(data)
+            except GLib.Error:
+                return
+            self._thumbnail_textures[content_hash] = texture
+            while len(self._thumbnail_textures) > THUMBNAIL_MEMORY_LIMIT:
+                self._thumbnail_textures.popitem(last=False)
+            for row in self._thumbnail_rows.get(content_hash, ()):
+                row.thumbnail.set_paintable(texture)
+        Gio.File.new_for_path(png_path).load_bytes_async(None, on_loaded)
+
+    def _sync_shader_row(self, row, item):
+        """Push only the properties that differ from the item into a bound row"""
+        self._bind_row_thumbnail(row, item)
+        subtitle = self._row_subtitle(item)
+        if row.get_subtitle() != subtitle:
+            row.set_subtitle(subtitle)
+        if row.fav_btn.get_active() != item.is_favorite:
+            row.fav_btn.set_active(item.is_favorite)
+        if row.edit_btn.get_sensitive() == item.packed:
+            # Pack members are read-only; Duplicate makes an editable copy
+            row.edit_btn.set_sensitive(not item.packed)
+            row.delete_btn.set_sensitive(not item.packed)
+        fav_icon = "starred-symbolic" if item.is_favorite else "non-starred-symbolic"
+        if row.fav_btn.get_icon_name() != fav_icon:
+            row.fav_btn.set_icon_name(fav_icon)
+        if row.active_icon.get_visible() != item.is_active:
+            row.active_icon.set_visible(item.is_active)
+            if item.is_active:
+                row.add_css_class("active-shader-row")
+            else:
+                row.remove_css_class("active-shader-row")
+        badge = row.validation_badge
+        if badge.get_visible() != bool(item.validation):
+            badge.set_visible(bool(item.validation))
+        if item.validation and badge.get_label() != item.validation.capitalize():
+            badge.set_label(item.validation.capitalize())
+            badge.set_css_classes(["caption", "success" if item.validation == "valid" else "error"])
+        if badge.get_tooltip_text() != (item.validation_message or None):
+            badge.set_tooltip_text(item.validation_message or None)
 
     def _on_delete_clicked(self, button, item):
         dialog = Adw.MessageDialog(transient_for=self.window, modal=True, 
@@ -419,7 +1322,7 @@ class ShaderSwitcher(Adw.Application):
             try:
                 os.remove(item.path)
                 self.show_toast(f"Deleted {item.name}")
-                self.refresh_all_lists()
+                self._show_file_changes([item.path])
             except OSError as e:
                 self.show_toast(f"Error deleting file: {e}", is_error=True)
 
@@ -427,33 +1330,254 @@ class ShaderSwitcher(Adw.Application):
         try:
             base_name = Path(item.name).stem
             extension = Path(item.name).suffix
+            # Copies sit next to the original; a pack member is copied out into the shader folder
+            directory = SHADER_DIR if item.packed else os.path.dirname(item.path)
             counter = 1
             
             while True:
                 new_name = f"{base_name}_copy{counter}{extension}"
-                new_path = os.path.join(SHADER_DIR, new_name)
+                new_path = os.path.join(directory, new_name)
                 if not os.path.exists(new_path):
                     break
                 counter += 1
             
-            shutil.copy2(item.path, new_path)
+            shutil.copy2(self.library.materialize(item.name) if item.packed else item.path, new_path)
             self.show_toast(f"Duplicated as {new_name}")
-            self.refresh_all_lists()
+            self._show_file_changes([new_path])
         except Exception as e:
             self.show_toast(f"Error duplicating shader: {e}", is_error=True)
 
-    def _update_list_box(self, list_box, shader_items):
-        child = list_box.get_first_child()
-        while child:
-            list_box.remove(child)
-            child = list_box.get_first_child()
-        for item in shader_items:
-            row = self._create_shader_row(item)
-            list_box.append(row)
+    def _on_browse_selection_changed(self, selection, position, n_items, list_view):
+        """Live browse: preview the selected shader once the selection settles"""
+        if not self.settings.get("live_browse", False) or self.shutting_down:
+            return
+        # Only follow the user's own navigation, not selection shifts caused by model updates
+        if not list_view.get_state_flags() & Gtk.StateFlags.FOCUS_WITHIN:
+            return
+        item = selection.get_selected_item()
+        if item and item.name != self._active_shader_name:
+            self.set_shader(item.name, record=False, delay_ms=LIVE_BROWSE_DEBOUNCE_MS)
+
+    def on_row_activated(self, list_view, position):
+        item = list_view.get_model().get_item(position)
+        if item:
+            self.set_shader(item.name)
+
+    def _create_stacks_page(self):
+        page = Adw.PreferencesPage()
+        self.stacks_group = Adw.PreferencesGroup(
+            title="Shader Stacks",
+            description="Ghostty runs every shader of a stack in order. Costs add up, so compare "
+                        "the estimate with a single cheaper shader. Add shaders from a row's menu.")
+        save_btn = Gtk.Button(label="Save Current", valign=Gtk.Align.CENTER,
+                              tooltip_text="Save the active chain of shaders as a stack")
+        save_btn.connect("clicked", lambda b: self._on_new_stack(None, None, list(self._active_chain)))
+        self.stacks_group.set_header_suffix(save_btn)
+        page.add(self.stacks_group)
+        self._refresh_stacks()
+        return page
+
+    def _stack_summary(self, chain):
+        """Chain and combined cost line for a stack"""
+        items = self._items_by_name
+        members = [items.get(name) for name in chain]
+        cost = stack_cost([m.cost_score if m and m.cost_score >= 0 else None for m in members],
+                          [m.render_cost if m and m.render_cost >= 0 else None for m in members])
+        summary = " → ".join(name if name in items else f"{name} (missing)" for name in chain)
+        if cost["render_ms"] is not None:
+            summary += f"  •  Cost: {cost['render_ms']:.1f} ms"
+        if cost["tier"]:
+            summary += f"  •  Est. cost: {cost['tier']} ({cost['score']})"
+        return summary
+
+    def _refresh_stacks(self):
+        """Rebuild the stacks page and the row menu's stack entries from self.stacks"""
+        self._stack_menu_section.remove_all()
+        for name in sorted(self.stacks):
+            self._stack_menu_section.append(f"Add to {name}", f"app.add_to_stack::{name}")
+        self._stack_menu_section.append("New Stack…", "app.new_stack")
+        self.update_status_label()
+        
+        if self.stacks_group is None:
+            return
+        for row in self._stack_rows.values():
+            self.stacks_group.remove(row)
+        self._stack_rows = {}
+        for name, chain in sorted(self.stacks.items()):
+            row = Adw.ExpanderRow(title=GLib.markup_escape_text(name), subtitle=GLib.markup_escape_text(self._stack_summary(chain)))
+            apply_btn = Gtk.Button(icon_name="media-playback-start-symbolic", tooltip_text="Apply Stack",
+                                   valign=Gtk.Align.CENTER, css_classes=["flat"])
+            apply_btn.connect("clicked", lambda b, n=name: self.set_stack(n))
+            delete_btn = Gtk.Button(icon_name="user-trash-symbolic", tooltip_text="Delete Stack",
+                                    valign=Gtk.Align.CENTER, css_classes=["flat"])
+            delete_btn.connect("clicked", lambda b, n=name: self._edit_stack(n, None))
+            row.add_suffix(apply_btn)
+            row.add_suffix(delete_btn)
+            for index, shader_name in enumerate(chain):
+                member = Adw.ActionRow(title=GLib.markup_escape_text(shader_name))
+                for icon, tooltip, offset in (("go-up-symbolic", "Move Up", -1), ("go-down-symbolic", "Move Down", 1)):
+                    move_btn = Gtk.Button(icon_name=icon, tooltip_text=tooltip, valign=Gtk.Align.CENTER,
+                                          css_classes=["flat"], sensitive=0 <= index + offset < len(chain))
+                    move_btn.connect("clicked", lambda b, n=name, i=index, o=offset: self._move_stack_member(n, i, o))
+                    member.add_suffix(move_btn)
+                remove_btn = Gtk.Button(icon_name="list-remove-symbolic", tooltip_text="Remove from Stack",
+                                        valign=Gtk.Align.CENTER, css_classes=["flat"])
+                remove_btn.connect("clicked", lambda b, n=name, i=index:
+                                   self._edit_stack(n, self.stacks[n][:i] + self.stacks[n][i + 1:]))
+                member.add_suffix(remove_btn)
+                row.add_row(member)
+            self.stacks_group.add(row)
+            self._stack_rows[name] = row
+        self._highlight_active_stack()
+
+    def _highlight_active_stack(self):
+        for name, row in self._stack_rows.items():
+            if self.stacks.get(name) == self._active_chain:
+                row.add_css_class("active-shader-row")
+            else:
+                row.remove_css_class("active-shader-row")
+
+    def _edit_stack(self, name, chain):
+        """Replace a stack's chain; an empty or None chain deletes it"""
+        if chain:
+            self.stacks[name] = chain
+        else:
+            self.stacks.pop(name, None)
+        self.save_stacks()
+        self._refresh_stacks()
+
+    def _move_stack_member(self, name, index, offset):
+        chain = list(self.stacks[name])
+        chain[index], chain[index + offset] = chain[index + offset], chain[index]
+        self._edit_stack(name, chain)
+
+    def _on_apply_stack(self, action, parameter):
+        self.set_stack(parameter.get_string())
+
+    def _on_add_to_stack(self, action, parameter):
+        item = self._row_menu_item
+        if item is None:
+            return
+        name = parameter.get_string()
+        self._edit_stack(name, self.stacks.get(name, []) + [item.name])
+        self.show_toast(f"Added {item.name} to {name}")
+
+    def _on_new_stack(self, action, parameter, chain=None):
+        """Ask for a name and create a stack from chain, or from the row the menu was opened on"""
+        if chain is None:
+            chain = [self._row_menu_item.name] if self._row_menu_item else []
+        if not chain:
+            self.show_toast("No active shaders to save as a stack.")
+            return
+        entry = Gtk.Entry(placeholder_text="Stack name", activates_default=True)
+        dialog = Adw.MessageDialog(transient_for=self.window, modal=True, heading="New Stack",
+                                   body=" → ".join(chain), extra_child=entry)
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("create", "Create")
+        dialog.set_response_appearance("create", Adw.ResponseAppearance.SUGGESTED)
+        dialog.set_default_response("create")
+        dialog.connect("response", self._on_new_stack_response, entry, chain)
+        dialog.present()
+
+    def _on_new_stack_response(self, dialog, response, entry, chain):
+        name = entry.get_text().strip()
+        if response != "create" or not name:
+            return
+        if name in self.stacks:
+            self.show_toast(f"A stack named {name} already exists.", is_error=True)
+            return
+        self._edit_stack(name, chain)
+        self.show_toast(f"Created stack: {name}")
 
-    def on_row_activated(self, list_box, row):
-        if hasattr(row, 'shader_name'):
-            self.set_shader(row.shader_name)
+    def _create_duplicates_page(self):
+        page = Adw.PreferencesPage()
+        self.duplicates_group = Adw.PreferencesGroup(title="Duplicate Shaders")
+        consolidate_btn = Gtk.Button(label="Consolidate Identical", valign=Gtk.Align.CENTER,
+                                     tooltip_text="Keep one file of every identical group")
+        consolidate_btn.connect("clicked", lambda b: self._consolidate_groups(
+            [(group, None) for group in self._duplicate_groups or () if group["kind"] == "identical"]))
+        self.duplicates_group.set_header_suffix(consolidate_btn)
+        page.add(self.duplicates_group)
+        self._refresh_duplicates()
+        return page
+
+    def _refresh_duplicates(self):
+        """Group shaders by content hash, and by normalized hash for copies that only differ in formatting"""
+        if self.duplicates_group is None:
+            return
+        items = self._items_by_name
+        # Pack members are read-only, so a group needs at least one file that can go
+        groups = [group for group in find_duplicates((item.name, item.content_hash, item.normalized_hash)
+                                                     for item in self.all_shader_items)
+                  if any(name in items and not items[name].packed for name in group["names"])]
+        if groups == self._duplicate_groups:
+            return
+        self._duplicate_groups = groups
+        for row in self._duplicate_rows:
+            self.duplicates_group.remove(row)
+        self._duplicate_rows = []
+        survivors = [pick_survivor(g["names"], self.favorites, self.usage, self._active_chain) for g in groups]
+        identical = sum(1 for g, survivor in zip(groups, survivors) if g["kind"] == "identical"
+                        for name in g["names"] if name != survivor and name in items and not items[name].packed)
+        self.duplicates_group.set_description(
+            f"{identical} redundant identical file{'s' if identical != 1 else ''}. Consolidating keeps the checked "
+            "file and moves favorites, stacks and usage history over to it." if groups else "No duplicate shaders.")
+        self.duplicates_group.get_header_suffix().set_sensitive(identical > 0)
+        for group, survivor in zip(groups, survivors):
+            kind = "Identical" if group["kind"] == "identical" else "Differ only in comments or whitespace"
+            row = Adw.ExpanderRow(title=GLib.markup_escape_text(survivor),
+                                  subtitle=f"{kind}  •  {len(group['names'])} files")
+            keep = {}
+            first_check = None
+            for name in group["names"]:
+                item = items.get(name)
+                subtitle = f"{item.size_str}  •  {item.modified_str}" if item else ""
+                if item and item.packed:
+                    subtitle += "  •  Read-only pack, always kept"
+                member = Adw.ActionRow(title=GLib.markup_escape_text(name), subtitle=subtitle)
+                check = Gtk.CheckButton(active=name == survivor, group=first_check, valign=Gtk.Align.CENTER,
+                                        tooltip_text="Keep this file")
+                first_check = first_check or check
+                keep[name] = check
+                member.add_prefix(check)
+                member.set_activatable_widget(check)
+                row.add_row(member)
+            consolidate_btn = Gtk.Button(label="Consolidate", valign=Gtk.Align.CENTER, css_classes=["flat"])
+            consolidate_btn.connect("clicked", lambda b, g=group, k=keep: self._consolidate_groups(
+                [(g, next(name for name, check in k.items() if check.get_active()))]))
+            row.add_suffix(consolidate_btn)
+            self.duplicates_group.add(row)
+            self._duplicate_rows.append(row)
+
+    def _consolidate_groups(self, groups):
+        """Keep one file per group (the given one, or the best guess) and delete the rest"""
+        removed = []
+        errors = []
+        for group, survivor in groups:
+            survivor = survivor or pick_survivor(group["names"], self.favorites, self.usage, self._active_chain)
+            group_removed, group_errors = consolidate_duplicates(
+                survivor, group["names"], self.favorites, self.stacks, self.settings, self.usage, self.power_policy,
+                self.library)
+            removed += [(name, survivor) for name in group_removed]
+            errors += group_errors
+        if not removed and not errors:
+            return
+        items = self._items_by_name
+        self._show_file_changes([items[name].path for name, _ in removed if name in items])
+        self.save_favorites()
+        self.save_stacks()
+        self.save_app_settings()
+        self._refresh_stacks()
+        renames = dict(removed)
+        if any(name in renames for name in self._active_chain):
+            # The config still names a deleted copy
+            self._active_chain = [renames.get(name, name) for name in self._active_chain]
+            self._active_shader_name = self._active_chain[0]
+            self._reapply_active()
+        if errors:
+            self.show_toast(f"Could not remove {', '.join(errors)}", is_error=True)
+        else:
+            self.show_toast(f"Removed {len(removed)} duplicate{'s' if len(removed) != 1 else ''}")
 
     def _create_settings_page(self):
         page = Adw.PreferencesPage()
@@ -467,18 +1591,71 @@ class ShaderSwitcher(Adw.Application):
         row_random.connect("notify::active", self._on_setting_changed, "random_on_startup")
         general_group.add(row_random)
         
+        weighting_models = Gtk.StringList.new(["Uniform", "Favor Most Used", "Favor Rarely Used"])
+        row_weighting = Adw.ComboRow(title="Random Shader Weighting",
+                                     subtitle="How random picks lean on your usage history.",
+                                     model=weighting_models, selected=self.settings.get("random_weighting", 0))
+        row_weighting.connect("notify::selected", self._on_setting_changed, "random_weighting")
+        general_group.add(row_weighting)
+        
         row_auto_reload = Adw.SwitchRow(title="Smart Ghostty Reload", 
                                        subtitle="Automatically reload Ghostty safely when switching shaders.",
                                        active=self.settings.get("smart_reload", True))
         row_auto_reload.connect("notify::active", self._on_setting_changed, "smart_reload")
         general_group.add(row_auto_reload)
         
+        row_live_browse = Adw.SwitchRow(title="Live Browse", 
+                                        subtitle="Preview shaders in Ghostty while moving the selection; double-click applies.",
+                                        active=self.settings.get("live_browse", False))
+        row_live_browse.connect("notify::active", self._on_setting_changed, "live_browse")
+        general_group.add(row_live_browse)
+        
+        row_animation = Adw.SwitchRow(title="Manage Shader Animation", 
+                                      subtitle="Stop continuous redraws for shaders that don't use time uniforms.",
+                                      active=self.settings.get("manage_animation", True))
+        row_animation.connect("notify::active", self._on_setting_changed, "manage_animation")
+        general_group.add(row_animation)
+        
         row_preview = Adw.SwitchRow(title="Show Shader Preview", 
                                    subtitle="Display shader code preview in expandable rows.",
                                    active=self.settings.get("show_shader_preview", True))
         row_preview.connect("notify::active", self._on_setting_changed, "show_shader_preview")
         general_group.add(row_preview)
         
+        row_thumbnails = Adw.SwitchRow(title="Show Thumbnails", 
+                                       subtitle="Render each shader over a sample terminal frame (needs moderngl).",
+                                       active=self.settings.get("show_thumbnails", True))
+        row_thumbnails.connect("notify::active", self._on_setting_changed, "show_thumbnails")
+        general_group.add(row_thumbnails)
+        
+        power_group = Adw.PreferencesGroup(title="Battery")
+        page.add(power_group)
+        
+        power_models = Gtk.StringList.new(["Do Nothing", "Switch to Cheap Shader", "Stop Animation", "Disable Shader"])
+        row_power = Adw.ComboRow(title="On Battery", subtitle="What to do with the shader when running on battery.",
+                                 model=power_models, selected=self.settings.get("power_policy", 0))
+        row_power.connect("notify::selected", self._on_setting_changed, "power_policy")
+        power_group.add(row_power)
+        
+        cheap_row = Adw.EntryRow(title="Cheap Shader", show_apply_button=True,
+                                 tooltip_text="Shader file name used by \"Switch to Cheap Shader\"")
+        cheap_row.set_text(self.settings.get("power_cheap_shader", ""))
+        cheap_row.connect("apply", self._on_cheap_shader_changed)
+        power_group.add(cheap_row)
+        
+        row_threshold = Adw.SpinRow.new_with_range(5, 100, 5)
+        row_threshold.set_title("Battery Threshold")
+        row_threshold.set_subtitle("Percent charge at or below which the policy kicks in; the previous shader returns on AC.")
+        row_threshold.set_value(self.settings.get("power_threshold", 100))
+        row_threshold.connect("notify::value", self._on_setting_changed, "power_threshold")
+        power_group.add(row_threshold)
+        
+        row_background = Adw.SwitchRow(title="Keep Running in Background",
+                                       subtitle="Keep applying the battery policy after the window is closed (Ctrl+Q quits).",
+                                       active=self.settings.get("run_in_background", True))
+        row_background.connect("notify::active", self._on_setting_changed, "run_in_background")
+        power_group.add(row_background)
+        
         appearance_group = Adw.PreferencesGroup(title="Appearance")
         page.add(appearance_group)
         
@@ -488,26 +1665,115 @@ class ShaderSwitcher(Adw.Application):
         row_color.connect("notify::selected", self._on_setting_changed, "color_scheme")
         appearance_group.add(row_color)
         
+        library_group = Adw.PreferencesGroup(title="Library",
+                                             description="Subfolders and .zip packs in the shader folder are "
+                                                         "included automatically.")
+        page.add(library_group)
+        sources_row = Adw.EntryRow(title="Extra Shader Sources", show_apply_button=True,
+                                   tooltip_text=f"Folders or .zip packs separated by \"{os.pathsep}\"; "
+                                                "their shaders are listed as @name/…")
+        sources_row.set_text(os.pathsep.join(library_sources(self.settings)))
+        sources_row.connect("apply", self._on_library_sources_changed)
+        library_group.add(sources_row)
+        
+        snapshot_group = Adw.PreferencesGroup(title="Snapshots",
+                                              description="Older snapshots are pruned after each new one.")
+        page.add(snapshot_group)
+        retention = snapshot_retention(self.settings)
+        for key, title, subtitle, lowest, highest in (
+                ("keep_last", "Keep Latest", "Most recent snapshots always kept.", 1, 100),
+                ("keep_daily", "Keep Daily", "Days for which the last snapshot of the day is kept.", 0, 365),
+                ("keep_weekly", "Keep Weekly", "Weeks for which the last snapshot of the week is kept.", 0, 520)):
+            row = Adw.SpinRow.new_with_range(lowest, highest, 1)
+            row.set_title(title)
+            row.set_subtitle(subtitle)
+            row.set_value(retention[key])
+            row.connect("notify::value", self._on_setting_changed, f"snapshot_{key}")
+            snapshot_group.add(row)
+        
         advanced_group = Adw.PreferencesGroup(title="Advanced")
         page.add(advanced_group)
         
+        row_interval = Adw.SpinRow.new_with_range(0, 5000, 50)
+        row_interval.set_title("Minimum Reload Interval")
+        row_interval.set_subtitle("Milliseconds between Ghostty reloads when switching rapidly.")
+        row_interval.set_value(self.settings.get("reload_min_interval_ms", 400))
+        row_interval.connect("notify::value", self._on_setting_changed, "reload_min_interval_ms")
+        advanced_group.add(row_interval)
+        
+        row_thumbnail_cache = Adw.SpinRow.new_with_range(16, 2048, 16)
+        row_thumbnail_cache.set_title("Thumbnail Cache Size")
+        row_thumbnail_cache.set_subtitle("Megabytes of rendered thumbnails kept on disk; least recently used go first.")
+        row_thumbnail_cache.set_value(self.settings.get("thumbnail_cache_mb", 64))
+        row_thumbnail_cache.connect("notify::value", self._on_setting_changed, "thumbnail_cache_mb")
+        advanced_group.add(row_thumbnail_cache)
+        
+        row_build = Adw.SwitchRow(title="Optimize Shaders on Apply",
+                                  subtitle="Expand #include, strip comments and unused code, and apply the cached build.",
+                                  active=self.settings.get("build_shaders", False))
+        row_build.connect("notify::active", self._on_setting_changed, "build_shaders")
+        advanced_group.add(row_build)
+        
         editor_row = Adw.EntryRow(title="Preferred Editor", 
                                  text="Command to use for editing shaders (leave empty for system default)")
         editor_row.set_text(self.settings.get("preferred_editor", ""))
         editor_row.connect("changed", self._on_editor_changed)
         advanced_group.add(editor_row)
         
+        validator_row = Adw.EntryRow(title="Shader Validator Command", show_apply_button=True,
+                                     tooltip_text="Empty uses glslangValidator when installed; \"builtin\" runs basic checks only")
+        validator_row.set_text(self.settings.get("validator_command", ""))
+        validator_row.connect("apply", self._on_validator_changed)
+        advanced_group.add(validator_row)
+        
         return page
 
     def _on_editor_changed(self, entry):
         self.settings["preferred_editor"] = entry.get_text()
         self.save_app_settings()
 
+    def _on_validator_changed(self, entry):
+        self.settings["validator_command"] = entry.get_text().strip()
+        self.save_app_settings()
+        if self.shader_validator.set_command(ShaderValidator.resolve_command(self.settings["validator_command"])):
+            self._validate_items(self.all_shader_items)
+
+    def _on_library_sources_changed(self, entry):
+        roots = [p.strip() for p in entry.get_text().split(os.pathsep) if p.strip()]
+        missing = [p for p in roots if not os.path.exists(os.path.expanduser(p))]
+        if missing:
+            self.show_toast(f"Not found: {', '.join(missing)}", is_error=True)
+            return
+        self.settings["library_sources"] = roots
+        self.save_app_settings()
+        added, removed = self.library.set_extra_roots(roots)
+        for source in removed:
+            self.shader_scanner.cancel(source.key)
+            self.shader_watcher.unwatch_source(source)
+            self._scan_progress.pop(source.key, None)
+        if removed:
+            gone = {source.key for source in removed}
+            self._drop_items(lambda item: item.source in gone)
+            self._refresh_duplicates()
+        for source in added:
+            self._scan_source(source)
+
+    def _on_cheap_shader_changed(self, entry):
+        name = entry.get_text().strip()
+        if name and not self.library.exists(name):
+            self.show_toast(f"Shader not found: {name}", is_error=True)
+            return
+        self.settings["power_cheap_shader"] = name
+        self.save_app_settings()
+        self._start_power_watch()
+
     def _on_setting_changed(self, widget, _, key):
         if isinstance(widget, Adw.SwitchRow): 
             self.settings[key] = widget.get_active()
         elif isinstance(widget, Adw.ComboRow): 
             self.settings[key] = widget.get_selected()
+        elif isinstance(widget, Adw.SpinRow):
+            self.settings[key] = int(widget.get_value())
             
         if key == "color_scheme":
             sm = Adw.StyleManager.get_default()
@@ -516,14 +1782,35 @@ class ShaderSwitcher(Adw.Application):
             elif s == 2: sm.set_color_scheme(Adw.ColorScheme.FORCE_DARK)
             else: sm.set_color_scheme(Adw.ColorScheme.DEFAULT)
         elif key == "show_shader_preview":
-            self.refresh_all_lists()
+            # Rows read the preview from item metadata the scan already cached
+            for row in self._bound_rows:
+                self._sync_shader_row(row, row.item)
+        elif key == "live_browse":
+            for list_view in self.shader_list_views:
+                list_view.set_single_click_activate(not self.settings[key])
+        elif key == "manage_animation":
+            self._sync_active_animation()
+        elif key == "reload_min_interval_ms":
+            self.apply_scheduler.min_interval_ms = self.settings[key]
+        elif key == "show_thumbnails":
+            for row in self._bound_rows:
+                self._bind_row_thumbnail(row, row.item)
+        elif key == "thumbnail_cache_mb":
+            self.thumbnail_renderer.max_bytes = self.settings[key] * 1024 * 1024
+        elif key == "build_shaders":
+            # Point the config at the build (or back at the source) right away
+            self._reapply_active()
+        elif key == "power_policy":
+            self._start_power_watch()
+        elif key == "power_threshold":
+            self._check_power()
             
         self.save_app_settings()
 
     def apply_first_shader(self, *args):
-        first_row = self.all_list_box.get_row_at_index(0)
-        if first_row and hasattr(first_row, 'shader_name'):
-            self.set_shader(first_row.shader_name)
+        first_item = self.all_model.get_item(0)
+        if first_item:
+            self.set_shader(first_item.name)
 
     def toggle_selected_favorite(self, *args):
         # This would require tracking selected row - simplified for now
@@ -543,91 +1830,313 @@ class ShaderSwitcher(Adw.Application):
             self.search_revealer.set_reveal_child(False)
             self.all_search_entry.set_text("")
 
-    def on_search_changed(self, entry):
-        search_term = entry.get_text().lower()
-        if not search_term:
-            filtered_items = self.all_shader_items
+    def _search_filter_func(self, item):
+        return self._search_scores is None or item.path in self._search_scores
+
+    def _search_sort_func(self, a, b, _):
+        if self._search_scores is None:
+            return 0
+        score_a = self._search_scores.get(a.path, 0.0)
+        score_b = self._search_scores.get(b.path, 0.0)
+        return (score_a < score_b) - (score_a > score_b)
+
+    def _cost_sort_func(self, a, b, _):
+        """Cheapest first when sorting by measured or estimated cost; unknown costs go last"""
+        sort_by = self.settings.get("sort_by", 0)
+        if sort_by == 1:
+            cost_a = a.render_cost if a.render_cost >= 0 else float("inf")
+            cost_b = b.render_cost if b.render_cost >= 0 else float("inf")
+        elif sort_by == 2:
+            cost_a = a.cost_score if a.cost_score >= 0 else float("inf")
+            cost_b = b.cost_score if b.cost_score >= 0 else float("inf")
         else:
-            filtered_items = [item for item in self.all_shader_items 
-                            if search_term in item.name.lower() or 
-                               search_term in item.preview_text.lower()]
-        self._update_list_box(self.all_list_box, filtered_items)
+            return 0
+        return (cost_a > cost_b) - (cost_a < cost_b)
+
+    def _analysis_filter_func(self, item):
+        mode = self.settings.get("filter_by", 0)
+        if mode == 1:
+            return item.cost_tier == "Low"
+        if mode == 2:
+            return item.animated
+        if mode == 3:
+            return not item.animated
+        if mode == 4:
+            return item.multi_tap_blur
+        return True
+
+    def _refresh_cost_views(self, names):
+        """Re-sort and re-filter after the analysis of names changed, when a cost view is active"""
+        # Only the summary line of a stack depends on its members' metadata
+        for stack, chain in self.stacks.items():
+            row = self._stack_rows.get(stack)
+            if row is not None and names.intersection(chain):
+                row.set_subtitle(GLib.markup_escape_text(self._stack_summary(chain)))
+        if self.settings.get("sort_by", 0):
+            self.cost_sorter.changed(Gtk.SorterChange.DIFFERENT)
+        if self.settings.get("filter_by", 0):
+            self.analysis_filter.changed(Gtk.FilterChange.DIFFERENT)
+
+    def _on_filter_changed(self, dropdown, _):
+        self.settings["filter_by"] = dropdown.get_selected()
+        self.analysis_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.save_app_settings()
+
+    def _on_sort_changed(self, dropdown, _):
+        self.settings["sort_by"] = dropdown.get_selected()
+        self.cost_sorter.changed(Gtk.SorterChange.DIFFERENT)
+        self.save_app_settings()
+
+    def on_search_changed(self, entry):
+        """Debounce keystrokes; the index query runs once typing pauses"""
+        search_term = entry.get_text().strip().lower()
+        if search_term == self._search_term:
+            return
+        self._search_term = search_term
+        if self._search_source:
+            GLib.source_remove(self._search_source)
+        self._search_source = GLib.timeout_add(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_source = 0
+        self._search_scores = self.search_index.search(self._search_term) if self._search_term else None
+        self.search_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.search_sorter.changed(Gtk.SorterChange.DIFFERENT)
+        return False
 
     def on_search_activate(self, entry):
-        first_row = self.all_list_box.get_row_at_index(0)
-        if first_row and hasattr(first_row, 'shader_name'):
-            self.set_shader(first_row.shader_name)
+        if self._search_source:
+            GLib.source_remove(self._search_source)
+            self._run_search()
+        self.apply_first_shader()
 
     def load_data_files(self):
-        os.makedirs(CONFIG_DIR, exist_ok=True)
         try:
-            if os.path.exists(FAVORITES_PATH):
-                with open(FAVORITES_PATH, 'r') as f: 
-                    self.favorites = set(json.load(f))
-        except Exception: 
+            self.favorites = set(self.state.get("favorites", []))
+        except TypeError: 
             self.favorites = set()
             
+        self.usage.load()
+        
         try:
-            if os.path.exists(RECENT_PATH):
-                with open(RECENT_PATH, 'r') as f: 
-                    self.recent_shaders = json.load(f)
-        except Exception: 
-            self.recent_shaders = []
+            self.stacks = {name: list(chain) for name, chain in self.state.get("stacks", {}).items()}
+        except (AttributeError, TypeError): 
+            self.stacks = {}
 
     def load_app_settings(self):
-        os.makedirs(CONFIG_DIR, exist_ok=True)
         defaults = {
             "random_on_startup": False, 
             "color_scheme": 0,
             "smart_reload": True,
             "show_shader_preview": True,
+            "show_thumbnails": True,
+            "thumbnail_cache_mb": 64,
+            "sort_by": 0,
+            "filter_by": 0,
+            "live_browse": False,
+            "manage_animation": True,
+            "shader_animation": {},
+            "power_policy": 0,
+            "power_cheap_shader": "",
+            "power_threshold": 100,
+            "power_supply_root": "",
+            "run_in_background": True,
+            "build_shaders": False,
+            "library_sources": [],
+            "random_weighting": 0,
+            "snapshot_keep_last": 10,
+            "snapshot_keep_daily": 7,
+            "snapshot_keep_weekly": 4,
+            "reload_min_interval_ms": 400,
             "preferred_editor": ""
         }
         
-        if os.path.exists(APP_SETTINGS_PATH):
-            try:
-                with open(APP_SETTINGS_PATH, 'r') as f: 
-                    self.settings = {**defaults, **json.load(f)}
-            except Exception: 
-                self.settings = defaults
-        else: 
-            self.settings = defaults
+        stored = self.state.get("settings", {})
+        self.settings = {**defaults, **stored} if isinstance(stored, dict) else defaults
+
 
     def save_app_settings(self):
-        try:
-            with open(APP_SETTINGS_PATH, 'w') as f: 
-                json.dump(self.settings, f, indent=4)
-        except IOError as e: 
-            self.show_toast(f"Error saving settings: {e}", is_error=True)
+        # Written behind by the state store once changes stop, not on every call
+        self.state.set("settings", self.settings)
+
+    def _on_state_error(self, error):
+        """Called from the store's writer thread"""
+        GLib.idle_add(self.show_toast, f"Error saving settings: {error}", True)
 
     def refresh_all_lists(self, *args):
+        """Rescan every library source in the background; results stream in through _on_scan_batch"""
         if self.shutting_down: 
             return
-        try:
-            self._active_shader_name = self.get_current_shader_from_config()
-            os.makedirs(SHADER_DIR, exist_ok=True)
-            valid_exts = (".glsl", ".frag", ".vert", ".fs", ".vs")
-            files = sorted([f for f in os.listdir(SHADER_DIR) if f.lower().endswith(valid_exts)], 
-                          key=str.lower)
-            
-            self.all_shader_items = [ShaderItem(name, os.path.join(SHADER_DIR, name)) for name in files]
-            
-            for item in self.all_shader_items:
-                item.is_active = (item.name == self._active_shader_name)
+        self._load_active_from_config()
+        for source in self.library.sources():
+            self._scan_source(source)
+
+    def _scan_source(self, source):
+        self.shader_scanner.scan(source, GLib.idle_add, self._on_scan_batch, self._on_scan_done)
+
+    def _on_scan_batch(self, source, generation, results, scanned, total):
+        if not self.shader_scanner.is_current(source.key, generation) or self.shutting_down:
+            return False
+        added = []
+        for name, path, meta in results:
+            item = self._items_by_path.get(path)
+            if item is None:
+                item = ShaderItem(name, path, meta, source)
+                added.append(item)
+            else:
+                item.apply_metadata(meta)
+            self._apply_derived(item)
+            if meta:
+                self.search_index.add(path, name, meta.get("hash"), meta.get("tokens"))
+        if added:
+            for item in added:
+                item.is_active = (item.name in self._active_chain)
                 item.is_favorite = (item.name in self.favorites)
-            
-            self.on_search_changed(self.all_search_entry)
-            
-            favs = [s for s in self.all_shader_items if s.is_favorite]
-            recents = [s for name in self.recent_shaders[:15] 
-                      if (s := next((sh for sh in self.all_shader_items if sh.name == name), None))]
-            
-            self._update_list_box(self.favorites_list_box, favs)
-            self._update_list_box(self.recent_list_box, recents)
+            self._add_shader_items(added)
             self.update_status_label()
-            
-        except Exception as e:
-            self.show_toast(f"Error reading shaders: {e}", is_error=True)
+        
+        # Sources scan side by side; the bar shows their combined progress
+        self._scan_progress[source.key] = (scanned, total)
+        scanned = sum(done for done, _ in self._scan_progress.values())
+        total = sum(count for _, count in self._scan_progress.values())
+        if scanned < total:
+            self.scan_progress.set_fraction(scanned / total)
+            self.scan_progress.set_text(f"{scanned} of {total} scanned")
+            self.scan_revealer.set_reveal_child(True)
+        return False
+
+    def _on_scan_done(self, source, generation, live_paths, error):
+        if not self.shader_scanner.is_current(source.key, generation) or self.shutting_down:
+            return False
+        self._scan_progress.pop(source.key, None)
+        if not self._scan_progress:
+            self.scan_revealer.set_reveal_child(False)
+        if error is not None:
+            label = "shaders" if source is self.library.local else os.path.basename(source.key)
+            self.show_toast(f"Error reading {label}: {error}", is_error=True)
+            live_paths = set()
+        
+        self.shader_watcher.watch_source(source)
+        removed = []
+        if source.writable and error is None:
+            removed = self.library.mount_packs(source)[1]
+            # Unchanged packs are answered from their cache without opening the archive
+            for pack in self.library.sources():
+                if not pack.writable and pack.parent is source:
+                    self._scan_source(pack)
+        gone = {pack.key for pack in removed}
+        for pack in removed:
+            self.shader_scanner.cancel(pack.key)
+        dropped = self._drop_items(
+            lambda item: item.source in gone or (item.source == source.key and item.path not in live_paths))
+        if error is not None:
+            return False
+        
+        if self._search_term:
+            self._run_search()
+        scanned = [item for item in self.all_shader_items if item.source == source.key]
+        self._validate_items(scanned)
+        self._refresh_cost_views({item.name for item in scanned + dropped})
+        self._refresh_duplicates()
+        
+        if source is self.library.local:
+            if self._pending_random:
+                self._pending_random = False
+                self.set_random_shader()
+            self.startup_timer.mark("shader list populated")
+            self.startup_timer.report("interactive")
+        return False
+
+    def _drop_items(self, stale):
+        """Remove the items stale() picks from every list and the search index, and return them"""
+        removed = [item for item in self.all_shader_items if stale(item)]
+        for item in removed:
+            self.search_index.remove(item.path)
+        self._remove_shader_items(removed)
+        self._update_all_lists()
+        return removed
+
+    def _update_all_lists(self):
+        for item in self.all_shader_items:
+            is_active = (item.name in self._active_chain)
+            is_favorite = (item.name in self.favorites)
+            if item.is_active != is_active:
+                item.is_active = is_active
+            if item.is_favorite != is_favorite:
+                item.is_favorite = is_favorite
+        self._highlight_active_stack()
+        
+        favorites = frozenset(self.favorites)
+        if favorites != self._favorites_snapshot:
+            self._favorites_snapshot = favorites
+            self.favorites_filter.changed(Gtk.FilterChange.DIFFERENT)
+        
+        if self.usage.version != self._usage_version:
+            self._usage_version = self.usage.version
+            most_used_rank = {name: i for i, name in enumerate(self.usage.top(RECENT_LIMIT))}
+            if most_used_rank != self._most_used_rank:
+                self._most_used_rank = most_used_rank
+                self.most_used_filter.changed(Gtk.FilterChange.DIFFERENT)
+                self.most_used_sorter.changed(Gtk.SorterChange.DIFFERENT)
+        
+        self.update_status_label()
+
+    def _validate_items(self, items):
+        """Show cached validation results and validate the rest on the process pool"""
+        jobs = []
+        for item in items:
+            result = self.shader_validator.result(item.content_hash)
+            item.apply_validation(result)
+            if result is None and item.content_hash and not item.packed:
+                self._validation_targets[item.path] = item
+                jobs.append((item.path, item.content_hash))
+        if jobs:
+            self.shader_validator.validate(jobs, GLib.idle_add, self._on_validation_results)
+
+    def _on_validation_results(self, results):
+        if self.shutting_down:
+            return False
+        for path, content_hash, valid, message in results:
+            item = self._validation_targets.pop(path, None)
+            if item is not None and item.content_hash == content_hash and valid is not None:
+                item.apply_validation((valid, message))
+        return False
+
+    def _apply_derived(self, item):
+        """Copy content-hash keyed results from the index onto the item"""
+        profile = self.shader_index.derived_for(item.content_hash).get("profile")
+        cost = profile["cost"] if profile else -1.0
+        if item.render_cost != cost:
+            item.render_cost = cost
+
+    def profile_shaders(self, *args):
+        """Measure the render cost of every unprofiled shader, one at a time in a worker process"""
+        jobs = [(item.path, item.content_hash) for item in self.all_shader_items
+                if item.content_hash and item.validation != "invalid" and not item.packed]
+        self._profile_generation, count = self.shader_profiler.profile(
+            jobs, GLib.idle_add, self._on_profile_result, self._on_profile_done)
+        if count:
+            self.show_toast(f"Profiling {count} shader{'s' if count != 1 else ''} in the background…")
+        else:
+            self.show_toast("All shaders are already profiled")
+
+    def _on_profile_result(self, generation, path, content_hash, profile, error, done, total):
+        if generation != self._profile_generation or self.shutting_down:
+            return False
+        for item in self.all_shader_items:
+            if item.content_hash == content_hash:
+                self._apply_derived(item)
+        if self.settings.get("sort_by", 0) == 1:
+            self.cost_sorter.changed(Gtk.SorterChange.DIFFERENT)
+        self.scan_progress.set_fraction(done / total)
+        self.scan_progress.set_text(f"Profiled {done} of {total}: {os.path.basename(path)}")
+        self.scan_revealer.set_reveal_child(done < total)
+        return False
+
+    def _on_profile_done(self, generation):
+        if generation == self._profile_generation and not self.shutting_down:
+            self.scan_revealer.set_reveal_child(False)
+        return False
 
     def create_actions(self):
         actions = [
@@ -638,13 +2147,28 @@ class ShaderSwitcher(Adw.Application):
             ("disable", self.disable_shader_with_confirmation),
             ("create_shader", self.create_new_shader),
             ("backup_shaders", self.backup_shaders),
-            ("check_ghostty", self.check_ghostty_status)
+            ("show_snapshots", self.show_snapshots),
+            ("check_ghostty", self.check_ghostty_status),
+            ("profile_shaders", self.profile_shaders)
         ]
         
         for name, callback in actions:
             action = Gio.SimpleAction.new(name, None)
             action.connect("activate", callback)
             self.add_action(action)
+        
+        animation_action = Gio.SimpleAction.new_stateful(
+            "shader_animation", GLib.VariantType.new("s"), GLib.Variant("s", "auto"))
+        animation_action.connect("activate", self._on_shader_animation_activate)
+        self.add_action(animation_action)
+        
+        for name, callback in (("add_to_stack", self._on_add_to_stack), ("apply_stack", self._on_apply_stack)):
+            action = Gio.SimpleAction.new(name, GLib.VariantType.new("s"))
+            action.connect("activate", callback)
+            self.add_action(action)
+        new_stack_action = Gio.SimpleAction.new("new_stack", None)
+        new_stack_action.connect("activate", self._on_new_stack)
+        self.add_action(new_stack_action)
 
     def on_favorite_toggled(self, button, item):
         is_active = button.get_active()
@@ -658,46 +2182,34 @@ class ShaderSwitcher(Adw.Application):
             self.show_toast(f"Removed {item.name} from favorites")
             
         self.save_favorites()
-        self.refresh_all_lists()
+        self._update_all_lists()
 
     def save_favorites(self):
-        try:
-            with open(FAVORITES_PATH, 'w') as f: 
-                json.dump(list(self.favorites), f, indent=4)
-        except IOError as e: 
-            self.show_toast(f"Error saving favorites: {e}", is_error=True)
+        self.state.set("favorites", sorted(self.favorites))
+
+    def save_stacks(self):
+        self.state.set("stacks", self.stacks)
 
     def is_ghostty_running(self):
         """Check if Ghostty is currently running"""
-        try:
-            result = subprocess.run(["pgrep", "-x", "ghostty"], 
-                                  capture_output=True, text=True, timeout=2)
-            return result.returncode == 0
-        except:
-            return False
+        return self.ghostty_tracker.is_running()
 
     def get_ghostty_pids(self):
         """Get all Ghostty process IDs"""
-        try:
-            result = subprocess.run(["pgrep", "-x", "ghostty"], 
-                                  capture_output=True, text=True, timeout=2)
-            if result.returncode == 0:
-                return [int(pid.strip()) for pid in result.stdout.strip().split('\n') if pid.strip()]
-            return []
-        except:
-            return []
+        return self.ghostty_tracker.get_pids()
 
     def smart_ghostty_reload(self):
         """Intelligently reload Ghostty based on current state"""
-        if not self.is_ghostty_running():
+        if not self.ghostty_tracker.scan():
             self.show_toast("Ghostty is not running", is_error=True)
             return
             
         # Try graceful reload first
         try:
-            subprocess.run(["pkill", "-SIGHUP", "ghostty"], check=False, timeout=3)
+            if not self.ghostty_tracker.send_signal(signal.SIGHUP):
+                raise PermissionError("no Ghostty process accepted SIGHUP")
             self.show_toast("✅ Ghostty reloaded successfully")
-        except subprocess.TimeoutExpired:
+        except PermissionError:
             # If graceful reload fails, offer to restart
             dialog = Adw.MessageDialog(
                 transient_for=self.window, 
@@ -716,7 +2228,8 @@ class ShaderSwitcher(Adw.Application):
     def _on_restart_ghostty_response(self, dialog, response):
         if response == "restart":
             try:
-                subprocess.run(["pkill", "-TERM", "ghostty"], check=False, timeout=3)
+                self.ghostty_tracker.send_signal(signal.SIGTERM)
+                self.ghostty_tracker.invalidate()
                 # Wait a moment, then try to start it again
                 GLib.timeout_add(1000, self._restart_ghostty_delayed)
                 self.show_toast("Restarting Ghostty...")
@@ -726,83 +2239,139 @@ class ShaderSwitcher(Adw.Application):
     def _restart_ghostty_delayed(self):
         try:
             subprocess.Popen(["ghostty"], start_new_session=True)
+            self.ghostty_tracker.invalidate()
             self.show_toast("Ghostty restarted")
         except Exception as e:
             self.show_toast(f"Could not restart Ghostty: {e}", is_error=True)
         return False
 
-    def _write_shader_to_config_safe(self, shader_path=None):
+    def _write_shader_to_config_safe(self, shader_path=None, animation=None):
         """Safely write shader configuration without causing crashes"""
-        if not os.path.exists(os.path.dirname(CONFIG_PATH)):
-            os.makedirs(os.path.dirname(CONFIG_PATH))
-
-        current_lines = []
-        if os.path.exists(CONFIG_PATH):
-            with open(CONFIG_PATH, 'r') as f:
-                current_lines = f.readlines()
-        
-        new_lines = []
-        key_found = False
-        
-        for line in current_lines:
-            if line.strip().startswith(GHOSTTY_CONFIG_KEY):
-                key_found = True
-                if shader_path:
-                    new_lines.append(f'{GHOSTTY_CONFIG_KEY} = "{shader_path}"\n')
-            else:
-                new_lines.append(line)
-        
-        if not key_found and shader_path:
-            new_lines.append(f'\n{GHOSTTY_CONFIG_KEY} = "{shader_path}"\n')
-        
-        # Write atomically
-        tmp_path = CONFIG_PATH + ".tmp"
-        with open(tmp_path, 'w') as f:
-            f.writelines(new_lines)
-        
-        os.replace(tmp_path, CONFIG_PATH)
+        write_shader_config(shader_path, animation=animation, config=self.ghostty_config)
 
+    def _on_reload_due(self):
         # Smart reload based on settings
         if self.settings.get("smart_reload", True):
-            GLib.timeout_add(100, self._delayed_ghostty_signal)
+            self._delayed_ghostty_signal()
         else:
             self.show_toast("💡 Manually reload Ghostty to see changes", timeout=3)
 
     def _delayed_ghostty_signal(self):
         """Send reload signal with delay to prevent crashes"""
         try:
-            if self.is_ghostty_running():
-                subprocess.run(["pkill", "-SIGHUP", "ghostty"], check=False, timeout=2)
-        except:
+            self.ghostty_tracker.send_signal(signal.SIGHUP)
+        except OSError:
             pass
         return False
 
-    def set_shader(self, shader_name):
+    def set_shader(self, shader_name, record=True, delay_ms=0, force=False):
         if self.shutting_down: 
             return
             
-        shader_path = os.path.join(SHADER_DIR, shader_name)
-        if not os.path.isfile(shader_path):
+        if not self.library.exists(shader_name):
             self.show_toast(f"Shader not found: {shader_name}", is_error=True)
             self.refresh_all_lists()
             return
         
-        self._write_shader_to_config_safe(shader_path)
-        
-        # Update recent shaders
-        if shader_name in self.recent_shaders: 
-            self.recent_shaders.remove(shader_name)
-        self.recent_shaders.insert(0, shader_name)
-        self.recent_shaders = self.recent_shaders[:15]
+        item = self._items_by_name.get(shader_name)
+        if not force and item is not None and item.validation == "invalid":
+            toast = Adw.Toast(title=f"{shader_name} failed validation: {item.validation_message}",
+                              button_label="Apply Anyway", timeout=6)
+            toast.add_css_class("error")
+            toast.connect("button-clicked", lambda t: self.set_shader(shader_name, record, force=True))
+            self.toast_overlay.add_toast(toast)
+            return
         
+        if record:
+            self._on_manual_shader_choice()
+        # The UI follows immediately; the config write and reload are coalesced by the scheduler
+        self._active_shader_name = shader_name
+        self._active_chain = [shader_name]
+        self.apply_scheduler.request((shader_name, shader_name, record), delay_ms)
+        self._update_all_lists()
+
+    def _chain_animation(self, names):
+        """custom-shader-animation for the shaders in names, honouring the battery policy"""
+        if not names:
+            return None
+        items = self._items_by_name
+
+        def animated(name):
+            # Unknown shaders keep animating rather than risk freezing an effect
+            item = items.get(name)
+            if item is None:
+                return True
+            if item.includes and not item.packed:
+                # The cached analysis only saw this file; follow its #includes now
+                return shader_animated(item.path)
+            return item.animated
+        modes = [shader_animation(self.settings, name, animated(name)) for name in names]
+        return self._power_animation or combine_animation(modes)
+
+    def _on_apply_due(self, request):
+        shader, shader_name, record = request
+        names = shader if isinstance(shader, list) else [shader] if shader else []
+        animation = self._chain_animation(names)
         try:
-            with open(RECENT_PATH, 'w') as f: 
-                json.dump(self.recent_shaders, f, indent=4)
-        except Exception:
-            pass
+            # Pack members are extracted only here, once a (possibly debounced) apply is due
+            paths = [self.library.materialize(name) for name in names]
+        except OSError as e:
+            self.show_toast(f"Cannot read shader: {e}", is_error=True)
+            return
+        if paths and self.settings.get("build_shaders", False):
+            try:
+                paths = [self.shader_builder.build(path) for path in paths]
+            except (ShaderBuildError, OSError) as e:
+                self.show_toast(f"Build failed: {e}", is_error=True)
+                return
+            self.shader_watcher.watch_dependencies(self.shader_builder.dependencies())
+        try:
+            self._write_shader_to_config_safe(paths or None, animation)
+        except OSError as e:
+            self.show_toast(f"Error writing Ghostty config: {e}", is_error=True)
+            return
+        if record and len(paths) < 2:
+            # A disable is logged too: it ends the running shader's time on screen
+            self.usage.record(shader_name)
+            self._update_all_lists()
+        if not shader_name:
+            return
+        if len(paths) > 1:
+            self.show_toast(f"✅ Applied stack: {shader_name}")
+            return
         
         self.show_toast(f"✅ Applied shader: {shader_name}")
-        self.refresh_all_lists()
+
+    def _apply_chain(self, chain, stack_name=None, force=False, manual=True):
+        """Apply several shaders as one Ghostty chain: a single config write and a single reload"""
+        if self.shutting_down:
+            return
+        missing = [name for name in chain if not self.library.exists(name)]
+        if missing:
+            self.show_toast(f"Stack refers to missing shaders: {', '.join(missing)}", is_error=True)
+            return
+        items = self._items_by_name
+        invalid = [name for name in chain if name in items and items[name].validation == "invalid"]
+        if invalid and not force:
+            toast = Adw.Toast(title=f"{', '.join(invalid)} failed validation", button_label="Apply Anyway", timeout=6)
+            toast.add_css_class("error")
+            toast.connect("button-clicked", lambda t: self._apply_chain(chain, stack_name, True, manual))
+            self.toast_overlay.add_toast(toast)
+            return
+        if manual:
+            self._on_manual_shader_choice()
+        self._active_chain = list(chain)
+        self._active_shader_name = chain[0]
+        self.apply_scheduler.request((list(chain),
+                                      stack_name or " → ".join(chain), False))
+        self._update_all_lists()
+
+    def set_stack(self, stack_name):
+        chain = self.stacks.get(stack_name)
+        if not chain:
+            self.show_toast(f"Stack not found: {stack_name}", is_error=True)
+            return
+        self._apply_chain(chain, stack_name)
 
     def edit_shader(self, button, item):
         """Open shader in preferred editor"""
@@ -826,7 +2395,9 @@ class ShaderSwitcher(Adw.Application):
 
     def set_random_shader(self, *args):
         if self.all_shader_items:
-            item = random.choice(self.all_shader_items)
+            candidates = [i for i in self.all_shader_items if i.validation != "invalid"] or self.all_shader_items
+            weights = self.usage.random_weights([i.name for i in candidates], random_weighting(self.settings))
+            item = random.choices(candidates, weights)[0]
             self.set_shader(item.name)
             self.show_toast(f"🎲 Random shader: {item.name}")
         else: 
@@ -834,16 +2405,19 @@ class ShaderSwitcher(Adw.Application):
 
     def disable_shader_quick(self):
         """Quick disable without confirmation"""
-        if not self.get_current_shader_from_config():
+        if not self._active_shader_name and not self.get_current_shader_from_config():
             self.show_toast("No active shader to disable.")
             return
             
-        self._write_shader_to_config_safe(None)
+        self._on_manual_shader_choice()
+        self.apply_scheduler.request((None, None, True))
+        self._active_shader_name = None
+        self._active_chain = []
         self.show_toast("✅ Shader disabled")
-        self.refresh_all_lists()
+        self._update_all_lists()
 
     def disable_shader_with_confirmation(self, *args):
-        if not self.get_current_shader_from_config():
+        if not self._active_shader_name and not self.get_current_shader_from_config():
             self.show_toast("No active shader to disable.")
             return
             
@@ -906,21 +2480,14 @@ class ShaderSwitcher(Adw.Application):
             self.show_toast(f"Shader {name} already exists", is_error=True)
             return
             
+        # Ghostty supplies the Shadertoy-style uniforms (iResolution, iTime, iChannel0, ...) and calls mainImage
         template = """// New Ghostty Shader
 // Author: 
 // Description: 
 
-#version 330 core
-
-uniform float time;
-uniform vec2 resolution;
-uniform sampler2D texture;
-
-in vec2 uv;
-out vec4 fragColor;
-
-void main() {
-    vec4 color = texture2D(texture, uv);
+void mainImage(out vec4 fragColor, in vec2 fragCoord) {
+    vec2 uv = fragCoord / iResolution.xy;
+    vec4 color = texture(iChannel0, uv);
     
     // Add your shader effects here
     
@@ -934,7 +2501,7 @@ void main() {
                 f.write(template)
             
             self.show_toast(f"Created {name}")
-            self.refresh_all_lists()
+            self._show_file_changes([path])
             
             # Open in editor immediately
             GLib.timeout_add(500, lambda: self.edit_shader(None, type('obj', (), {'path': path, 'name': name})()))
@@ -989,7 +2556,7 @@ void main() {
                             try:
                                 shutil.copy2(file.get_path(), dest_path)
                                 self.show_toast(f"Imported '{file.get_basename()}'")
-                                self.refresh_all_lists()
+                                self._show_file_changes([dest_path])
                             except Exception as e:
                                 self.show_toast(f"Failed to import: {e}", is_error=True)
                         overwrite_dialog.destroy()
@@ -999,35 +2566,170 @@ void main() {
                 else:
                     shutil.copy2(file.get_path(), dest_path)
                     self.show_toast(f"Imported '{file.get_basename()}'")
-                    self.refresh_all_lists()
+                    self._show_file_changes([dest_path])
                     
             except Exception as e:
                 self.show_toast(f"Failed to import: {e}", is_error=True)
         dialog.destroy()
 
     def backup_shaders(self, *args):
-        """Create a backup of all shaders"""
-        try:
-            backup_dir = os.path.join(CONFIG_DIR, "backups")
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(backup_dir, f"shaders_backup_{timestamp}.tar.gz")
-            
-            import tarfile
-            with tarfile.open(backup_path, "w:gz") as tar:
-                if os.path.exists(SHADER_DIR):
-                    tar.add(SHADER_DIR, arcname="shaders")
-            
-            self.show_toast(f"✅ Backup created: {os.path.basename(backup_path)}")
-            
-        except Exception as e:
-            self.show_toast(f"Error creating backup: {e}", is_error=True)
+        """Take an incremental snapshot of SHADER_DIR on a worker thread, then apply the retention policy"""
+        self.snapshot_store.run(GLib.idle_add, self._on_snapshot_done, self._take_snapshot,
+                                snapshot_retention(self.settings))
+
+    def _take_snapshot(self, retention):
+        # Runs on the snapshot worker thread
+        manifest, created = self.snapshot_store.snapshot(SHADER_DIR)
+        dropped = self.snapshot_store.prune(**retention)
+        return manifest, created, dropped, self.snapshot_store.disk_usage()[1]
+
+    def _on_snapshot_done(self, result, error):
+        if self.shutting_down:
+            return False
+        if error is not None:
+            self.show_toast(f"Error creating snapshot: {error}", is_error=True)
+            return False
+        manifest, created, dropped, disk_size = result
+        if created:
+            changed = manifest["added_files"]
+            self.show_toast(f"✅ Snapshot saved: {changed} new file version{'s' if changed != 1 else ''}, "
+                            f"+{format_size(manifest['added_bytes'])} ({format_size(disk_size)} in all snapshots)")
+        else:
+            self.show_toast("No changes since the last snapshot")
+        self._refresh_snapshot_window()
+        return False
+
+    def show_snapshots(self, *args):
+        window = Adw.PreferencesWindow(transient_for=self.window, modal=True, title="Snapshots",
+                                       default_width=640, default_height=560, search_enabled=False)
+        page = Adw.PreferencesPage()
+        self._snapshots_group = Adw.PreferencesGroup(title="Snapshots")
+        snapshot_btn = Gtk.Button(label="Snapshot Now", valign=Gtk.Align.CENTER)
+        snapshot_btn.connect("clicked", self.backup_shaders)
+        self._snapshots_group.set_header_suffix(snapshot_btn)
+        page.add(self._snapshots_group)
+        window.add(page)
+        window.connect("close-request", self._on_snapshot_window_closed)
+        self._snapshot_window = window
+        self._snapshot_rows = []
+        self._refresh_snapshot_window()
+        window.present()
+
+    def _on_snapshot_window_closed(self, window):
+        self._snapshot_window = None
+        self._snapshots_group = None
+        self._snapshot_rows = []
+        return False
+
+    def _refresh_snapshot_window(self):
+        if self._snapshot_window is None:
+            return
+        # Manifests and blob sizes are read on the snapshot worker, never on the UI thread
+        self.snapshot_store.run(GLib.idle_add, self._on_snapshot_list_loaded, self._load_snapshot_list)
+
+    def _load_snapshot_list(self):
+        # Runs on the snapshot worker thread
+        return self.snapshot_store.snapshots(), self.snapshot_store.disk_usage()
+
+    def _on_snapshot_list_loaded(self, result, error):
+        if self.shutting_down or self._snapshot_window is None:
+            return False
+        if error is not None:
+            self.show_toast(f"Could not read snapshots: {error}", is_error=True)
+            return False
+        snapshots, (blobs, disk_size) = result
+        for row in self._snapshot_rows:
+            self._snapshots_group.remove(row)
+        self._snapshot_rows = []
+        self._snapshots_group.set_description(
+            f"{len(snapshots)} snapshot{'s' if len(snapshots) != 1 else ''} holding "
+            f"{format_size(sum(m['size'] for m in snapshots))} of shaders in {format_size(disk_size)} "
+            f"({blobs} unique compressed files). Expand one to restore single shaders."
+            if snapshots else "No snapshots yet.")
+        for manifest in snapshots:
+            when = datetime.fromtimestamp(manifest["time"]).strftime("%a %d %b %Y, %H:%M")
+            details = (f"{len(manifest['files'])} files  •  {format_size(manifest['size'])}  •  "
+                       f"+{format_size(manifest['added_bytes'])} stored")
+            row = Adw.ExpanderRow(title=GLib.markup_escape_text(manifest["label"] or when),
+                                  subtitle=f"{when}  •  {details}" if manifest["label"] else details)
+            restore_btn = Gtk.Button(label="Restore All", valign=Gtk.Align.CENTER, css_classes=["flat"])
+            restore_btn.connect("clicked", lambda b, m=manifest, w=when: self._confirm_restore_snapshot(m["id"], w))
+            row.add_suffix(restore_btn)
+            # Comparing with the current files is deferred until the row is opened
+            row.connect("notify::expanded", self._on_snapshot_expanded, manifest["id"])
+            self._snapshots_group.add(row)
+            self._snapshot_rows.append(row)
+        return False
+
+    def _on_snapshot_expanded(self, row, _, snapshot_id):
+        if not row.get_expanded() or getattr(row, "diff_loaded", False):
+            return
+        row.diff_loaded = True
+        self.snapshot_store.run(GLib.idle_add,
+                                lambda changes, error: self._on_snapshot_diff_loaded(row, snapshot_id, changes, error),
+                                self.snapshot_store.diff, snapshot_id, SHADER_DIR)
+
+    def _on_snapshot_diff_loaded(self, row, snapshot_id, changes, error):
+        if self.shutting_down or row not in self._snapshot_rows:
+            return False
+        if error is not None:
+            row.diff_loaded = False
+            self.show_toast(f"Could not read snapshot: {error}", is_error=True)
+            return False
+        if not changes:
+            row.add_row(Adw.ActionRow(title="Identical to the current shaders"))
+        labels = {"modified": "Changed since", "deleted": "Deleted since", "added": "Added since (not in snapshot)"}
+        for path, change in changes:
+            member = Adw.ActionRow(title=GLib.markup_escape_text(path), subtitle=labels[change])
+            if change != "added":
+                restore_btn = Gtk.Button(icon_name="edit-undo-symbolic", tooltip_text="Restore This Version",
+                                         valign=Gtk.Align.CENTER, css_classes=["flat"])
+                restore_btn.connect("clicked", lambda b, p=path: self._restore_snapshot(snapshot_id, [p]))
+                member.add_suffix(restore_btn)
+            row.add_row(member)
+        return False
+
+    def _confirm_restore_snapshot(self, snapshot_id, when):
+        dialog = Adw.MessageDialog(
+            transient_for=self._snapshot_window or self.window, modal=True,
+            heading="Restore All Shaders?",
+            body=f"The shader folder goes back to how it was on {when}, including removing files added since. "
+                 "The current state is snapshotted first, so this can be undone.")
+        dialog.add_response("cancel", "Cancel")
+        dialog.add_response("restore", "Restore")
+        dialog.set_response_appearance("restore", Adw.ResponseAppearance.DESTRUCTIVE)
+        
+        def on_restore_response(dialog, response):
+            if response == "restore":
+                self._restore_snapshot(snapshot_id)
+        
+        dialog.connect("response", on_restore_response)
+        dialog.present()
+
+    def _restore_snapshot(self, snapshot_id, paths=None):
+        self.snapshot_store.run(GLib.idle_add, self._on_restore_done, self.snapshot_store.restore,
+                                snapshot_id, paths, SHADER_DIR)
+
+    def _on_restore_done(self, restored, error):
+        if self.shutting_down:
+            return False
+        if error is not None:
+            self.show_toast(f"Restore failed: {error}", is_error=True)
+            return False
+        self.show_toast(f"✅ Restored {restored[0] if len(restored) == 1 else f'{len(restored)} files'}")
+        self._refresh_snapshot_window()
+        paths = [os.path.join(SHADER_DIR, rel) for rel in restored if rel.split(os.sep)[0] != "lib"]
+        if not self.shader_watcher.watching:
+            # Restore All also deletes shaders the snapshot didn't have
+            paths += [item.path for item in self.all_shader_items
+                      if item.source == self.library.local.key and not os.path.exists(item.path)]
+        self._show_file_changes(paths)
+        return False
 
     def check_ghostty_status(self, *args):
         """Check and display Ghostty status"""
-        is_running = self.is_ghostty_running()
-        pids = self.get_ghostty_pids()
+        pids = self.ghostty_tracker.scan()
+        is_running = bool(pids)
         
         if is_running:
             status = f"✅ Ghostty is running ({len(pids)} process{'es' if len(pids) != 1 else ''})"
@@ -1056,6 +2758,7 @@ void main() {
             elif response == "start":
                 try:
                     subprocess.Popen(["ghostty"], start_new_session=True)
+                    self.ghostty_tracker.invalidate()
                     self.show_toast("Starting Ghostty...")
                 except Exception as e:
                     self.show_toast(f"Could not start Ghostty: {e}", is_error=True)
@@ -1069,23 +2772,28 @@ void main() {
         uri = GLib.filename_to_uri(SHADER_DIR, None)
         Gtk.show_uri(self.window, uri, Gdk.CURRENT_TIME)
 
+    def _shader_name_for(self, path):
+        """Library name of a configured shader path, which may be a build or an extracted pack member"""
+        return self.library.name_for_path(self.shader_builder.source_for(path) or path)
+
+    def _load_active_from_config(self):
+        self._active_chain = [self._shader_name_for(path) for path in self.ghostty_config.shader_paths()]
+        self._active_shader_name = self._active_chain[0] if self._active_chain else None
+
     def get_current_shader_from_config(self, get_path=False):
-        if not os.path.exists(CONFIG_PATH): 
-            return None
-        try:
-            with open(CONFIG_PATH, 'r') as f:
-                for line in f:
-                    if line.strip().startswith(GHOSTTY_CONFIG_KEY):
-                        path_part = line.split('=', 1)[1].strip().strip('"')
-                        return path_part if get_path else os.path.basename(path_part)
-        except Exception: 
+        path_part = self.ghostty_config.current_shader()
+        if not path_part:
             return None
-        return None
+        return path_part if get_path else self._shader_name_for(path_part)
 
     def update_status_label(self):
         shader_count = len(self.all_shader_items)
         
-        if self._active_shader_name:
+        if len(self._active_chain) > 1:
+            stack_name = match_stack(self.stacks, self._active_chain)
+            self.status_icon.set_from_icon_name("view-list-symbolic")
+            self.status_label.set_text(f"Stack: {stack_name}" if stack_name else " + ".join(self._active_chain))
+        elif self._active_shader_name:
             self.status_icon.set_from_icon_name("object-select-symbolic")
             self.status_label.set_text(self._active_shader_name)
         else:
@@ -1097,6 +2805,8 @@ void main() {
         stats_text = f"{shader_count} shader{'s' if shader_count != 1 else ''}"
         if fav_count > 0:
             stats_text += f" • {fav_count} favorite{'s' if fav_count != 1 else ''}"
+        if len(self._active_chain) > 1:
+            stats_text += f" • {self._stack_summary(self._active_chain)}"
         
         self.shader_stats_label.set_text(stats_text)
 
@@ -1106,7 +2816,7 @@ void main() {
             toast.set_timeout(timeout)
         if is_error: 
             toast.add_css_class("error")
-        self.toast_overlay.add_toast(toast)
+        (self._snapshot_window or self.toast_overlay).add_toast(toast)
 
     
 if __name__ == "__main__":
@@ -0,0 +1,3583 @@
+"""Ghostty shader switcher core: everything that works without GTK.
+
+shader-switch.py builds the GUI on top of this module; the command line mode
+uses it directly so it never has to import GTK.
+"""
+import os
+import signal
+import json
+import hashlib
+import re
+import bisect
+import stat
+import zlib
+import errno
+import random
+import threading
+import contextlib
+import time
+import urllib.parse
+from datetime import datetime
+import sys
+
+# --- Configuration ---
+CONFIG_DIR = os.path.expanduser("~/.config/ghostty-shader-switcher")
+SHADER_DIR = os.path.expanduser("~/.config/ghostty/shaders")
+SHADER_LIB_DIR = os.path.join(SHADER_DIR, "lib")
+CONFIG_PATH = os.path.expanduser("~/.config/ghostty/config")
+FAVORITES_PATH = os.path.join(CONFIG_DIR, "favorites.json")
+RECENT_PATH = os.path.join(CONFIG_DIR, "recent.json")
+USAGE_LOG_PATH = os.path.join(CONFIG_DIR, "usage.log")
+USAGE_STATE_PATH = os.path.join(CONFIG_DIR, "usage_state.json")
+APP_SETTINGS_PATH = os.path.join(CONFIG_DIR, "settings.json")
+STATE_DB_PATH = os.path.join(CONFIG_DIR, "state.db")
+SHADER_CACHE_PATH = os.path.join(CONFIG_DIR, "shader_cache.json")
+VALIDATION_CACHE_PATH = os.path.join(CONFIG_DIR, "validation_cache.json")
+THUMBNAIL_DIR = os.path.join(CONFIG_DIR, "thumbnails")
+BUILD_DIR = os.path.join(CONFIG_DIR, "build")
+BACKUP_DIR = os.path.join(CONFIG_DIR, "backups")
+LIBRARY_CACHE_DIR = os.path.join(CONFIG_DIR, "library")
+PACK_EXTRACT_DIR = os.path.join(CONFIG_DIR, "packs")
+POWER_STATE_PATH = os.path.join(CONFIG_DIR, "power_state.json")
+STACKS_PATH = os.path.join(CONFIG_DIR, "stacks.json")
+POWER_SUPPLY_ROOT = "/sys/class/power_supply"
+POWER_POLICIES = ("off", "cheap", "static", "disable")
+GHOSTTY_CONFIG_KEY = "custom-shader"
+ANIMATION_CONFIG_KEY = "custom-shader-animation"
+ANIMATION_MODES = ("true", "false", "always")
+SHADER_EXTENSIONS = (".glsl", ".frag", ".vert", ".fs", ".vs")
+PACK_EXTENSIONS = (".zip",)
+RECENT_LIMIT = 15
+RANDOM_WEIGHTINGS = ("uniform", "frequent", "fresh")
+COPY_SUFFIX_RE = re.compile(r"_copy\d+$")
+IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _atomic_write(path, data):
+    """Replace path with data (str or bytes) in one rename, so readers never see a partial file.
+
+    The temporary name is unique per process and thread, so the GUI, its workers and the command
+    line never write into each other's. Raises OSError; callers decide whether a failure matters.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+class ShaderIndex:
+    """Persistent shader metadata index, keyed by (path, size, mtime_ns, inode).
+
+    Results that depend only on a shader's content (render profiles, ...) live in a
+    separate map keyed by content hash, so renames and copies share them. Each entry also
+    carries a hash of the source with comments and whitespace normalized, for spotting copies
+    that differ only in formatting.
+    """
+    VERSION = 5
+    PREVIEW_LINES = 5
+    PREVIEW_BYTES = 4096
+
+    def __init__(self, cache_path=SHADER_CACHE_PATH):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.derived = {}
+        self.dirty = False
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        # Deferred so constructing the index never reads the cache on the UI thread
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.load()
+                    self.loaded = True
+
+    def load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.entries = data.get("entries", {})
+                self.derived = data.get("derived", {})
+        except Exception:
+            self.entries = {}
+            self.derived = {}
+
+    def save(self):
+        """Write the index atomically, only if something changed"""
+        self._ensure_loaded()
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": self.VERSION, "entries": self.entries, "derived": self.derived}
+            self.dirty = False
+        try:
+            _atomic_write(self.cache_path, json.dumps(data, separators=(",", ":")))
+        except OSError:
+            with self.lock:
+                self.dirty = True
+
+    @staticmethod
+    def stat_key(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def lookup(self, path, st=None):
+        """Return cached metadata for path, re-reading the file only if it changed"""
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return None
+        key = self.stat_key(st)
+        self._ensure_loaded()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry.get("key") == key:
+                return entry
+        entry = self.read_metadata(path, st)
+        entry["key"] = key
+        with self.lock:
+            self.entries[path] = entry
+            self.dirty = True
+        return entry
+
+    def update(self, path, **fields):
+        """Attach derived fields to an existing entry"""
+        self._ensure_loaded()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                entry.update(fields)
+                self.dirty = True
+
+    def derived_for(self, content_hash):
+        """Content-derived fields for a hash (empty if none were stored)"""
+        self._ensure_loaded()
+        return self.derived.get(content_hash, {}) if content_hash else {}
+
+    def set_derived(self, content_hash, **fields):
+        self._ensure_loaded()
+        with self.lock:
+            self.derived.setdefault(content_hash, {}).update(fields)
+            self.dirty = True
+
+    def forget(self, path):
+        self._ensure_loaded()
+        with self.lock:
+            if self.entries.pop(path, None) is not None:
+                self.dirty = True
+
+    def hashes(self):
+        self._ensure_loaded()
+        with self.lock:
+            return {entry.get("hash") for entry in self.entries.values()}
+
+    def prune(self, live_paths, keep_hashes=()):
+        """Drop entries for files that no longer exist, and derived results no entry or keep_hashes uses"""
+        live_paths = set(live_paths)
+        self._ensure_loaded()
+        with self.lock:
+            stale = [p for p in self.entries if p not in live_paths]
+            for p in stale:
+                del self.entries[p]
+            live_hashes = {entry.get("hash") for entry in self.entries.values()} | set(keep_hashes)
+            orphaned = [h for h in self.derived if h not in live_hashes]
+            for h in orphaned:
+                del self.derived[h]
+            if stale or orphaned:
+                self.dirty = True
+
+    @classmethod
+    def read_metadata(cls, path, st):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+        return cls.describe(data, st.st_size, st.st_mtime)
+
+    @classmethod
+    def describe(cls, data, size, mtime):
+        """Index entry for shader source bytes; data is None for a file that could not be read"""
+        entry = {
+            "size_str": f"{size / 1024:.1f} KB",
+            "modified_str": datetime.fromtimestamp(mtime).strftime("%d %b %Y"),
+            "preview": "Preview unavailable",
+            "hash": None,
+            "normalized_hash": None,
+            "tokens": "",
+            "analysis": None,
+        }
+        if data is None:
+            return entry
+        lines = data[:cls.PREVIEW_BYTES].decode('utf-8', errors='replace').splitlines()[:cls.PREVIEW_LINES]
+        entry["preview"] = '\n'.join(lines).strip()
+        entry["hash"] = hashlib.blake2b(data, digest_size=16).hexdigest()
+        # Identifier vocabulary of the whole source, consumed by ShaderSearchIndex
+        text = data.decode('utf-8', errors='replace')
+        glsl = glsl_tokens(text)
+        entry["normalized_hash"] = hashlib.blake2b(normalize_glsl(text, glsl).encode(), digest_size=16).hexdigest()
+        entry["tokens"] = " ".join(sorted({t.lower() for t in IDENTIFIER_RE.findall(text)}))
+        entry["analysis"] = analyze_glsl(text, glsl)
+        return entry
+
+
+GLSL_TOKEN_RE = re.compile(
+    r"#[^\n]*|\d+\.\d*(?:[eE][+-]?\d+)?[fF]?|\.\d+(?:[eE][+-]?\d+)?[fF]?|\d+[uU]?|[A-Za-z_]\w*"
+    r"|\+\+|--|[-+*/<>=!]=|&&|\|\||\S")
+GLSL_DEFINE_RE = re.compile(r"#\s*define\s+([A-Za-z_]\w*)\s+\(?\s*([-+]?(?:\d+\.?\d*|\.\d+))[fFuU]?\s*\)?\s*$")
+GLSL_MACRO_RE = re.compile(r"#\s*define\b")
+TEXTURE_FUNCTIONS = {"texture", "texture2D", "textureLod", "textureGrad", "textureOffset", "textureProj",
+                     "texelFetch", "textureLodOffset"}
+MATH_FUNCTIONS = {"sin", "cos", "tan", "asin", "acos", "atan", "pow", "exp", "exp2", "log", "log2", "sqrt",
+                  "inversesqrt", "normalize", "length", "distance", "smoothstep", "reflect", "refract", "cross"}
+TIME_UNIFORMS = ("iTime", "iTimeDelta", "iFrame", "iDate", "iTimeCursorChange")
+DEFAULT_LOOP_BOUND = 8
+MAX_LOOP_BOUND = 1024
+COST_WEIGHTS = {"samples": 4.0, "math": 1.0, "branches": 0.5}
+COST_TIERS = ((20, "Low"), (80, "Medium"), (float("inf"), "High"))
+
+
+def _loop_iterations(header, constants):
+    """Iteration count of a for-loop header (tokens between the parentheses), or None if it isn't static"""
+    parts = [[]]
+    for token in header:
+        if token == ";":
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    if len(parts) != 3:
+        return None
+    init, cond, step = parts
+
+    def value(tokens):
+        sign = 1
+        if tokens[:1] in (["-"], ["+"]):
+            sign = -1 if tokens[0] == "-" else 1
+            tokens = tokens[1:]
+        if len(tokens) != 1:
+            return None
+        if tokens[0] in constants:
+            return sign * constants[tokens[0]]
+        try:
+            return sign * float(tokens[0].rstrip("fFuU"))
+        except ValueError:
+            return None
+    if "=" not in init or len(cond) < 3 or cond[1] not in ("<", "<=", ">", ">="):
+        return None
+    start = value(init[init.index("=") + 1:])
+    limit = value(cond[2:])
+    increment = 1.0
+    if len(step) >= 3 and step[1] in ("+=", "-="):
+        increment = value(step[2:])
+    if start is None or limit is None or not increment:
+        return None
+    span = abs(limit - start) + (increment if cond[1] in ("<=", ">=") else 0)
+    return max(1, min(MAX_LOOP_BOUND, -int(-span // abs(increment))))
+
+
+def glsl_tokens(text):
+    return GLSL_TOKEN_RE.findall(_blank_comments(text))
+
+
+def analyze_glsl(text, tokens=None):
+    """Static cost estimate for a Ghostty shader: per-fragment texture samples, math builtins, branches and loops.
+
+    Counts inside loops are multiplied by the loop's static bound (DEFAULT_LOOP_BOUND when it has none) and
+    helper functions are charged at their call sites, starting from mainImage.
+    """
+    tokens = glsl_tokens(text) if tokens is None else tokens
+    directives = [t for t in tokens if t[0] == "#"]
+    constants = {}
+    for match in filter(None, (GLSL_DEFINE_RE.match(t) for t in directives)):
+        constants[match.group(1)] = float(match.group(2))
+    tokens = [t for t in tokens if t[0] != "#"]
+    for i in [i for i, t in enumerate(tokens) if t == "const"]:
+        if tokens[i + 3:i + 4] == ["="]:
+            try:
+                constants[tokens[i + 2]] = float(tokens[i + 4].rstrip("fFuU"))
+            except (ValueError, IndexError):
+                pass
+
+    # Top-level function bodies: "name ( ... ) {" at brace depth 0
+    functions = {}
+    depth = 0
+    opened = 0
+    for i in [i for i, t in enumerate(tokens) if t == "{" or t == "}"]:
+        if tokens[i] == "{":
+            if depth == 0:
+                opened = i
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0 and tokens[opened - 1] == ")":
+                # Parameter lists have no nested parentheses, so the last "(" before ")" opens it
+                j = opened - 2
+                while j > 0 and tokens[j] != "(":
+                    j -= 1
+                if j > 0:
+                    functions[tokens[j - 1]] = tokens[opened + 1:i]
+
+    interesting = TEXTURE_FUNCTIONS | MATH_FUNCTIONS | set(functions) | {
+        "{", "}", ";", "for", "while", "if", "?", "case"}
+    loops = []
+    own = {}
+    for name, body in functions.items():
+        stats = {"samples": 0.0, "math": 0.0, "branches": 0.0, "loop_samples": 0.0}
+        calls = {}
+        scopes = []
+        multiplier = 1
+        depth = 0
+        i = 0
+        n = len(body)
+        while i < n:
+            token = body[i]
+            if token not in interesting:
+                i += 1
+                continue
+            if token == "{":
+                depth += 1
+            elif token == "}":
+                if scopes and scopes[-1][0] == ("brace", depth):
+                    multiplier //= scopes.pop()[1]
+                depth -= 1
+            elif token == ";":
+                while scopes and scopes[-1][0] == ("statement", depth):
+                    multiplier //= scopes.pop()[1]
+            elif token in ("if", "?", "case"):
+                stats["branches"] += multiplier
+            elif i + 1 < n and body[i + 1] == "(":
+                if token in ("for", "while"):
+                    end, paren = i + 2, 1
+                    while end < n and paren:
+                        paren += {"(": 1, ")": -1}.get(body[end], 0)
+                        end += 1
+                    bound = _loop_iterations(body[i + 2:end - 1], constants) if token == "for" else None
+                    loops.append(bound)
+                    # A braced body ends with its closing brace, a single statement with the next ";"
+                    factor = bound or DEFAULT_LOOP_BOUND
+                    multiplier *= factor
+                    if end < n and body[end] == "{":
+                        depth += 1
+                        scopes.append((("brace", depth), factor))
+                        i = end + 1
+                    else:
+                        scopes.append((("statement", depth), factor))
+                        i = end
+                    continue
+                if token in TEXTURE_FUNCTIONS:
+                    stats["samples"] += multiplier
+                    if multiplier > 1:
+                        stats["loop_samples"] += multiplier
+                elif token in MATH_FUNCTIONS:
+                    stats["math"] += multiplier
+                elif token != name:
+                    calls[token] = calls.get(token, 0) + multiplier
+            i += 1
+        own[name] = (stats, calls)
+
+    totals = {}
+
+    def total(name, stack=()):
+        if name not in totals:
+            stats, calls = own[name]
+            result = dict(stats)
+            for callee, count in calls.items():
+                if callee not in stack:
+                    for key, value in total(callee, stack + (name,)).items():
+                        result[key] += count * value
+            totals[name] = result
+        return totals[name]
+
+    if "mainImage" in functions:
+        entry = total("mainImage")
+    else:
+        called = {callee for _, calls in own.values() for callee in calls}
+        entry = {"samples": 0.0, "math": 0.0, "branches": 0.0, "loop_samples": 0.0}
+        for name in functions:
+            if name not in called:
+                for key, value in total(name).items():
+                    entry[key] += value
+
+    score = sum(entry[key] * weight for key, weight in COST_WEIGHTS.items())
+    token_set = set(tokens)
+    # "#define t iTime" reads time wherever t is used
+    for directive in directives:
+        if GLSL_MACRO_RE.match(directive):
+            token_set.update(IDENTIFIER_RE.findall(directive))
+    time_uniforms = [u for u in TIME_UNIFORMS if u in token_set]
+    includes = any(GLSL_INCLUDE_RE.match(directive) for directive in directives)
+    return {
+        "samples": round(entry["samples"], 1),
+        "math": round(entry["math"], 1),
+        "branches": round(entry["branches"], 1),
+        "loops": len(loops),
+        "max_loop": max((b for b in loops if b), default=None),
+        "unbounded_loops": sum(1 for b in loops if b is None),
+        # Included code isn't visible here; freezing a moving effect is worse than redrawing a still one
+        "animated": bool(time_uniforms) or includes,
+        "time_uniforms": time_uniforms,
+        "includes": includes,
+        "blur": entry["loop_samples"] >= 4 or entry["samples"] >= 8,
+        "score": round(score),
+        "tier": cost_tier(score),
+    }
+
+
+def cost_tier(score):
+    return next(label for limit, label in COST_TIERS if score < limit)
+
+
+def stack_cost(scores, render_costs=()):
+    """Combined cost of a shader chain; every pass shades the whole frame, so member costs add up.
+
+    A member with an unknown cost (None) makes that total None rather than an underestimate.
+    """
+    score = None if not scores or None in scores else sum(scores)
+    render = None if not render_costs or None in render_costs else sum(render_costs)
+    return {"score": score, "tier": cost_tier(score) if score is not None else None, "render_ms": render}
+
+
+class ShaderSearchIndex:
+    """Inverted index over shader names and source identifiers, with a trigram vocabulary"""
+    NAME_WEIGHT = 4.0
+    SOURCE_WEIGHT = 1.0
+
+    def __init__(self):
+        self.docs = {}
+        self.name_postings = {}
+        self.source_postings = {}
+        self.trigrams = {}
+
+    @staticmethod
+    def _name_tokens(name):
+        stem = os.path.splitext(name)[0].lower()
+        return {stem, *(t for t in re.split(r"[^a-z0-9]+", stem) if t)}
+
+    @staticmethod
+    def _trigrams(token):
+        return {token[i:i + 3] for i in range(len(token) - 2)}
+
+    def add(self, path, name, content_hash, tokens):
+        """Index a document; unchanged content is skipped"""
+        doc = self.docs.get(path)
+        if doc and doc[0] == content_hash and doc[1] == name:
+            return
+        if doc:
+            self.remove(path)
+        name_tokens = self._name_tokens(name)
+        source_tokens = set(tokens.split()) if tokens else set()
+        self.docs[path] = (content_hash, name, name_tokens, source_tokens)
+        for postings, doc_tokens in ((self.name_postings, name_tokens), (self.source_postings, source_tokens)):
+            for token in doc_tokens:
+                if token not in self.name_postings and token not in self.source_postings:
+                    for tri in self._trigrams(token):
+                        self.trigrams.setdefault(tri, set()).add(token)
+                postings.setdefault(token, set()).add(path)
+
+    def remove(self, path):
+        doc = self.docs.pop(path, None)
+        if not doc:
+            return
+        for postings, doc_tokens in ((self.name_postings, doc[2]), (self.source_postings, doc[3])):
+            for token in doc_tokens:
+                paths = postings.get(token)
+                if paths is None:
+                    continue
+                paths.discard(path)
+                if not paths:
+                    del postings[token]
+                    if token not in self.name_postings and token not in self.source_postings:
+                        for tri in self._trigrams(token):
+                            vocab = self.trigrams.get(tri)
+                            if vocab:
+                                vocab.discard(token)
+                                if not vocab:
+                                    del self.trigrams[tri]
+
+    def _matching_tokens(self, term):
+        if len(term) < 3:
+            vocabulary = self.name_postings.keys() | self.source_postings.keys()
+            return [t for t in vocabulary if t.startswith(term)]
+        candidates = None
+        for tri in self._trigrams(term):
+            vocab = self.trigrams.get(tri)
+            if not vocab:
+                return []
+            candidates = set(vocab) if candidates is None else candidates & vocab
+        return [t for t in candidates if term in t]
+
+    def _score_term(self, term):
+        total = max(len(self.docs), 1)
+        scores = {}
+        for token in self._matching_tokens(term):
+            closeness = 3.0 if token == term else 2.0 if token.startswith(term) else 1.0
+            for postings, weight in ((self.name_postings, self.NAME_WEIGHT), (self.source_postings, self.SOURCE_WEIGHT)):
+                paths = postings.get(token)
+                if not paths:
+                    continue
+                score = closeness * weight * (1.0 + total / len(paths)) ** 0.5
+                for path in paths:
+                    if score > scores.get(path, 0.0):
+                        scores[path] = score
+        return scores
+
+    @staticmethod
+    def fuzzy_score(query, text):
+        """Subsequence match score favouring contiguous runs and early hits; 0 if no match"""
+        score = 0.0
+        position = 0
+        run = 0
+        for ch in query:
+            found = text.find(ch, position)
+            if found < 0:
+                return 0.0
+            run = run + 1 if found == position else 1
+            score += run / (1 + found * 0.05)
+            position = found + 1
+        return score
+
+    def search(self, query):
+        """Return {path: score} for documents matching every term of query"""
+        terms = query.lower().split()
+        if not terms:
+            return {}
+        results = None
+        for term in terms:
+            scores = self._score_term(term)
+            if results is None:
+                results = scores
+            else:
+                results = {p: results[p] + s for p, s in scores.items() if p in results}
+            if not results:
+                break
+        if results:
+            return results
+        # No exact or substring hits: fall back to typo-tolerant matching on names
+        compact = "".join(terms)
+        fuzzy = {}
+        for path, doc in self.docs.items():
+            score = self.fuzzy_score(compact, doc[1].lower())
+            if score:
+                fuzzy[path] = score
+        return fuzzy
+
+
+def _source_digest(path):
+    return hashlib.blake2b(os.path.realpath(path).encode(), digest_size=8).hexdigest()
+
+
+class DirectorySource:
+    """A directory tree of shaders with its own metadata index.
+
+    Names are paths below the root with "/" separators, after prefix. Hidden directories and
+    those in skip (the #include directory of the main shader folder) are left out; .zip files
+    met on the way are kept in pack_paths for the library to mount.
+    """
+    writable = True
+
+    def __init__(self, root, prefix="", index=None, skip=()):
+        self.root = os.path.abspath(root)
+        self.prefix = prefix
+        self.key = self.root
+        self.index = index or ShaderIndex(os.path.join(LIBRARY_CACHE_DIR, _source_digest(self.root) + ".json"))
+        self.skip = {os.path.abspath(p) for p in skip}
+        self.directories = [self.root]
+        self.pack_paths = []
+
+    def contains(self, path):
+        return path.startswith(self.root + os.sep)
+
+    def name_for(self, path):
+        return self.prefix + os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def path_for(self, name):
+        return os.path.join(self.root, *name[len(self.prefix):].split("/"))
+
+    def walk(self):
+        """[(name, path)] of every shader below the root; an unreadable root raises OSError"""
+        shaders, packs, directories = [], [], []
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                if directory == self.root:
+                    raise
+                continue
+            directories.append(directory)
+            for entry in entries:
+                lowered = entry.name.lower()
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith(".") and entry.path not in self.skip:
+                        pending.append(entry.path)
+                elif lowered.endswith(SHADER_EXTENSIONS) and entry.is_file():
+                    shaders.append((self.name_for(entry.path), entry.path))
+                elif lowered.endswith(PACK_EXTENSIONS) and entry.is_file():
+                    packs.append(entry.path)
+        self.directories = directories
+        self.pack_paths = sorted(packs)
+        return shaders
+
+    def lookup(self, name):
+        return self.index.lookup(self.path_for(name))
+
+    def hashes(self):
+        return self.index.hashes()
+
+
+class ShaderPack:
+    """A read-only .zip of shaders, indexed in place from the archive's central directory.
+
+    The member list is cached against the archive's stat key and each member's metadata against
+    its CRC and size, so an unchanged pack is listed without opening it and a changed one only
+    decompresses the members that differ. Item paths point inside the archive; a member reaches
+    the disk only when it is applied, under extract_dir at the same relative name it has in the
+    library, so an extracted file maps back to its name without the pack being mounted.
+    """
+    VERSION = 2
+    writable = False
+
+    def __init__(self, zip_path, prefix, parent=None, extract_dir=PACK_EXTRACT_DIR):
+        self.zip_path = os.path.abspath(zip_path)
+        self.prefix = prefix
+        self.parent = parent
+        self.key = self.zip_path
+        self.cache_path = os.path.join(LIBRARY_CACHE_DIR, _source_digest(self.zip_path) + ".json")
+        self.extract_dir = extract_dir
+        self.members = None
+        self.stat_key = None
+        self.lock = threading.Lock()
+
+    def contains(self, path):
+        return path.startswith(self.zip_path + os.sep)
+
+    def name_for(self, path):
+        return self.prefix + os.path.relpath(path, self.zip_path).replace(os.sep, "/")
+
+    def path_for(self, name):
+        return os.path.join(self.zip_path, *name[len(self.prefix):].split("/"))
+
+    @staticmethod
+    def _is_shader_member(info):
+        parts = info.filename.split("/")
+        # Names that would escape the extraction directory are never listed
+        return (not info.is_dir() and info.filename.lower().endswith(SHADER_EXTENSIONS)
+                and not info.filename.startswith("/") and ".." not in parts and "\\" not in info.filename)
+
+    def _load(self):
+        if self.members is None:
+            data = load_json_file(self.cache_path, {})
+            current = data.get("version") == self.VERSION
+            self.members = data.get("members", {}) if current else {}
+            self.stat_key = data.get("key") if current else None
+
+    def _reindex(self, key):
+        import zipfile
+        members = {}
+        try:
+            with zipfile.ZipFile(self.zip_path) as archive:
+                for info in archive.infolist():
+                    if not self._is_shader_member(info):
+                        continue
+                    member_key = [info.CRC, info.file_size]
+                    entry = self.members.get(info.filename)
+                    if entry is None or entry.get("key") != member_key:
+                        try:
+                            data = archive.read(info)
+                        except (zipfile.BadZipFile, NotImplementedError, RuntimeError, OSError):
+                            data = None
+                        entry = ShaderIndex.describe(data, info.file_size, time.mktime(info.date_time + (0, 0, -1)))
+                        entry["key"] = member_key
+                    members[info.filename] = entry
+        except zipfile.BadZipFile as e:
+            raise OSError(errno.EIO, str(e), self.zip_path)
+        self.members = members
+        self.stat_key = key
+        try:
+            _atomic_write(self.cache_path, json.dumps({"version": self.VERSION, "key": key, "members": members},
+                                                      separators=(",", ":")))
+        except OSError:
+            pass
+
+    def scan(self):
+        """[(name, path, meta)] for every shader in the pack; raises OSError, also for a damaged archive"""
+        key = ShaderIndex.stat_key(os.stat(self.zip_path))
+        with self.lock:
+            self._load()
+            if self.stat_key != key:
+                self._reindex(key)
+            members = sorted(self.members.items())
+        return [(self.prefix + member, self.path_for(self.prefix + member), entry) for member, entry in members]
+
+    def lookup(self, name):
+        with self.lock:
+            self._load()
+            return self.members.get(name[len(self.prefix):])
+
+    def hashes(self):
+        with self.lock:
+            self._load()
+            return {entry.get("hash") for entry in self.members.values()}
+
+    def extract(self, name):
+        """Path of the extracted member name, written only if missing or different from the archive"""
+        import zipfile
+        member = name[len(self.prefix):]
+        target = os.path.join(self.extract_dir, *name.split("/"))
+        try:
+            with zipfile.ZipFile(self.zip_path) as archive:
+                info = archive.getinfo(member)
+                try:
+                    with open(target, 'rb') as f:
+                        data = f.read()
+                    if len(data) == info.file_size and zlib.crc32(data) == info.CRC:
+                        return target
+                except OSError:
+                    pass
+                data = archive.read(info)
+        except KeyError:
+            raise FileNotFoundError(errno.ENOENT, "Not in the pack", name)
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+            raise OSError(errno.EIO, str(e), self.zip_path)
+        _atomic_write(target, data)
+        return target
+
+
+def library_sources(settings):
+    return [p for p in settings.get("library_sources") or [] if isinstance(p, str) and p.strip()]
+
+
+class ShaderLibrary:
+    """Every place shaders come from, mounted under one namespace of names.
+
+    The shader directory is walked recursively and keeps the plain relative names it always
+    had. .zip packs found in it mount as read-only sources named after the archive
+    ("packs/retro.zip/crt.glsl"), and extra roots - folders or packs - as "@<name>/...". Each
+    source has its own metadata cache and scan, so a large pack never slows down the local
+    directory.
+    """
+    def __init__(self, index=None, root=SHADER_DIR, extra_roots=(), extract_dir=PACK_EXTRACT_DIR):
+        root = os.path.abspath(root)
+        self.local = DirectorySource(root, "", index or ShaderIndex(), skip=(os.path.join(root, "lib"),))
+        self.extract_dir = extract_dir
+        self.extra = []
+        self.packs = {}
+        self.lock = threading.Lock()
+        self.set_extra_roots(extra_roots)
+
+    def set_extra_roots(self, roots):
+        """Mount roots as the extra sources; returns (added, removed) sources, packs inside them included"""
+        previous = list(self.extra)
+        current = {(source.key, source.prefix): source for source in previous}
+        extra, labels = [], set()
+        for root in roots:
+            root = os.path.abspath(os.path.expanduser(root))
+            label = base = os.path.basename(root) or "root"
+            suffix = 1
+            while label in labels:
+                suffix += 1
+                label = f"{base}{suffix}"
+            labels.add(label)
+            prefix = f"@{label}/"
+            source = current.get((root, prefix))
+            if source is None:
+                if root.lower().endswith(PACK_EXTENSIONS):
+                    source = ShaderPack(root, prefix, extract_dir=self.extract_dir)
+                else:
+                    source = DirectorySource(root, prefix)
+            extra.append(source)
+        removed = [source for source in previous if source not in extra]
+        with self.lock:
+            self.extra = extra
+            for path, pack in list(self.packs.items()):
+                if pack.parent in removed:
+                    removed.append(self.packs.pop(path))
+        return [source for source in extra if source not in previous], removed
+
+    def sources(self):
+        with self.lock:
+            return [self.local, *self.extra, *self.packs.values()]
+
+    def source(self, key):
+        for source in self.sources():
+            if source.key == key:
+                return source
+        return None
+
+    def mount_packs(self, parent):
+        """Mount the packs parent's last walk found and unmount those that are gone; returns (added, removed)"""
+        wanted = set(parent.pack_paths)
+        with self.lock:
+            removed = [self.packs.pop(path) for path, pack in list(self.packs.items())
+                       if pack.parent is parent and path not in wanted]
+            added = []
+            for path in parent.pack_paths:
+                if path not in self.packs:
+                    self.packs[path] = ShaderPack(path, parent.name_for(path) + "/", parent, self.extract_dir)
+                    added.append(self.packs[path])
+        return added, removed
+
+    def source_for_name(self, name):
+        best = self.local
+        for source in self.sources():
+            if name.startswith(source.prefix) and len(source.prefix) > len(best.prefix):
+                best = source
+        if best.writable:
+            # A pack in a folder that has not been walked yet
+            parts = name.split("/")
+            for i in range(1, len(parts)):
+                prefix = "/".join(parts[:i])
+                path = best.path_for(prefix)
+                if parts[i - 1].lower().endswith(PACK_EXTENSIONS) and os.path.isfile(path):
+                    with self.lock:
+                        if path not in self.packs:
+                            self.packs[path] = ShaderPack(path, prefix + "/", best, self.extract_dir)
+                        return self.packs[path]
+        return best
+
+    def source_for_path(self, path):
+        """The directory source a file belongs to (the innermost root wins)"""
+        path = os.path.abspath(path)
+        best = None
+        for source in self.sources():
+            if source.writable and source.contains(path) and (best is None or len(source.root) > len(best.root)):
+                best = source
+        return best
+
+    def name_for_path(self, path):
+        """Library name of a shader file or an extracted pack member; the file name for anything else"""
+        path = os.path.abspath(path)
+        if path.startswith(self.extract_dir + os.sep):
+            return os.path.relpath(path, self.extract_dir).replace(os.sep, "/")
+        source = self.source_for_path(path)
+        return source.name_for(path) if source else os.path.basename(path)
+
+    def path_for(self, name):
+        return self.source_for_name(name).path_for(name)
+
+    def lookup(self, name):
+        """Cached metadata for name, or None if it is missing"""
+        try:
+            return self.source_for_name(name).lookup(name)
+        except OSError:
+            return None
+
+    def exists(self, name):
+        source = self.source_for_name(name)
+        if source.writable:
+            return os.path.isfile(source.path_for(name))
+        return self.lookup(name) is not None
+
+    def materialize(self, name):
+        """A file Ghostty can read for name, extracting pack members; raises OSError if it is missing"""
+        source = self.source_for_name(name)
+        if not source.writable:
+            return source.extract(name)
+        path = source.path_for(name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(errno.ENOENT, "No such shader", name)
+        return path
+
+    def hashes(self, exclude=None):
+        """Content hashes of every source but exclude"""
+        hashes = set()
+        for source in self.sources():
+            if source is not exclude:
+                try:
+                    hashes |= source.hashes()
+                except OSError:
+                    pass
+        return hashes
+
+    def names(self):
+        """Every shader name in every source, read synchronously for the command line"""
+        names = []
+        for source in [self.local] + [s for s in self.extra if s.writable]:
+            try:
+                names += [name for name, _ in source.walk()]
+            except OSError:
+                continue
+            self.mount_packs(source)
+        for source in self.sources():
+            if not source.writable:
+                try:
+                    names += [name for name, _, _ in source.scan()]
+                except OSError:
+                    pass
+        return sorted(names, key=str.lower)
+
+
+class ShaderScanner:
+    """Scans library sources on a bounded thread pool and delivers metadata in batches.
+
+    Every source has its own scan generation, so rescanning a pack never cancels the scan of the
+    local directory and the other way round.
+    """
+    BATCH_SIZE = 128
+
+    def __init__(self, library, max_workers=4):
+        from concurrent.futures import ThreadPoolExecutor
+        self.library = library
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shader-scan")
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def cancel(self, key=None):
+        with self.lock:
+            for k in ([key] if key else list(self.generations)):
+                self.generations[k] = self.generations.get(k, 0) + 1
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def is_current(self, key, generation):
+        return self.generations.get(key) == generation
+
+    def scan(self, source, deliver, on_batch, on_done):
+        """Start a scan of source that supersedes any running scan of it.
+
+        deliver(callback, *args) must hand the call over to the UI thread; callbacks receive the
+        source and scan generation first so stale results can be dropped.
+        """
+        with self.lock:
+            generation = self.generations.get(source.key, 0) + 1
+            self.generations[source.key] = generation
+        threading.Thread(target=self._run, args=(source, generation, deliver, on_batch, on_done),
+                         daemon=True).start()
+        return generation
+
+    def _run(self, source, generation, deliver, on_batch, on_done):
+        try:
+            if not source.writable:
+                # One read of the central directory; only new or changed members are decompressed
+                results = source.scan()
+            else:
+                if source is self.library.local:
+                    os.makedirs(source.root, exist_ok=True)
+                entries = source.walk()
+        except OSError as e:
+            deliver(on_done, source, generation, None, e)
+            return
+        
+        if not source.writable:
+            total = len(results)
+            for start in range(0, total, self.BATCH_SIZE):
+                if not self.is_current(source.key, generation):
+                    return
+                batch = results[start:start + self.BATCH_SIZE]
+                deliver(on_batch, source, generation, batch, start + len(batch), total)
+            deliver(on_done, source, generation, {path for _, path, _ in results}, None)
+            return
+        
+        total = len(entries)
+        deliver(on_batch, source, generation, [], 0, total)
+        batches = [entries[i:i + self.BATCH_SIZE] for i in range(0, total, self.BATCH_SIZE)]
+        try:
+            futures = [self.executor.submit(self._scan_batch, source, generation, batch) for batch in batches]
+        except RuntimeError:
+            return
+        scanned = 0
+        from concurrent.futures import as_completed
+        for future in as_completed(futures):
+            if not self.is_current(source.key, generation):
+                for f in futures:
+                    f.cancel()
+                return
+            results = future.result()
+            scanned += len(results)
+            deliver(on_batch, source, generation, results, scanned, total)
+        
+        if not self.is_current(source.key, generation):
+            return
+        live_paths = {path for _, path in entries}
+        # Render profiles live in the local index, keyed by content hash, for shaders of every source
+        keep = self.library.hashes(exclude=source) if source is self.library.local else ()
+        source.index.prune(live_paths, keep)
+        source.index.save()
+        deliver(on_done, source, generation, live_paths, None)
+
+    def _scan_batch(self, source, generation, batch):
+        results = []
+        for name, path in batch:
+            if not self.is_current(source.key, generation):
+                break
+            results.append((name, path, source.index.lookup(path)))
+        return results
+
+
+# Ghostty compiles custom shaders as Shadertoy-style fragment shaders: this prelude stands in
+# for the uniforms and entry point it supplies, so a shader is checked exactly as written
+GHOSTTY_SHADER_PRELUDE = """#version 430 core
+uniform vec3 iResolution;
+uniform float iTime;
+uniform float iTimeDelta;
+uniform float iFrameRate;
+uniform int iFrame;
+uniform float iChannelTime[4];
+uniform vec3 iChannelResolution[4];
+uniform vec4 iMouse;
+uniform vec4 iDate;
+uniform float iSampleRate;
+uniform vec4 iCurrentCursor;
+uniform vec4 iPreviousCursor;
+uniform vec4 iCurrentCursorColor;
+uniform vec4 iPreviousCursorColor;
+uniform float iTimeCursorChange;
+uniform sampler2D iChannel0;
+out vec4 _ghosttyFragColor;
+void mainImage(out vec4 fragColor, in vec2 fragCoord);
+void main() { mainImage(_ghosttyFragColor, gl_FragCoord.xy); }
+#line 1
+"""
+GLSL_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+GLSL_ERROR_RE = re.compile(r"^ERROR:\s*(?:\d+:(\d+):)?\s*(.*)$", re.M)
+GLSL_INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*include[ \t]+["<]([^">\n]+)[">][ \t]*$', re.M)
+GLSL_DIRECTIVE_RE = re.compile(r"^[ \t]*#[^\n]*", re.M)
+GLSL_CONDITIONAL_RE = re.compile(r"^[ \t]*#[ \t]*(?:if|ifdef|ifndef|elif|undef)\b([^\n]*)", re.M)
+GLSL_OBJECT_DEFINE_RE = re.compile(r"^[ \t]*#[ \t]*define[ \t]+([A-Za-z_]\w*)(?:[ \t]+([^\n]*?))?[ \t]*$", re.M)
+GLSL_CONSTANT_EXPR_RE = re.compile(r"[\w\s.+\-*/%(),]+")
+GLSL_CONSTANT_NAMES = {"float", "int", "uint", "bool", "true", "false", "vec2", "vec3", "vec4",
+                       "ivec2", "ivec3", "ivec4", "uvec2", "uvec3", "uvec4", "mat2", "mat3", "mat4"}
+GLSL_ATOMIC_EXPR_RE = re.compile(r"[\w.]+|\w*\([^()]*\)")
+GLSL_IDENTIFIER_USE_RE = re.compile(r"(?<![\w.])([A-Za-z_]\w*)")
+GLSL_FUNCTION_RE = re.compile(r"\b([A-Za-z_]\w*)\s+([A-Za-z_]\w*)\s*\([^(){};]*\)\s*([{;])")
+GLSL_FUNCTION_QUALIFIERS_RE = re.compile(r"(?:\b(?:highp|mediump|lowp|precise)\s+)+\Z")
+GLSL_STATEMENT_KEYWORDS = {"return", "else", "if", "for", "while", "switch", "case", "do", "new"}
+
+
+def _blank_comments(text):
+    # Comments become spaces so line numbers in messages still match the file
+    return GLSL_COMMENT_RE.sub(lambda m: re.sub(r"[^\n]", " ", m.group()), text)
+
+
+def normalize_glsl(text, tokens=None):
+    """Source without comments and with whitespace collapsed to single spaces between tokens"""
+    return " ".join(" ".join(token.split()) for token in (glsl_tokens(text) if tokens is None else tokens))
+
+
+def check_glsl_source(text):
+    """Built-in structural checks for a Ghostty shader; returns (valid, message)"""
+    code = _blank_comments(text)
+
+    def line_of(pos):
+        return code.count("\n", 0, pos) + 1
+
+    problems = (
+        (r"^\s*#\s*version\b", "remove #version, Ghostty supplies its own"),
+        (r"\bvoid\s+main\s*\(", "defines main(); Ghostty calls mainImage() instead"),
+        (r"\bgl_FragColor\b", "gl_FragColor is not available, write to mainImage's fragColor"),
+        (r"\btexture2D\s*\(", "texture2D() is not available in GLSL 4.30 core, use texture()"),
+    )
+    for pattern, message in problems:
+        match = re.search(pattern, code, re.M)
+        if match:
+            return False, f"line {line_of(match.start())}: {message}"
+    if not re.search(r"\bvoid\s+mainImage\s*\(", code):
+        return False, "no mainImage(out vec4 fragColor, in vec2 fragCoord) entry point"
+
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    for match in re.finditer(r"[()\[\]{}]", code):
+        char = match.group()
+        if char in "([{":
+            stack.append((char, match.start()))
+        elif not stack:
+            return False, f"line {line_of(match.start())}: unbalanced '{char}'"
+        elif stack[-1][0] != pairs[char]:
+            opener, pos = stack[-1]
+            return False, f"line {line_of(pos)}: unclosed '{opener}'"
+        else:
+            stack.pop()
+    if stack:
+        char, pos = stack[-1]
+        return False, f"line {line_of(pos)}: unclosed '{char}'"
+    return True, ""
+
+
+def validate_shader_file(path, command=None):
+    """Validate one shader file; returns (content_hash, valid, message).
+
+    command is an external validator (e.g. glslangValidator --stdin -S frag) that reads the
+    prelude-wrapped source on stdin and exits non-zero on errors; None uses check_glsl_source.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return None, False, str(e)
+    content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+    text = data.decode('utf-8', errors='replace')
+    if GLSL_INCLUDE_RE.search(text):
+        # Ghostty never sees the #include lines, only what the build step expands them to
+        try:
+            text = resolve_includes(path)[0]
+        except ShaderBuildError as e:
+            return content_hash, False, str(e)
+    if not command:
+        return (content_hash, *check_glsl_source(text))
+
+    import subprocess
+    try:
+        result = subprocess.run(command, input=GHOSTTY_SHADER_PRELUDE + text, capture_output=True,
+                                text=True, timeout=ShaderValidator.TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return content_hash, None, f"validator failed: {e}"
+    if result.returncode == 0:
+        return content_hash, True, ""
+    output = result.stdout + result.stderr
+    match = GLSL_ERROR_RE.search(output)
+    if match:
+        line, message = match.groups()
+        return content_hash, False, f"line {line}: {message.strip()}" if line else message.strip()
+    lines = output.strip().splitlines()
+    return content_hash, False, lines[0] if lines else f"validator exited with {result.returncode}"
+
+
+def _validate_batch(paths, command):
+    return [(path, *validate_shader_file(path, command)) for path in paths]
+
+
+class ShaderValidator:
+    """GLSL validation on a process pool, cached by content hash so unchanged shaders are never revalidated"""
+    VERSION = 1
+    BATCH_SIZE = 16
+    TIMEOUT = 10
+
+    def __init__(self, cache_path=VALIDATION_CACHE_PATH, command=None, max_workers=2):
+        self.cache_path = cache_path
+        self.command = command
+        self.max_workers = max_workers
+        self.results = {}
+        self.pending = set()
+        self.dirty = False
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.executor = None
+
+    @staticmethod
+    def resolve_command(setting=""):
+        """Map the validator setting to a command: "" picks glslangValidator if installed, "builtin" never does"""
+        setting = (setting or "").strip()
+        if setting == "builtin":
+            return None
+        if setting:
+            import shlex
+            return shlex.split(setting)
+        import shutil
+        found = shutil.which("glslangValidator")
+        return [found, "--stdin", "-S", "frag"] if found else None
+
+    @property
+    def validator_id(self):
+        return " ".join(self.command) if self.command else "builtin"
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    try:
+                        with open(self.cache_path, 'r') as f:
+                            data = json.load(f)
+                        if data.get("version") == self.VERSION and data.get("validator") == self.validator_id:
+                            self.results = data.get("results", {})
+                    except Exception:
+                        self.results = {}
+                    self.loaded = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": self.VERSION, "validator": self.validator_id, "results": self.results}
+            self.dirty = False
+        try:
+            _atomic_write(self.cache_path, json.dumps(data, separators=(",", ":")))
+        except OSError:
+            with self.lock:
+                self.dirty = True
+
+    def set_command(self, command):
+        """Switch validators; results from the previous one no longer apply"""
+        self._ensure_loaded()
+        with self.lock:
+            if command == self.command:
+                return False
+            self.command = command
+            self.results = {}
+            self.dirty = True
+        return True
+
+    def result(self, content_hash):
+        """Cached (valid, message) for a content hash, or None if it was never validated"""
+        if not content_hash:
+            return None
+        self._ensure_loaded()
+        cached = self.results.get(content_hash)
+        return tuple(cached) if cached else None
+
+    def _store(self, content_hash, valid, message):
+        # A validator that could not run says nothing about the shader, so it is not cached
+        if content_hash and valid is not None:
+            with self.lock:
+                self.results[content_hash] = [valid, message]
+                self.dirty = True
+
+    def validate_now(self, path):
+        """Validate in the calling process, consulting the cache first"""
+        try:
+            with open(path, 'rb') as f:
+                content_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        except OSError as e:
+            return False, str(e)
+        cached = self.result(content_hash)
+        if cached:
+            return cached
+        content_hash, valid, message = validate_shader_file(path, self.command)
+        self._store(content_hash, valid, message)
+        self.save()
+        return valid, message
+
+    def validate(self, jobs, deliver, on_results):
+        """Validate [(path, content_hash)] in the background.
+
+        Cached hashes are skipped; deliver(on_results, [(path, content_hash, valid, message)])
+        is called once per finished batch and must hand the call over to the UI thread.
+        """
+        self._ensure_loaded()
+        with self.lock:
+            todo = [path for path, content_hash in jobs
+                    if content_hash not in self.results and content_hash not in self.pending]
+            self.pending.update(content_hash for _, content_hash in jobs if content_hash not in self.results)
+        if todo:
+            threading.Thread(target=self._run, args=(todo, self.command, deliver, on_results), daemon=True).start()
+
+    def _get_executor(self):
+        if self.executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # forkserver: forking a process that already runs GTK threads is not safe
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context("forkserver"))
+        return self.executor
+
+    def _run(self, paths, command, deliver, on_results):
+        from concurrent.futures import as_completed
+        batches = [paths[i:i + self.BATCH_SIZE] for i in range(0, len(paths), self.BATCH_SIZE)]
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(_validate_batch, batch, command) for batch in batches]
+        except RuntimeError:
+            return
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(path, None, None, f"validator failed: {e}") for path in batches[futures.index(future)]]
+            with self.lock:
+                stale = command != self.command
+                self.pending.difference_update(content_hash for _, content_hash, _, _ in results)
+            if stale:
+                continue
+            for path, content_hash, valid, message in results:
+                self._store(content_hash, valid, message)
+            deliver(on_results, results)
+        self.save()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class ShaderBuildError(Exception):
+    """A shader could not be built: a missing or cyclic #include, or an unreadable file"""
+
+
+def resolve_includes(path, search_dirs=None):
+    """Expand #include "file" directives; returns (text, [[path, mtime_ns, size, content_hash]]).
+
+    Names resolve against the including file's directory, then search_dirs (SHADER_DIR and its
+    lib/ by default). Each file is pulled in at most once, so shared helpers need no include guards.
+    """
+    if search_dirs is None:
+        search_dirs = (SHADER_DIR, SHADER_LIB_DIR)
+    deps = []
+    seen = set()
+    active = []
+
+    def expand(file_path):
+        real = os.path.realpath(file_path)
+        if real in active:
+            chain = " -> ".join(os.path.basename(p) for p in active + [real])
+            raise ShaderBuildError(f"include cycle: {chain}")
+        if real in seen:
+            return ""
+        try:
+            # stat before reading: an edit racing the build then shows up as a changed mtime
+            st = os.stat(real)
+            with open(real, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise ShaderBuildError(f"{os.path.basename(real)}: {e.strerror}")
+        seen.add(real)
+        deps.append([real, st.st_mtime_ns, st.st_size, hashlib.blake2b(data, digest_size=16).hexdigest()])
+        text = data.decode('utf-8', errors='replace')
+        active.append(real)
+
+        def include(match):
+            name = match.group(1)
+            for directory in (os.path.dirname(real), *search_dirs):
+                candidate = os.path.join(directory, name)
+                if os.path.isfile(candidate):
+                    return expand(candidate).rstrip("\n")
+            line = text.count("\n", 0, match.start()) + 1
+            raise ShaderBuildError(f"{os.path.basename(real)} line {line}: include not found: {name}")
+
+        expanded = GLSL_INCLUDE_RE.sub(include, text)
+        active.pop()
+        return expanded
+
+    return expand(path), deps
+
+
+def shader_animated(path, search_dirs=None):
+    """Whether the shader at path reads a time uniform, in its own code or any file it includes"""
+    try:
+        text, _ = resolve_includes(path, search_dirs)
+    except ShaderBuildError:
+        # An include that can't be followed may hide the time uniform
+        return True
+    return analyze_glsl(text)["animated"]
+
+
+def _fold_defines(text):
+    """Inline #define knobs whose value is a constant expression and drop the directive"""
+    guarded = set()
+    for match in GLSL_CONDITIONAL_RE.finditer(text):
+        guarded.update(IDENTIFIER_RE.findall(match.group(1)))
+    definitions = {}
+    for match in GLSL_OBJECT_DEFINE_RE.finditer(text):
+        definitions.setdefault(match.group(1), []).append((match.group(2) or "").strip())
+
+    def substitute(code, values):
+        return GLSL_IDENTIFIER_USE_RE.sub(lambda m: values.get(m.group(1), m.group(1)), code)
+
+    values = {}
+    for name, found in definitions.items():
+        value = found[0]
+        # Redefined, tested by #if/#ifdef or not a plain constant: leave it to the preprocessor
+        if len(found) > 1 or name in guarded or not value or not GLSL_CONSTANT_EXPR_RE.fullmatch(value):
+            continue
+        if not set(IDENTIFIER_RE.findall(value)) <= GLSL_CONSTANT_NAMES | values.keys():
+            continue
+        value = substitute(value, values)
+        values[name] = value if GLSL_ATOMIC_EXPR_RE.fullmatch(value) else f"({value})"
+    if not values:
+        return text
+    text = GLSL_OBJECT_DEFINE_RE.sub(lambda m: "" if m.group(1) in values else m.group(), text)
+    return substitute(text, values)
+
+
+def _strip_unused_functions(text, roots=("mainImage", "main")):
+    """Remove top-level functions (and their prototypes) that no entry point can reach"""
+    # Directives are blanked for the structural scan; anything they mention counts as used
+    code = GLSL_DIRECTIVE_RE.sub(lambda m: " " * len(m.group()), text)
+    braces = [(m.start(), m.group()) for m in re.finditer(r"[{}]", code)]
+    positions = [pos for pos, _ in braces]
+    depths = []
+    depth = 0
+    for _, brace in braces:
+        depth += 1 if brace == "{" else -1
+        depths.append(depth)
+
+    def depth_at(pos):
+        index = bisect.bisect_left(positions, pos)
+        return depths[index - 1] if index else 0
+
+    functions = []
+    for match in GLSL_FUNCTION_RE.finditer(code):
+        return_type, name, terminator = match.group(1), match.group(2), match.group(3)
+        if return_type in GLSL_STATEMENT_KEYWORDS or depth_at(match.start()) != 0:
+            continue
+        if terminator == ";":
+            end = match.end()
+        else:
+            index = bisect.bisect_left(positions, match.end() - 1)
+            while index < len(depths) and depths[index] != 0:
+                index += 1
+            if index == len(depths):
+                return text
+            end = positions[index] + 1
+        start = match.start()
+        qualifiers = GLSL_FUNCTION_QUALIFIERS_RE.search(code, 0, start)
+        if qualifiers:
+            start = qualifiers.start()
+        functions.append((name, start, end))
+
+    bodies = {}
+    outside = []
+    last = 0
+    for name, start, end in functions:
+        if start < last:
+            return text
+        outside.append(text[last:start])
+        body = text[start:end]
+        if "#" in body:
+            # A function split by #if blocks is left alone
+            outside.append(body)
+        else:
+            bodies.setdefault(name, set()).update(IDENTIFIER_RE.findall(code[start:end]))
+        last = end
+    outside.append(text[last:])
+    if not any(root in bodies for root in roots):
+        # No entry point (a helper file built on its own): nothing can be proven unused
+        return text
+
+    used = set(roots) | set(IDENTIFIER_RE.findall("".join(outside)))
+    todo = [name for name in bodies if name in used]
+    while todo:
+        for identifier in bodies.get(todo.pop(), ()):
+            if identifier in bodies and identifier not in used:
+                used.add(identifier)
+                todo.append(identifier)
+
+    pieces = []
+    last = 0
+    for name, start, end in functions:
+        if name in bodies and name not in used:
+            pieces.append(text[last:start])
+            last = end
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+
+def _minify(text):
+    lines = []
+    chunk = []
+
+    def flush():
+        if not chunk:
+            return
+        out = []
+        prev = ""
+        for token in GLSL_TOKEN_RE.findall(" ".join(chunk)):
+            # Keep a space only where joining would merge two tokens into one
+            joins_left = prev[-1:].isalnum() or prev[-1:] == "_" or prev[-1:] == "." and prev[0].isdigit()
+            joins_right = token[0].isalnum() or token[0] == "_" or token[0] == "." and token[1:2].isdigit()
+            if joins_left and joins_right or prev[-1:] + token[0] in ("++", "--", "//", "/*"):
+                out.append(" ")
+            out.append(token)
+            prev = token
+        lines.append("".join(out))
+        chunk.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            flush()
+            lines.append(" ".join(stripped.split()))
+        elif stripped:
+            chunk.append(stripped)
+    flush()
+    return "\n".join(lines) + "\n"
+
+
+def optimize_glsl(text):
+    """Strip comments and whitespace, fold #define knobs and drop functions the entry point never reaches"""
+    text = text.replace("\\\n", "")
+    text = GLSL_COMMENT_RE.sub(lambda m: "\n" if "\n" in m.group() else " ", text)
+    return _minify(_strip_unused_functions(_fold_defines(text)))
+
+
+class ShaderBuilder:
+    """Optimized shader builds in a content-addressed cache with #include dependency tracking.
+
+    A build is keyed by the hashes of the shader and every file it includes, so editing a shared
+    include rebuilds only the shaders that pull it in. The output keeps the shader's file name
+    inside a directory named after the key, so the config still identifies the shader by name.
+    """
+    VERSION = 1
+
+    def __init__(self, build_dir=BUILD_DIR, search_dirs=None):
+        self.build_dir = build_dir
+        self.search_dirs = search_dirs
+        self.manifest_path = os.path.join(build_dir, "manifest.json")
+        self.entries = None
+        self.dirty = False
+
+    def _load(self):
+        if self.entries is None:
+            data = load_json_file(self.manifest_path, {})
+            self.entries = data.get("shaders", {}) if data.get("version") == self.VERSION else {}
+        return self.entries
+
+    def save(self):
+        try:
+            _atomic_write(self.manifest_path, json.dumps({"version": self.VERSION, "shaders": self._load()},
+                                                         separators=(",", ":")))
+            self.dirty = False
+        except OSError:
+            pass
+
+    def _is_fresh(self, entry):
+        for dep in entry["deps"]:
+            path, mtime_ns, size, content_hash = dep
+            try:
+                st = os.stat(path)
+                if (st.st_mtime_ns, st.st_size) != (mtime_ns, size):
+                    with open(path, 'rb') as f:
+                        if hashlib.blake2b(f.read(), digest_size=16).hexdigest() != content_hash:
+                            return False
+                    # Touched but unchanged: remember the new stat so the next check skips hashing
+                    dep[1:3] = [st.st_mtime_ns, st.st_size]
+                    self.dirty = True
+            except OSError:
+                return False
+        return os.path.isfile(entry["output"])
+
+    def build(self, shader_path):
+        """Path of the optimized build of shader_path, rebuilt only if it or an include changed"""
+        source = os.path.abspath(shader_path)
+        entries = self._load()
+        entry = entries.get(source)
+        if entry and self._is_fresh(entry):
+            if self.dirty:
+                self.save()
+            return entry["output"]
+        text, deps = resolve_includes(source, self.search_dirs)
+        digest = hashlib.blake2b(f"{self.VERSION}".encode(), digest_size=16)
+        for path, _, _, content_hash in deps:
+            digest.update(f"{path}\0{content_hash}\0".encode())
+        output = os.path.join(self.build_dir, digest.hexdigest(), os.path.basename(source))
+        if not os.path.isfile(output):
+            _atomic_write(output, optimize_glsl(text))
+        entries[source] = {"deps": deps, "output": output, "source_bytes": len(text.encode()),
+                           "built_bytes": os.path.getsize(output)}
+        if entry and entry["output"] != output:
+            self._discard(entry["output"])
+        self.save()
+        return output
+
+    def _discard(self, output):
+        """Delete a superseded build unless another shader's entry still points at it"""
+        if any(entry["output"] == output for entry in self._load().values()):
+            return
+        try:
+            os.remove(output)
+            os.rmdir(os.path.dirname(output))
+        except OSError:
+            pass
+
+    def entry(self, shader_path):
+        return self._load().get(os.path.abspath(shader_path))
+
+    def source_for(self, output):
+        """Shader whose build is output, or None if output is not a build"""
+        output = os.path.abspath(output)
+        for source, entry in self._load().items():
+            if entry["output"] == output:
+                return source
+        return None
+
+    def dependents(self, path):
+        """Shader sources whose last build read path"""
+        real = os.path.realpath(path)
+        return {source for source, entry in self._load().items() if any(dep[0] == real for dep in entry["deps"])}
+
+    def dependencies(self):
+        return {dep[0] for entry in self._load().values() for dep in entry["deps"]}
+
+
+def write_png(path, width, height, rgba):
+    """Encode top-down RGBA bytes as a PNG, atomically"""
+    import struct
+    import zlib
+    stride = width * 4
+    raw = b"".join(b"\x00" + rgba[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    png = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+    _atomic_write(path, png)
+
+
+SAMPLE_FRAME_COLUMNS = 64
+SAMPLE_FRAME_LINES = 20
+
+
+def sample_terminal_frame(width, height):
+    """A deterministic fake terminal screen (prompt, text, a cursor) used as iChannel0, bottom row first"""
+    rng = random.Random(7)
+    background = bytes((30, 30, 46, 255))
+    palette = [bytes(c) + b"\xff" for c in ((205, 214, 244), (166, 227, 161), (137, 180, 250),
+                                               (243, 139, 168), (249, 226, 175), (148, 226, 213))]
+    # Glyphs are 3x5 dots in a 4x6 cell; the dot grid is scaled to the frame size at the end
+    grid_w, grid_h = SAMPLE_FRAME_COLUMNS * 4, SAMPLE_FRAME_LINES * 6
+    grid = [[background] * grid_w for _ in range(grid_h)]
+    for line in range(SAMPLE_FRAME_LINES - 2):
+        color = palette[0] if line % 3 else palette[1 + line % 5]
+        for col in range(1, rng.randint(4, SAMPLE_FRAME_COLUMNS - 2)):
+            if rng.random() < 0.15:
+                continue
+            glyph = rng.getrandbits(15)
+            for bit in range(15):
+                if glyph >> bit & 1:
+                    grid[line * 6 + 1 + bit // 3][col * 4 + bit % 3] = color
+    cursor_line = SAMPLE_FRAME_LINES - 2
+    for y in range(6):
+        for x in range(4):
+            grid[cursor_line * 6 + y][2 * 4 + x] = palette[0]
+
+    columns = [x * grid_w // width for x in range(width)]
+    scaled = {}
+    rows = []
+    for y in reversed(range(height)):
+        source = y * grid_h // height
+        if source not in scaled:
+            scaled[source] = b"".join(grid[source][x] for x in columns)
+        rows.append(scaled[source])
+    return b"".join(rows)
+
+
+class OffscreenShader:
+    """A Ghostty shader compiled in a standalone (EGL, software-capable) GL context.
+
+    Only used inside worker processes; the context is created once per process.
+    """
+    _context = None
+
+    def __init__(self, source):
+        import moderngl
+        import struct
+        if OffscreenShader._context is None:
+            OffscreenShader._context = moderngl.create_context(standalone=True, backend="egl")
+        self.ctx = OffscreenShader._context
+        self.program = self.ctx.program(
+            vertex_shader="#version 430 core\nin vec2 pos;\nvoid main() { gl_Position = vec4(pos, 0.0, 1.0); }\n",
+            fragment_shader=GHOSTTY_SHADER_PRELUDE + source)
+        self.quad = self.ctx.buffer(struct.pack("6f", -1, -1, 3, -1, -1, 3))
+        self.vao = self.ctx.vertex_array(self.program, [(self.quad, "2f", "pos")])
+        self.targets = {}
+
+    def _target(self, width, height):
+        if (width, height) not in self.targets:
+            channel = self.ctx.texture((width, height), 4, sample_terminal_frame(width, height))
+            self.targets[(width, height)] = (self.ctx.simple_framebuffer((width, height)), channel)
+        return self.targets[(width, height)]
+
+    def draw(self, width, height, time_s):
+        target, channel = self._target(width, height)
+        cell_w, cell_h = width / SAMPLE_FRAME_COLUMNS, height / SAMPLE_FRAME_LINES
+        uniforms = {
+            "iResolution": (width, height, 1.0),
+            "iTime": time_s,
+            "iTimeDelta": 1 / 60,
+            "iFrameRate": 60.0,
+            "iFrame": int(time_s * 60),
+            "iChannelResolution": [(width, height, 1.0)] + [(0.0, 0.0, 0.0)] * 3,
+            "iCurrentCursor": (2 * cell_w, 2 * cell_h, cell_w, cell_h),
+            "iCurrentCursorColor": (0.8, 0.84, 0.96, 1.0),
+            "iChannel0": 0,
+        }
+        for name, value in uniforms.items():
+            if name in self.program:
+                self.program[name].value = value
+        target.use()
+        target.clear(0.0, 0.0, 0.0, 1.0)
+        channel.use(0)
+        self.vao.render(vertices=3)
+        return target
+
+    def finish(self):
+        self.ctx.finish()
+
+    def release(self):
+        for target, channel in self.targets.values():
+            target.release()
+            channel.release()
+        for obj in (self.vao, self.quad, self.program):
+            obj.release()
+
+
+def _gl_error(e):
+    if isinstance(e, ImportError):
+        return "moderngl is not installed"
+    text = str(e).strip()
+    return text.splitlines()[0] if text else type(e).__name__
+
+
+def render_thumbnail(shader_path, out_path, width, height, time_s):
+    """Render one shader over the sample frame into a PNG; returns None or an error message"""
+    try:
+        with open(shader_path, 'r', errors='replace') as f:
+            shader = OffscreenShader(f.read())
+        try:
+            pixels = bytearray(shader.draw(width, height, time_s).read(components=4))
+        finally:
+            shader.release()
+        pixels[3::4] = b"\xff" * (width * height)
+        stride = width * 4
+        top_down = b"".join(pixels[y * stride:(y + 1) * stride] for y in reversed(range(height)))
+        write_png(out_path, width, height, top_down)
+        return None
+    except Exception as e:
+        return _gl_error(e)
+
+
+PROFILE_RESOLUTIONS = ((1280, 800), (1920, 1080), (2560, 1440))
+PROFILE_REFERENCE = "1920x1080"
+
+
+def profile_shader(shader_path, resolutions=PROFILE_RESOLUTIONS, frames=30):
+    """Time frames offscreen at each resolution; returns (content_hash, profile, error).
+
+    profile maps "WxH" to p50/p95/p99 frame times in ms, plus "cost": the p95 at PROFILE_REFERENCE
+    (or the largest resolution profiled).
+    """
+    try:
+        with open(shader_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return None, None, str(e)
+    content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+    try:
+        shader = OffscreenShader(data.decode('utf-8', errors='replace'))
+    except Exception as e:
+        return content_hash, None, _gl_error(e)
+    profile = {"frames": frames, "resolutions": {}}
+    try:
+        for width, height in resolutions:
+            # Warm-up: the first draws include texture uploads and driver-side compilation
+            for i in range(2):
+                shader.draw(width, height, i / 60)
+            shader.finish()
+            times = []
+            for i in range(frames):
+                start = time.perf_counter()
+                shader.draw(width, height, 1.0 + i / 60)
+                shader.finish()
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            profile["resolutions"][f"{width}x{height}"] = {
+                q: round(times[min(len(times) - 1, int(len(times) * p))], 3)
+                for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+    except Exception as e:
+        return content_hash, None, _gl_error(e)
+    finally:
+        shader.release()
+    reference = profile["resolutions"].get(PROFILE_REFERENCE) or profile["resolutions"][f"{width}x{height}"]
+    profile["cost"] = reference["p95"]
+    return content_hash, profile, None
+
+
+class ShaderProfiler:
+    """Profiles shaders one at a time in a worker process and stores results in the ShaderIndex by content hash.
+
+    A single worker keeps measurements from competing with each other for the CPU.
+    """
+
+    def __init__(self, index, resolutions=PROFILE_RESOLUTIONS, frames=30):
+        self.index = index
+        self.resolutions = resolutions
+        self.frames = frames
+        self.executor = None
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
+    def profile(self, jobs, deliver, on_result, on_done):
+        """Profile [(path, content_hash)] in the background, skipping hashes already profiled.
+
+        deliver(on_result, generation, path, content_hash, profile, error, done, total) follows each shader,
+        deliver(on_done, generation) the whole batch. Returns (generation, number of shaders queued).
+        """
+        todo = [path for path, content_hash in jobs if "profile" not in self.index.derived_for(content_hash)]
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self._run, args=(generation, todo, deliver, on_result, on_done), daemon=True).start()
+        return generation, len(todo)
+
+    def _run(self, generation, paths, deliver, on_result, on_done):
+        if self.executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("forkserver"))
+        for done, path in enumerate(paths, 1):
+            if generation != self.generation:
+                break
+            try:
+                content_hash, profile, error = self.executor.submit(
+                    profile_shader, path, self.resolutions, self.frames).result()
+            except Exception as e:
+                content_hash, profile, error = None, None, str(e) or type(e).__name__
+            if content_hash and profile:
+                self.index.set_derived(content_hash, profile=profile)
+            deliver(on_result, generation, path, content_hash, profile, error, done, len(paths))
+        self.index.save()
+        deliver(on_done, generation)
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class ThumbnailRenderer:
+    """Renders shader thumbnails in worker processes into a content-addressed, size-bounded PNG cache.
+
+    Requests are served newest first so the rows on screen win over ones scrolled past.
+    """
+    VERSION = 1
+    WIDTH = 192
+    HEIGHT = 120
+    TIME = 2.0
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR, max_bytes=64 * 1024 * 1024, max_workers=2):
+        from collections import deque
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.queue = deque()
+        self.waiting = {}
+        self.failed = {}
+        self.in_flight = 0
+        self.total_bytes = None
+        self.available = True
+        self.executor = None
+        self.dispatcher = None
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def path_for(self, content_hash):
+        return os.path.join(self.cache_dir, f"{content_hash}-{self.VERSION}.png")
+
+    def lookup(self, content_hash):
+        """Path of the cached thumbnail, marked as recently used, or None"""
+        path = self.path_for(content_hash)
+        try:
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+
+    def request(self, shader_path, content_hash, deliver, callback):
+        """Queue a render; deliver(callback, content_hash, png_path, error) runs when it finishes.
+
+        Returns False without queueing if the shader is known not to render.
+        """
+        if not self.available or content_hash in self.failed:
+            return False
+        with self.cond:
+            callbacks = self.waiting.setdefault(content_hash, [])
+            callbacks.append((deliver, callback))
+            if len(callbacks) == 1:
+                self.queue.append((shader_path, content_hash))
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self.dispatcher.start()
+            self.cond.notify()
+        return True
+
+    def cancel(self, content_hash, callback):
+        """Drop a callback; the render itself is dropped too if nobody else still wants it"""
+        with self.cond:
+            callbacks = [c for c in self.waiting.get(content_hash, []) if c[1] != callback]
+            if callbacks:
+                self.waiting[content_hash] = callbacks
+            elif self.waiting.pop(content_hash, None) is not None:
+                try:
+                    self.queue.remove(next(job for job in self.queue if job[1] == content_hash))
+                except StopIteration:
+                    pass
+
+    def _get_executor(self):
+        if self.executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # One GL context per worker process, created on its first job
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context("forkserver"))
+        return self.executor
+
+    def _dispatch(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        while True:
+            with self.cond:
+                while not self.closed and (not self.queue or self.in_flight >= self.max_workers):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                shader_path, content_hash = self.queue.pop()
+                self.in_flight += 1
+            try:
+                future = self._get_executor().submit(render_thumbnail, shader_path, self.path_for(content_hash),
+                                                     self.WIDTH, self.HEIGHT, self.TIME)
+            except RuntimeError:
+                return
+            future.add_done_callback(lambda f, h=content_hash: self._finished(h, f))
+
+    def _finished(self, content_hash, future):
+        try:
+            error = future.result()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        png_path = None
+        if error is None:
+            png_path = self.path_for(content_hash)
+            self._account(png_path)
+        elif error == "moderngl is not installed":
+            self.available = False
+        else:
+            self.failed[content_hash] = error
+        with self.cond:
+            self.in_flight -= 1
+            callbacks = self.waiting.pop(content_hash, [])
+            self.cond.notify()
+        for deliver, callback in callbacks:
+            deliver(callback, content_hash, png_path, error)
+
+    def _account(self, png_path):
+        """Track the cache size and evict least recently used thumbnails past max_bytes"""
+        try:
+            size = os.path.getsize(png_path)
+        except OSError:
+            return
+        if self.total_bytes is None:
+            self.total_bytes = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.name.endswith(".png"))
+        else:
+            self.total_bytes += size
+        if self.total_bytes <= self.max_bytes:
+            return
+        entries = sorted((e.stat().st_mtime_ns, e.stat().st_size, e.path)
+                         for e in os.scandir(self.cache_dir) if e.name.endswith(".png"))
+        # Evict down to 90% so a full cache doesn't rescan on every render
+        for _, entry_size, path in entries:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            if path == png_path:
+                continue
+            try:
+                os.remove(path)
+                self.total_bytes -= entry_size
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            self.queue.clear()
+            self.waiting.clear()
+            self.cond.notify_all()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class GhosttyConfig:
+    """Parsed Ghostty config that follows config-file includes, cached per file by (mtime_ns, size)"""
+    INCLUDE_KEY = "config-file"
+
+    def __init__(self, path=CONFIG_PATH, on_reload=None):
+        self.path = path
+        self.on_reload = on_reload
+        self.files = {}
+        self.values = {}
+        self.locations = {}
+        self.loaded = False
+        # Set while a file monitor covers self.files; reads then skip the stat validation
+        self.watched = False
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded = False
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _is_fresh(self):
+        if not self.loaded:
+            return False
+        if self.watched:
+            return True
+        return all(self._stamp(path) == stamp for path, stamp in self.files.items())
+
+    def _ensure_loaded(self):
+        with self.lock:
+            if self._is_fresh():
+                return
+            self.files = {}
+            self.values = {}
+            self.locations = {}
+            self._parse_file(os.path.expanduser(self.path), set())
+            self.loaded = True
+            files = list(self.files)
+        if self.on_reload:
+            self.on_reload(files)
+
+    def _parse_file(self, path, seen):
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            return
+        seen.add(real_path)
+        self.files[path] = self._stamp(path)
+        includes = []
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                for lineno, line in enumerate(f, 1):
+                    stripped = line.strip()
+                    if not stripped or stripped.startswith('#') or '=' not in stripped:
+                        continue
+                    key, value = stripped.split('=', 1)
+                    key = key.strip()
+                    value = value.strip()
+                    if len(value) >= 2 and value[0] == value[-1] == '"':
+                        value = value[1:-1]
+                    if key == self.INCLUDE_KEY:
+                        if value:
+                            includes.append(value)
+                    elif key.startswith(GHOSTTY_CONFIG_KEY):
+                        # Repeatable key: an empty value resets the list, like Ghostty does
+                        if value:
+                            self.values.setdefault(key, []).append(value)
+                            self.locations.setdefault(key, []).append((path, lineno))
+                        else:
+                            self.values[key] = []
+                            self.locations[key] = []
+        except OSError:
+            return
+        
+        # Ghostty loads config-file includes after the file that declares them
+        base_dir = os.path.dirname(path)
+        for include in includes:
+            optional = include.startswith('?')
+            include = os.path.expanduser(include.lstrip('?'))
+            if not os.path.isabs(include):
+                include = os.path.join(base_dir, include)
+            if optional and not os.path.exists(include):
+                continue
+            self._parse_file(include, seen)
+
+    def get(self, key):
+        """All values of a custom-shader* key in load order"""
+        self._ensure_loaded()
+        return list(self.values.get(key, []))
+
+    def shader_keys(self):
+        self._ensure_loaded()
+        return {key: list(values) for key, values in self.values.items()}
+
+    def shader_paths(self):
+        return self.get(GHOSTTY_CONFIG_KEY)
+
+    def key_locations(self, key):
+        """(file, line number) of each value get(key) returns, in the same order"""
+        self._ensure_loaded()
+        return list(self.locations.get(key, []))
+
+    def current_shader(self):
+        self._ensure_loaded()
+        shaders = self.values.get(GHOSTTY_CONFIG_KEY)
+        return shaders[0] if shaders else None
+
+
+class GhosttyProcessTracker:
+    """Finds Ghostty processes by scanning /proc and signals them directly instead of pgrep/pkill"""
+    PROCESS_NAME = "ghostty"
+    TTL = 2.0
+
+    def __init__(self, proc_root="/proc", ttl=TTL, kill=None):
+        self.proc_root = proc_root
+        self.ttl = ttl
+        self.kill = kill or os.kill
+        self.pids = []
+        self.last_scan = None
+        # pidfds pin the exact process we found, so a recycled PID is never signalled
+        self.use_pidfd = proc_root == "/proc" and kill is None and hasattr(os, "pidfd_open") \
+            and hasattr(signal, "pidfd_send_signal")
+        self.pidfds = {}
+
+    def _read_comm(self, pid):
+        try:
+            with open(os.path.join(self.proc_root, str(pid), "comm"), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def invalidate(self):
+        self.last_scan = None
+
+    def scan(self):
+        """Rescan proc_root for processes whose name is exactly PROCESS_NAME, like pgrep -x"""
+        pids = []
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            entries = []
+        for entry in entries:
+            if entry.isdigit() and self._read_comm(entry) == self.PROCESS_NAME:
+                pids.append(int(entry))
+        pids.sort()
+        self._sync_pidfds(pids)
+        self.pids = pids
+        self.last_scan = time.monotonic()
+        return list(pids)
+
+    def _sync_pidfds(self, pids):
+        if not self.use_pidfd:
+            return
+        for pid in list(self.pidfds):
+            if pid not in pids:
+                os.close(self.pidfds.pop(pid))
+        for pid in pids:
+            if pid in self.pidfds:
+                continue
+            try:
+                fd = os.pidfd_open(pid)
+            except OSError:
+                continue
+            # The PID could have been reused between the scan and pidfd_open
+            if self._read_comm(pid) == self.PROCESS_NAME:
+                self.pidfds[pid] = fd
+            else:
+                os.close(fd)
+
+    def get_pids(self):
+        if self.last_scan is None or time.monotonic() - self.last_scan > self.ttl:
+            return self.scan()
+        return list(self.pids)
+
+    def is_running(self):
+        return bool(self.get_pids())
+
+    def send_signal(self, sig):
+        """Signal every Ghostty process; returns how many were signalled"""
+        sent = 0
+        for pid in self.get_pids():
+            try:
+                fd = self.pidfds.get(pid)
+                if fd is not None:
+                    signal.pidfd_send_signal(fd, sig)
+                else:
+                    self.kill(pid, sig)
+                sent += 1
+            except ProcessLookupError:
+                self.invalidate()
+            except PermissionError:
+                pass
+        return sent
+
+    def close(self):
+        for fd in self.pidfds.values():
+            os.close(fd)
+        self.pidfds = {}
+
+
+class PowerSupply:
+    """AC and battery state read from a power_supply class directory; root can point at a fake sysfs tree"""
+    CHARGING_STATUSES = ("Charging", "Full", "Not charging")
+
+    def __init__(self, root=POWER_SUPPLY_ROOT):
+        self.root = root
+
+    def _attr(self, supply, name):
+        try:
+            with open(os.path.join(self.root, supply, name), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def supplies(self):
+        try:
+            return sorted(os.listdir(self.root))
+        except OSError:
+            return []
+
+    def read(self):
+        """{"on_ac", "percent", "battery"}; machines without a system battery count as on AC"""
+        adapters = []
+        capacities = []
+        charging = False
+        for supply in self.supplies():
+            # Mice, keyboards and other peripherals report their own batteries
+            if self._attr(supply, "scope") == "Device":
+                continue
+            kind = self._attr(supply, "type")
+            if kind == "Battery":
+                capacity = self._attr(supply, "capacity")
+                if capacity and capacity.isdigit():
+                    capacities.append(int(capacity))
+                charging = charging or self._attr(supply, "status") in self.CHARGING_STATUSES
+            elif kind is not None:
+                online = self._attr(supply, "online")
+                if online is not None:
+                    adapters.append(online == "1")
+        battery = bool(capacities)
+        if adapters:
+            on_ac = any(adapters)
+        else:
+            on_ac = charging or not battery
+        percent = round(sum(capacities) / len(capacities)) if capacities else None
+        return {"on_ac": on_ac, "percent": percent, "battery": battery}
+
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+
+def open_uevent_socket():
+    """Non-blocking kernel uevent socket, or None where netlink isn't available.
+
+    The kernel announces plug/unplug and battery capacity changes here, so nothing needs polling.
+    """
+    import socket
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+                             NETLINK_KOBJECT_UEVENT)
+        sock.bind((0, UEVENT_KERNEL_GROUP))
+    except (AttributeError, OSError):
+        return None
+    return sock
+
+
+def drain_uevents(sock, subsystem="power_supply"):
+    """Read every queued uevent; True if any of them came from subsystem"""
+    marker = f"SUBSYSTEM={subsystem}".encode()
+    matched = False
+    while True:
+        try:
+            message = sock.recv(65536)
+        except OSError:
+            break
+        if not message:
+            break
+        if marker in message.split(b"\0"):
+            matched = True
+    return matched
+
+
+def power_policy(settings):
+    """The battery policy name from settings; "cheap" with no cheap shader set falls back to disabling"""
+    index = settings.get("power_policy", 0)
+    policy = POWER_POLICIES[index] if 0 <= index < len(POWER_POLICIES) else "off"
+    if policy == "cheap" and not settings.get("power_cheap_shader"):
+        return "disable"
+    return policy
+
+
+class PowerPolicy:
+    """Turns power state into shader actions and remembers what to restore on AC.
+
+    update() returns ("engage", policy, saved_shader), ("restore", None, saved_shader) or None.
+    The shader in use before the policy engaged is kept under "power" in the state store, so
+    restarting on battery still restores it once power comes back.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        state = store.get("power", {})
+        self.engaged = state.get("engaged") if state.get("engaged") in POWER_POLICIES else None
+        self.saved_shader = state.get("saved_shader")
+        # Set when the user picks a shader by hand on battery; cleared on AC
+        self.suppressed = False
+
+    def _save(self):
+        self.store.set("power", {"engaged": self.engaged, "saved_shader": self.saved_shader})
+
+    def update(self, settings, power, current_shader):
+        policy = power_policy(settings)
+        if power["on_ac"] or policy == "off":
+            self.suppressed = False
+            if not self.engaged:
+                return None
+            saved = self.saved_shader
+            self.engaged = None
+            self.saved_shader = None
+            self._save()
+            return ("restore", None, saved)
+        if self.suppressed or self.engaged == policy:
+            return None
+        # Only entering battery mode checks the threshold; leaving it waits for AC so it can't flap
+        if not self.engaged:
+            threshold = settings.get("power_threshold", 100)
+            if power["percent"] is not None and power["percent"] > threshold:
+                return None
+            self.saved_shader = current_shader
+        self.engaged = policy
+        self._save()
+        return ("engage", policy, self.saved_shader)
+
+    def repoint(self, renames):
+        """Follow shaders that were consolidated into another file (renames maps old -> new name)"""
+        saved = self.saved_shader
+        if isinstance(saved, list):
+            saved = [renames.get(name, name) for name in saved]
+        elif saved in renames:
+            saved = renames[saved]
+        if saved != self.saved_shader:
+            self.saved_shader = saved
+            self._save()
+
+    def override(self):
+        """The user chose a shader while the policy was engaged: keep it and don't restore over it"""
+        if not self.engaged:
+            return
+        self.engaged = None
+        self.saved_shader = None
+        self.suppressed = True
+        self._save()
+
+
+def _config_key(line):
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#') or '=' not in stripped:
+        return None
+    return stripped.split('=', 1)[0].strip()
+
+
+def shader_animation(settings, shader_name, animated):
+    """custom-shader-animation value for a shader, or None when the switcher shouldn't manage it.
+
+    The per-shader override in settings["shader_animation"] wins; "auto" animates only
+    shaders that read a time uniform, so static ones stop forcing continuous redraws.
+    """
+    if not settings.get("manage_animation", True):
+        return None
+    override = settings.get("shader_animation", {}).get(shader_name, "auto")
+    if override in ANIMATION_MODES:
+        return override
+    return "true" if animated else "false"
+
+
+def combine_animation(modes):
+    """custom-shader-animation for a chain: the most demanding member wins"""
+    modes = [mode for mode in modes if mode]
+    if not modes:
+        return None
+    return next((mode for mode in ("always", "true") if mode in modes), "false")
+
+
+def write_shader_config(shader_path=None, config_path=CONFIG_PATH, animation=None, config=None):
+    """Point the custom-shader lines of the Ghostty config at shader_path (None removes them).
+
+    shader_path may be a list, written as one custom-shader line per entry so Ghostty runs them as
+    a chain. The lines are rewritten where they are set now, which may be a config-file include;
+    with none set they are appended to config_path. animation, when given, is written as
+    custom-shader-animation right after them and replaces that key wherever it is set; removing
+    the shader removes it too so Ghostty falls back to its default. config is the GhosttyConfig
+    to read locations from and invalidate afterwards. Every file touched is replaced atomically.
+    """
+    if isinstance(shader_path, str):
+        shader_path = [shader_path]
+    if config is None:
+        config = GhosttyConfig(config_path)
+    # Line numbers must match the files as they are now
+    config.invalidate()
+    
+    shader_lines = [f'{GHOSTTY_CONFIG_KEY} = "{path}"\n' for path in shader_path or ()]
+    if shader_lines and animation:
+        shader_lines.append(f'{ANIMATION_CONFIG_KEY} = {animation}\n')
+    dropped = {GHOSTTY_CONFIG_KEY}
+    if animation or not shader_lines:
+        dropped.add(ANIMATION_CONFIG_KEY)
+    
+    edits = {}
+    for key in dropped:
+        for path, lineno in config.key_locations(key):
+            edits.setdefault(path, set()).add(lineno)
+    locations = config.key_locations(GHOSTTY_CONFIG_KEY)
+    target, insert_at = locations[0] if locations else (os.path.expanduser(config_path), None)
+    if shader_lines:
+        edits.setdefault(target, set())
+    
+    for path, linenos in edits.items():
+        try:
+            with open(path, 'r') as f:
+                current_lines = f.readlines()
+        except FileNotFoundError:
+            current_lines = []
+        new_lines = []
+        for lineno, line in enumerate(current_lines, 1):
+            if path == target and lineno == insert_at:
+                new_lines.extend(shader_lines)
+            if lineno in linenos and _config_key(line) in dropped:
+                continue
+            new_lines.append(line)
+        if path == target and insert_at is None and shader_lines:
+            new_lines.append('\n')
+            new_lines.extend(shader_lines)
+        # Through symlinks, so a linked dotfile stays a link
+        _atomic_write(os.path.realpath(path), "".join(new_lines))
+    config.invalidate()
+
+
+def match_stack(stacks, shader_names):
+    """Name of the saved stack whose chain is exactly shader_names, or None"""
+    if len(shader_names) < 2:
+        return None
+    return next((name for name, chain in sorted(stacks.items()) if chain == shader_names), None)
+
+
+class UsageHistory:
+    """Append-only log of shader applies with an incrementally maintained frecency score.
+
+    Each line is "timestamp<TAB>shader" (an empty shader records a disable), or
+    "timestamp<TAB>old<TAB>new" when old's history was merged into new. An apply lasts until
+    the next event, so durations need no extra bookkeeping. Scores decay with a half-life of
+    HALF_LIFE seconds; they are stored relative to a reference time so adding an event and
+    looking a name up are both O(1), and ranking never has to revisit old events. save() snapshots
+    the scores with the log offset they cover, so loading only replays what was appended since.
+    """
+    HALF_LIFE = 7 * 24 * 3600
+    # Applies replaced within this many seconds (quick previews, misclicks) count for a quarter
+    SHORT_APPLY = 30
+    SHORT_WEIGHT = 0.25
+
+    def __init__(self, path=USAGE_LOG_PATH, state_path=USAGE_STATE_PATH, legacy_recent_path=RECENT_PATH):
+        self.path = path
+        self.state_path = state_path
+        self.legacy_recent_path = legacy_recent_path
+        self.scores = {}
+        self.counts = {}
+        self.durations = {}
+        self.last_used = {}
+        self.reference = None
+        self.current = None
+        self.offset = 0
+        self.saved_offset = None
+        self.version = 0
+
+    def _weight(self, t):
+        return 2.0 ** ((t - self.reference) / self.HALF_LIFE)
+
+    def _add(self, t, name):
+        if self.reference is None:
+            self.reference = t
+        elif (t - self.reference) / self.HALF_LIFE > 512:
+            # Rebase before the weights overflow a float
+            scale = 2.0 ** ((self.reference - t) / self.HALF_LIFE)
+            self.scores = {n: s * scale for n, s in self.scores.items()}
+            self.reference = t
+        if self.current:
+            previous, started = self.current
+            duration = max(0.0, t - started)
+            self.durations[previous] = self.durations.get(previous, 0.0) + duration
+            if duration < self.SHORT_APPLY:
+                self.scores[previous] -= (1 - self.SHORT_WEIGHT) * self._weight(started)
+        self.current = (name, t) if name else None
+        if name:
+            self.scores[name] = self.scores.get(name, 0.0) + self._weight(t)
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.last_used[name] = t
+        self.version += 1
+
+    def _rename(self, old, new):
+        for table in (self.scores, self.counts, self.durations):
+            if old in table:
+                table[new] = table.get(new, 0) + table.pop(old)
+        if old in self.last_used:
+            last = self.last_used.pop(old)
+            self.last_used[new] = max(last, self.last_used.get(new, last))
+        if self.current and self.current[0] == old:
+            self.current = (new, self.current[1])
+        self.version += 1
+
+    def _restore(self):
+        """Start from the saved snapshot if it still describes a prefix of the log"""
+        state = load_json_file(self.state_path, {})
+        try:
+            st = os.stat(self.path)
+            if state.get("inode") != st.st_ino or not 0 < state["offset"] <= st.st_size:
+                return
+            self.reference = state["reference"]
+            self.scores = state["scores"]
+            self.counts = state["counts"]
+            self.durations = state["durations"]
+            self.last_used = state["last_used"]
+            self.current = tuple(state["current"]) if state.get("current") else None
+            self.offset = self.saved_offset = state["offset"]
+        except (OSError, KeyError, TypeError):
+            self.__init__(self.path, self.state_path, self.legacy_recent_path)
+
+    def save(self):
+        if self.offset == self.saved_offset:
+            return
+        try:
+            state = {"inode": os.stat(self.path).st_ino, "offset": self.offset, "reference": self.reference,
+                     "scores": self.scores, "counts": self.counts, "durations": self.durations,
+                     "last_used": self.last_used, "current": self.current}
+            _atomic_write(self.state_path, json.dumps(state, separators=(",", ":")))
+            self.saved_offset = self.offset
+        except OSError:
+            pass
+
+    def load(self):
+        """Read events appended since the last load, e.g. by the command line"""
+        if self.offset == 0:
+            if not os.path.exists(self.path):
+                self._import_recent()
+            self._restore()
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return
+        # A line still being written has no newline yet; pick it up next time
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            stamp, _, name = line.partition("\t")
+            try:
+                t = float(stamp)
+            except ValueError:
+                continue
+            if "\t" in name:
+                self._rename(*name.split("\t", 1))
+            else:
+                self._add(t, name or None)
+
+    def _import_recent(self):
+        """Seed the log from the old recent.json list, oldest first"""
+        recent = load_json_file(self.legacy_recent_path, [])
+        if not isinstance(recent, list) or not recent:
+            return
+        now = time.time()
+        lines = [f"{now - len(recent) + i:.3f}\t{name}\n" for i, name in enumerate(reversed(recent))
+                 if isinstance(name, str) and "\t" not in name and "\n" not in name]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.writelines(lines)
+        except OSError:
+            pass
+
+    def record(self, name, t=None):
+        """Append an apply of name (None for a disable) and fold it into the scores"""
+        if name and ("\t" in name or "\n" in name):
+            return
+        self.load()
+        t = time.time() if t is None else t
+        if self._append(f"{t:.3f}\t{name or ''}\n"):
+            self._add(t, name)
+
+    def rename(self, old, new):
+        """Carry old's history over to new, e.g. when duplicates are consolidated"""
+        if old == new or any("\t" in n or "\n" in n for n in (old, new)):
+            return
+        self.load()
+        if self._append(f"{time.time():.3f}\t{old}\t{new}\n"):
+            self._rename(old, new)
+
+    def _append(self, line):
+        line = line.encode()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # One O_APPEND write per event, so the GUI and the command line can share the log
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            return False
+        self.offset += len(line)
+        return True
+
+    def frecency(self, name, now=None):
+        """Decayed apply count of name as of now"""
+        score = self.scores.get(name)
+        if not score:
+            return 0.0
+        now = time.time() if now is None else now
+        return score * 2.0 ** min(0.0, (self.reference - now) / self.HALF_LIFE)
+
+    def duration(self, name, now=None):
+        """Seconds name has been the active shader, including the current run"""
+        total = self.durations.get(name, 0.0)
+        if self.current and self.current[0] == name:
+            total += max(0.0, (time.time() if now is None else now) - self.current[1])
+        return total
+
+    def top(self, limit):
+        """The limit most frecent shader names, best first"""
+        import heapq
+        return heapq.nlargest(limit, (n for n, s in self.scores.items() if s > 0), key=self.scores.get)
+
+    def random_weights(self, names, mode):
+        """Weights for random.choices over names: "frequent" favours well-used shaders, "fresh" neglected ones"""
+        now = time.time()
+        if mode == "frequent":
+            return [self.frecency(name, now) + 0.1 for name in names]
+        if mode == "fresh":
+            return [1.0 / (1.0 + self.frecency(name, now)) for name in names]
+        return None
+
+
+def random_weighting(settings):
+    """The random shader weighting name from settings"""
+    index = settings.get("random_weighting", 0)
+    return RANDOM_WEIGHTINGS[index] if 0 <= index < len(RANDOM_WEIGHTINGS) else "uniform"
+
+
+def find_duplicates(shaders):
+    """Group (name, hash, normalized_hash) triples into sets of copies of the same shader.
+
+    Returns [{"kind": "identical" | "similar", "names": [...]}]; "similar" groups contain files
+    that only match once comments and whitespace are normalized.
+    """
+    groups = {}
+    for name, content_hash, normalized_hash in shaders:
+        if normalized_hash or content_hash:
+            groups.setdefault(normalized_hash or content_hash, []).append((name, content_hash))
+    duplicates = []
+    for members in groups.values():
+        if len(members) > 1:
+            duplicates.append({"kind": "identical" if len({h for _, h in members}) == 1 else "similar",
+                               "names": sorted((name for name, _ in members), key=str.lower)})
+    return sorted(duplicates, key=lambda group: group["names"][0].lower())
+
+
+def pick_survivor(names, favorites=(), history=None, active=()):
+    """The copy to keep: the active one, then a favorite, then the most used, then one without a _copyN suffix"""
+    now = time.time()
+    return min(names, key=lambda name: (
+        name not in active, name not in favorites, -(history.frecency(name, now) if history else 0.0),
+        bool(COPY_SUFFIX_RE.search(os.path.splitext(name)[0])), len(name), name.lower()))
+
+
+def consolidate_duplicates(survivor, names, favorites, stacks, settings, history, power=None, library=None):
+    """Delete every name but survivor after pointing favorites, stacks, settings and usage history at it.
+
+    favorites (a set), stacks and settings are updated in place for the caller to save; power is a
+    PowerPolicy whose saved shader should follow. Pack members are read-only and keep their names.
+    Returns (removed, errors).
+    """
+    library = library or ShaderLibrary()
+    renames = {name: survivor for name in names if name != survivor and library.source_for_name(name).writable}
+    for old in renames:
+        if old in favorites:
+            favorites.discard(old)
+            favorites.add(survivor)
+        history.rename(old, survivor)
+    for stack_name, chain in stacks.items():
+        stacks[stack_name] = [renames.get(name, name) for name in chain]
+    overrides = settings.get("shader_animation") or {}
+    for old in renames:
+        if old in overrides:
+            overrides.setdefault(survivor, overrides.pop(old))
+    if settings.get("power_cheap_shader") in renames:
+        settings["power_cheap_shader"] = survivor
+    if power is not None:
+        power.repoint(renames)
+    # Files go last, so a failure never leaves state pointing at a deleted shader
+    removed, errors = [], []
+    for old in renames:
+        try:
+            os.remove(library.path_for(old))
+            removed.append(old)
+        except OSError as e:
+            errors.append(f"{old}: {e.strerror}")
+    return removed, errors
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def snapshot_retention(settings):
+    return {"keep_last": settings.get("snapshot_keep_last", 10), "keep_daily": settings.get("snapshot_keep_daily", 7),
+            "keep_weekly": settings.get("snapshot_keep_weekly", 4)}
+
+
+class SnapshotStore:
+    """Content-addressed, deduplicated snapshots of the shader directory.
+
+    Only shader sources, .zip packs and the lib/ include folder are covered; anything else that
+    lives in the directory (the switcher's own scripts, caches) is never recorded, restored or
+    deleted. Each file is stored once as a zlib-compressed blob under objects/, named by the blake2b hash
+    of its content; a snapshot is a small JSON manifest under snapshots/ mapping relative paths
+    to hashes. Files whose size and mtime match the previous snapshot reuse its hash unread, so
+    a snapshot only reads and compresses what changed. prune() applies the retention policy and
+    deletes blobs that no remaining snapshot refers to.
+    """
+    VERSION = 1
+    # Blobs this recent may belong to a snapshot another process is still writing
+    GC_GRACE = 3600
+
+    def __init__(self, root=BACKUP_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+
+    @staticmethod
+    def _tracked(rel):
+        return rel.lower().endswith(SHADER_EXTENSIONS + PACK_EXTENSIONS) or rel.split(os.sep)[0] == "lib"
+
+    @classmethod
+    def _walk(cls, directory):
+        """Relative path -> stat for every tracked regular file under directory"""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel = os.path.relpath(path, directory)
+                if not cls._tracked(rel):
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    files[rel] = st
+        return files
+
+    def snapshots(self):
+        """All snapshot manifests, newest first"""
+        try:
+            names = os.listdir(self.snapshots_dir)
+        except OSError:
+            return []
+        manifests = [load_json_file(os.path.join(self.snapshots_dir, name), None)
+                     for name in names if name.endswith(".json")]
+        return sorted((m for m in manifests if isinstance(m, dict) and m.get("version") == self.VERSION),
+                      key=lambda m: m["time"], reverse=True)
+
+    def load(self, snapshot_id):
+        manifest = load_json_file(self._manifest_path(snapshot_id), None)
+        if not isinstance(manifest, dict) or manifest.get("version") != self.VERSION:
+            raise SnapshotError(f"No snapshot {snapshot_id}")
+        return manifest
+
+    def read(self, entry):
+        """Content of a manifest file entry, checked against its hash"""
+        try:
+            with open(self._object_path(entry["hash"]), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            raise SnapshotError(f"Blob {entry['hash']} is unreadable: {e}")
+        if hashlib.blake2b(data, digest_size=16).hexdigest() != entry["hash"]:
+            raise SnapshotError(f"Blob {entry['hash']} is corrupt")
+        return data
+
+    def snapshot(self, directory=SHADER_DIR, label=""):
+        """Record directory; returns (manifest, created), created False when nothing changed since the last one"""
+        with self.lock:
+            previous = next(iter(self.snapshots()), None)
+            known = previous["files"] if previous else {}
+            files = {}
+            added_files = added_bytes = 0
+            for rel, st in sorted(self._walk(directory).items()):
+                old = known.get(rel)
+                if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns \
+                        and os.path.exists(self._object_path(old["hash"])):
+                    files[rel] = old
+                    continue
+                try:
+                    with open(os.path.join(directory, rel), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+                if not os.path.exists(self._object_path(digest)):
+                    blob = zlib.compress(data, 6)
+                    _atomic_write(self._object_path(digest), blob)
+                    added_files += 1
+                    added_bytes += len(blob)
+                files[rel] = {"hash": digest, "size": len(data), "mtime_ns": st.st_mtime_ns}
+            if previous and {r: f["hash"] for r, f in files.items()} == {r: f["hash"] for r, f in known.items()}:
+                return previous, False
+            
+            now = time.time()
+            snapshot_id = base_id = datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S")
+            suffix = 1
+            while os.path.exists(self._manifest_path(snapshot_id)):
+                suffix += 1
+                snapshot_id = f"{base_id}-{suffix}"
+            manifest = {"version": self.VERSION, "id": snapshot_id, "time": now, "label": label, "files": files,
+                        "size": sum(f["size"] for f in files.values()),
+                        "added_files": added_files, "added_bytes": added_bytes}
+            _atomic_write(self._manifest_path(snapshot_id), json.dumps(manifest).encode())
+            return manifest, True
+
+    def prune(self, keep_last=10, keep_daily=7, keep_weekly=4):
+        """Drop snapshots outside the retention policy, then unreferenced blobs; returns how many were dropped.
+
+        The newest keep_last snapshots are kept, plus the newest snapshot of each of the last keep_daily
+        days and keep_weekly ISO weeks that have one. The newest snapshot is always kept.
+        """
+        with self.lock:
+            snapshots = self.snapshots()
+            keep = {m["id"] for m in snapshots[:max(1, keep_last)]}
+            for period_format, count in (("%Y-%m-%d", keep_daily), ("%G-W%V", keep_weekly)):
+                periods = set()
+                for manifest in snapshots:
+                    period = datetime.fromtimestamp(manifest["time"]).strftime(period_format)
+                    if period not in periods and len(periods) < count:
+                        periods.add(period)
+                        keep.add(manifest["id"])
+            dropped = 0
+            for manifest in snapshots:
+                if manifest["id"] not in keep:
+                    try:
+                        os.remove(self._manifest_path(manifest["id"]))
+                        dropped += 1
+                    except OSError:
+                        keep.add(manifest["id"])
+            live = {f["hash"] for m in snapshots if m["id"] in keep for f in m["files"].values()}
+            cutoff = time.time() - self.GC_GRACE
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        if name not in live and os.stat(path).st_mtime < cutoff:
+                            os.remove(path)
+                    except OSError:
+                        pass
+            return dropped
+
+    def disk_usage(self):
+        """(blob count, bytes on disk) for blobs and manifests; older tar.gz backups aren't counted"""
+        count = size = 0
+        for directory in (self.objects_dir, self.snapshots_dir):
+            for dirpath, _, filenames in os.walk(directory):
+                for name in filenames:
+                    try:
+                        size += os.stat(os.path.join(dirpath, name)).st_size
+                    except OSError:
+                        continue
+                    count += directory == self.objects_dir
+        return count, size
+
+    @staticmethod
+    def _hash(path):
+        try:
+            with open(path, 'rb') as f:
+                return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        except OSError:
+            return None
+
+    def diff(self, snapshot_id, directory=SHADER_DIR):
+        """Files that differ between a snapshot and directory: [(path, "modified" | "deleted" | "added")]"""
+        # Snapshots taken before only tracked files were recorded may hold others; they are ignored
+        files = {rel: entry for rel, entry in self.load(snapshot_id)["files"].items() if self._tracked(rel)}
+        current = self._walk(directory)
+        changes = []
+        for rel, entry in files.items():
+            st = current.get(rel)
+            if st is None:
+                changes.append((rel, "deleted"))
+            elif st.st_size != entry["size"] or (st.st_mtime_ns != entry["mtime_ns"]
+                                                 and self._hash(os.path.join(directory, rel)) != entry["hash"]):
+                changes.append((rel, "modified"))
+        changes += [(rel, "added") for rel in current if rel not in files]
+        return sorted(changes, key=lambda change: change[0].lower())
+
+    def restore(self, snapshot_id, paths=None, directory=SHADER_DIR):
+        """Put files from a snapshot back into directory and return the paths written.
+
+        With paths None the whole directory is rolled back, which also deletes files the snapshot
+        didn't have. The current state is snapshotted first, so a restore can itself be undone.
+        """
+        files = {rel: entry for rel, entry in self.load(snapshot_id)["files"].items() if self._tracked(rel)}
+        missing = [rel for rel in paths or () if rel not in files]
+        if missing:
+            raise SnapshotError(f"Not in snapshot {snapshot_id}: {', '.join(missing)}")
+        # Read everything before touching the directory, so a bad blob aborts cleanly
+        contents = {rel: self.read(files[rel]) for rel in (paths or files)}
+        self.snapshot(directory, label=f"Before restoring {snapshot_id}")
+        with self.lock:
+            for rel, data in contents.items():
+                _atomic_write(os.path.join(directory, rel), data)
+            if paths is None:
+                for rel in self._walk(directory):
+                    if rel not in files:
+                        os.remove(os.path.join(directory, rel))
+        return sorted(contents)
+
+    def run(self, deliver, on_done, method, *args):
+        """Call one of the methods above on a worker thread; on_done(result, error) is delivered to the UI thread"""
+        def work():
+            try:
+                result, error = method(*args), None
+            except (OSError, SnapshotError) as e:
+                result, error = None, e
+            deliver(on_done, result, error)
+        threading.Thread(target=work, daemon=True).start()
+
+
+class StateStore:
+    """Settings, favorites, stacks and battery state in one SQLite database (WAL mode).
+
+    set() only updates memory; a writer thread commits the changed keys in one transaction once
+    writes have been quiet for FLUSH_DELAY seconds, so typing in a settings field costs no disk
+    writes until it stops. Each key is its own row, so the GUI and the command line only ever
+    overwrite what they changed. The JSON files used before are imported on first open.
+    """
+    VERSION = 1
+    FLUSH_DELAY = 1.0
+    LEGACY_FILES = {"settings": APP_SETTINGS_PATH, "favorites": FAVORITES_PATH, "stacks": STACKS_PATH,
+                    "power": POWER_STATE_PATH}
+
+    def __init__(self, path=STATE_DB_PATH, flush_delay=FLUSH_DELAY, on_error=None):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.on_error = on_error
+        self.values = {}
+        self.saved = {}
+        self.pending = {}
+        self.deadline = 0.0
+        self.cond = threading.Condition()
+        # Held while a batch is taken and committed, so batches reach the database in order
+        self.commit_lock = threading.Lock()
+        self.writer = None
+        self.failing = False
+        self.db = None
+        import sqlite3
+        try:
+            self._open()
+        except (OSError, sqlite3.Error) as e:
+            # Keep working from memory; nothing is saved this session
+            self.db = None
+            self.values = self._legacy_values()
+            self._report(e)
+
+    @classmethod
+    def _legacy_values(cls):
+        legacy = {key: load_json_file(path, None) for key, path in cls.LEGACY_FILES.items()}
+        return {key: value for key, value in legacy.items() if value is not None}
+
+    @classmethod
+    def peek(cls, path=STATE_DB_PATH):
+        """Committed values for commands that only read: no migration, WAL switch or writer thread"""
+        if os.path.exists(path):
+            import sqlite3
+            try:
+                db = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True, timeout=5)
+                try:
+                    rows = db.execute("SELECT key, value FROM state").fetchall()
+                finally:
+                    db.close()
+            except sqlite3.Error:
+                pass
+            else:
+                values = {}
+                for key, text in rows:
+                    try:
+                        values[key] = json.loads(text)
+                    except ValueError:
+                        pass
+                return values
+        # Not created yet: the JSON files are what the first open would import
+        return cls._legacy_values()
+
+    def _open(self):
+        import sqlite3
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+            with self._transaction():
+                # Re-checked under the write lock in case another process migrated meanwhile
+                if self.db.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+                    self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                    for key, path in self.LEGACY_FILES.items():
+                        value = load_json_file(path, None)
+                        if value is not None:
+                            self.db.execute("INSERT OR IGNORE INTO state (key, value) VALUES (?, ?)",
+                                            (key, json.dumps(value)))
+                    self.db.execute(f"PRAGMA user_version = {self.VERSION}")
+        self.reload()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def _report(self, error):
+        # Once per run of failures, not on every retry
+        if self.on_error and not self.failing:
+            self.on_error(error)
+        self.failing = True
+
+    def reload(self):
+        """Re-read committed values, e.g. after another process changed them; unsaved changes win"""
+        if self.db is None:
+            return
+        with self.commit_lock:
+            rows = self.db.execute("SELECT key, value FROM state").fetchall()
+        with self.cond:
+            for key, text in rows:
+                if key not in self.pending and self.saved.get(key) != text:
+                    self.saved[key] = text
+                    try:
+                        self.values[key] = json.loads(text)
+                    except ValueError:
+                        self.values.pop(key, None)
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        """Record value for key; the disk write happens later on the writer thread"""
+        text = json.dumps(value)
+        with self.cond:
+            self.values[key] = value
+            if key not in self.pending and self.saved.get(key) == text:
+                return
+            self.pending[key] = text
+            self.deadline = time.monotonic() + self.flush_delay
+            if self.db is None:
+                return
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run, daemon=True)
+                self.writer.start()
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending and self.deadline > time.monotonic():
+                    self.cond.wait(self.deadline - time.monotonic())
+                if not self.pending:
+                    self.writer = None
+                    return
+            self.flush()
+
+    def flush(self):
+        """Commit pending changes now; False if they could not be written"""
+        import sqlite3
+        with self.commit_lock:
+            with self.cond:
+                batch, self.pending = self.pending, {}
+            if not batch or self.db is None:
+                return not batch
+            try:
+                with self._transaction():
+                    self.db.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", batch.items())
+            except sqlite3.Error as e:
+                with self.cond:
+                    # Retry later; anything set meanwhile is newer than the failed batch
+                    self.pending = {**batch, **self.pending}
+                    self.deadline = time.monotonic() + self.flush_delay
+                self._report(e)
+                return False
+        with self.cond:
+            self.saved.update(batch)
+        self.failing = False
+        return True
+
+    def close(self):
+        ok = self.flush()
+        if self.db is not None:
+            with self.commit_lock:
+                self.db.close()
+                self.db = None
+        return ok
+
+
+def load_json_file(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def load_library(settings=None):
+    """The shader library with the extra sources listed in settings"""
+    if settings is None:
+        settings = StateStore.peek().get("settings", {})
+    return ShaderLibrary(extra_roots=library_sources(settings))
+
+
+# --- Headless command line ---
+CLI_COMMANDS = ("apply", "next", "prev", "random", "stack", "disable", "status", "profile", "build", "dedup",
+                "snapshot")
+
+
+def _random_order(names, weights=None):
+    """names drawn one at a time by weight without repeats, so a caller can stop at the first that works"""
+    names = list(names)
+    weights = list(weights) if weights else [1.0] * len(names)
+    while names:
+        index = random.choices(range(len(names)), weights)[0]
+        weights.pop(index)
+        yield names.pop(index)
+
+
+def _pick_shader(order, library, validator=None):
+    """(name, path) of the first shader in order that can be read and doesn't fail validation"""
+    for name in order:
+        try:
+            path = library.materialize(name)
+        except OSError:
+            continue
+        # Results are cached by content hash, so a known-bad shader is skipped without recompiling
+        if validator is None or validator.validate_now(path)[0] is not False:
+            return name, path
+    return None, None
+
+
+def _resolve_shader_name(query, names):
+    if query in names:
+        return query
+    path = os.path.abspath(query)
+    if path.startswith(os.path.abspath(SHADER_DIR) + os.sep):
+        relative = os.path.relpath(path, SHADER_DIR).replace(os.sep, "/")
+        if relative in names:
+            return relative
+    lowered = query.lower()
+    for name in names:
+        if name.lower() == lowered or os.path.splitext(name)[0].lower() == lowered:
+            return name
+    # Shaders in subfolders and packs also answer to their file name alone, if it is unambiguous
+    base = os.path.basename(lowered)
+    matches = [name for name in names
+               if base in (name.rsplit("/", 1)[-1].lower(), os.path.splitext(name.rsplit("/", 1)[-1])[0].lower())]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _cli_stack(args):
+    """List, save or delete shader stacks"""
+    if not args.name:
+        stacks = StateStore.peek().get("stacks", {})
+        if not stacks:
+            print("No saved stacks. Create one with: stack NAME --set SHADER SHADER...")
+        for name, chain in sorted(stacks.items()):
+            print(f"{name}: {' -> '.join(chain)}")
+        return 0
+    store = StateStore(on_error=lambda e: print(f"Error saving stacks: {e}", file=sys.stderr))
+    stacks = store.get("stacks", {})
+    if args.delete:
+        if stacks.pop(args.name, None) is None:
+            print(f"Stack not found: {args.name}", file=sys.stderr)
+            return 1
+        message = f"Deleted stack: {args.name}"
+    else:
+        names = load_library(store.get("settings", {})).names()
+        chain = []
+        for query in args.set:
+            target = _resolve_shader_name(query, names)
+            if target is None:
+                print(f"Shader not found: {query}", file=sys.stderr)
+                return 1
+            chain.append(target)
+        if len(chain) < 2:
+            print("A stack needs at least two shaders.", file=sys.stderr)
+            return 1
+        stacks[args.name] = chain
+        message = f"Saved stack {args.name}: {' -> '.join(chain)}"
+    store.set("stacks", stacks)
+    if not store.close():
+        return 1
+    print(message)
+    return 0
+
+
+def _cli_build(args):
+    """Build shaders into the cache ahead of time and report what the optimizer saved"""
+    library = load_library()
+    names = library.names()
+    targets = []
+    for query in args.names or names:
+        target = _resolve_shader_name(query, names)
+        if target is None:
+            print(f"Shader not found: {query}", file=sys.stderr)
+            return 1
+        targets.append(target)
+    builder = ShaderBuilder()
+    failed = 0
+    for name in targets:
+        try:
+            path = library.materialize(name)
+            builder.build(path)
+        except (ShaderBuildError, OSError) as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        entry = builder.entry(path)
+        print(f"{name}: {entry['source_bytes']} -> {entry['built_bytes']} bytes, "
+              f"{len(entry['deps']) - 1} include{'s' if len(entry['deps']) != 2 else ''}")
+    return 1 if failed else 0
+
+
+def _cli_dedup(args):
+    """List copies of the same shader and optionally keep one of each"""
+    store = StateStore(on_error=lambda e: print(f"Error saving state: {e}", file=sys.stderr))
+    settings = store.get("settings", {})
+    library = load_library(settings)
+    shaders = []
+    for name in library.names():
+        meta = library.lookup(name)
+        if meta:
+            shaders.append((name, meta.get("hash"), meta.get("normalized_hash")))
+    for source in library.sources():
+        if source.writable:
+            source.index.save()
+    groups = [g for g in find_duplicates(shaders) if g["kind"] == "identical" or args.similar or not args.apply]
+    if not groups:
+        print("No duplicate shaders.")
+        return 0
+    
+    history = UsageHistory()
+    history.load()
+    favorites = set(store.get("favorites", []))
+    stacks = store.get("stacks", {})
+    config = GhosttyConfig()
+    builder = ShaderBuilder()
+    chain = [library.name_for_path(builder.source_for(path) or path) for path in config.shader_paths()]
+    power = PowerPolicy(store)
+    renames = {}
+    failed = False
+    for group in groups:
+        survivor = pick_survivor(group["names"], favorites, history, chain)
+        # Copies inside packs are read-only; a group with nothing else to delete is left alone
+        removable = [n for n in group["names"] if n != survivor and library.source_for_name(n).writable]
+        if not removable:
+            continue
+        label = "identical" if group["kind"] == "identical" else "same after normalizing comments/whitespace"
+        print(f"{survivor} ({label}): {', '.join(removable)}")
+        if not args.apply:
+            continue
+        removed, errors = consolidate_duplicates(survivor, group["names"], favorites, stacks, settings, history, power,
+                                                 library)
+        renames.update((name, survivor) for name in removed)
+        for error in errors:
+            print(f"  {error}", file=sys.stderr)
+            failed = True
+    if not args.apply:
+        return 0
+    
+    store.set("favorites", sorted(favorites))
+    store.set("stacks", stacks)
+    store.set("settings", settings)
+    if not store.close():
+        return 1
+    history.save()
+    if any(name in renames for name in chain):
+        # The active chain still named a removed copy (a stack can hold two of them)
+        try:
+            write_shader_config([library.materialize(renames.get(name, name)) for name in chain],
+                                animation=(config.get(ANIMATION_CONFIG_KEY) or [None])[-1], config=config)
+        except OSError as e:
+            print(f"Error writing Ghostty config: {e}", file=sys.stderr)
+            return 1
+        if settings.get("smart_reload", True):
+            GhosttyProcessTracker().send_signal(signal.SIGHUP)
+    print(f"Removed {len(renames)} duplicate{'s' if len(renames) != 1 else ''}.")
+    return 1 if failed else 0
+
+
+def _cli_snapshot(args):
+    """Take, list, prune or restore snapshots of the shader directory"""
+    store = SnapshotStore()
+    try:
+        if args.list:
+            snapshots = store.snapshots()
+            for manifest in snapshots:
+                when = datetime.fromtimestamp(manifest["time"]).strftime("%Y-%m-%d %H:%M")
+                print(f"{manifest['id']:<20} {when}  {len(manifest['files']):>4} files  {format_size(manifest['size']):>9}  "
+                      f"+{format_size(manifest['added_bytes']):<9} {manifest['label']}")
+            blobs, size = store.disk_usage()
+            print(f"{len(snapshots)} snapshot{'s' if len(snapshots) != 1 else ''}, {blobs} blobs, "
+                  f"{format_size(size)} on disk")
+            return 0
+        if args.restore:
+            restored = store.restore(args.restore, args.paths or None)
+            print(f"Restored {len(restored)} file{'s' if len(restored) != 1 else ''} from {args.restore}")
+            return 0
+        settings = StateStore.peek().get("settings", {})
+        if not args.prune:
+            manifest, created = store.snapshot()
+            if created:
+                print(f"Snapshot {manifest['id']}: {len(manifest['files'])} files, {manifest['added_files']} new "
+                      f"blob{'s' if manifest['added_files'] != 1 else ''} (+{format_size(manifest['added_bytes'])})")
+            else:
+                print(f"No changes since snapshot {manifest['id']}")
+        dropped = store.prune(**snapshot_retention(settings))
+        if dropped or args.prune:
+            print(f"Pruned {dropped} snapshot{'s' if dropped != 1 else ''}")
+    except (OSError, SnapshotError) as e:
+        print(f"Snapshot failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _cli_profile(args):
+    """Profile shaders sequentially in this process; results are shared with the GUI through the index"""
+    library = load_library()
+    names = library.names()
+    if args.names:
+        resolved = [_resolve_shader_name(n, names) for n in args.names]
+        missing = [n for n, r in zip(args.names, resolved) if r is None]
+        if missing:
+            print(f"Shader not found: {', '.join(missing)}", file=sys.stderr)
+            return 1
+        names = resolved
+    else:
+        # Packs are only extracted for shaders asked for by name
+        names = [name for name in names if library.source_for_name(name).writable]
+    
+    index = library.local.index
+    results = []
+    failures = 0
+    last_save = time.monotonic()
+    for done, name in enumerate(names, 1):
+        meta = library.lookup(name)
+        profile = index.derived_for(meta and meta.get("hash")).get("profile")
+        if profile is None or args.force:
+            print(f"[{done}/{len(names)}] {name}", file=sys.stderr)
+            try:
+                path = library.materialize(name)
+            except OSError as e:
+                print(f"  {e}", file=sys.stderr)
+                failures += 1
+                continue
+            content_hash, profile, error = profile_shader(path, frames=args.frames)
+            if error:
+                print(f"  {error}", file=sys.stderr)
+                if error == "moderngl is not installed":
+                    return 1
+                failures += 1
+                continue
+            index.set_derived(content_hash, profile=profile)
+            # Keep progress if a long batch is interrupted
+            if time.monotonic() - last_save > 10:
+                index.save()
+                last_save = time.monotonic()
+        results.append((name, profile))
+    index.save()
+    
+    results.sort(key=lambda r: r[1]["cost"], reverse=True)
+    if args.json:
+        print(json.dumps({name: profile for name, profile in results}))
+    else:
+        resolutions = [f"{w}x{h}" for w, h in PROFILE_RESOLUTIONS]
+        print(f"{'shader':<40} " + " ".join(f"{r + ' p50/p95 ms':>22}" for r in resolutions))
+        for name, profile in results:
+            cells = []
+            for r in resolutions:
+                stats = profile["resolutions"].get(r)
+                cells.append(f"{stats['p50']:>12.2f}/{stats['p95']:<9.2f}" if stats else f"{'-':>22}")
+            print(f"{name:<40} " + " ".join(cells))
+    return 1 if failures else 0
+
+
+def run_cli(argv):
+    """Apply, cycle or disable shaders without starting GTK, for keybindings and scripts"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="shader-switch.py",
+                                     description="Switch Ghostty shaders. Run without arguments for the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser("apply", help="apply a shader by file name")
+    apply_parser.add_argument("name")
+    next_parser = commands.add_parser("next", help="apply the next shader in alphabetical order")
+    prev_parser = commands.add_parser("prev", help="apply the previous shader in alphabetical order")
+    random_parser = commands.add_parser("random", help="apply a random shader other than the current one")
+    stack_parser = commands.add_parser("stack", help="apply, list or edit shader stacks (chains of shaders)")
+    stack_parser.add_argument("name", nargs="?", help="stack to apply (omit to list stacks)")
+    stack_edit = stack_parser.add_mutually_exclusive_group()
+    stack_edit.add_argument("--set", nargs="+", metavar="SHADER", help="save the stack as these shaders, in order")
+    stack_edit.add_argument("--delete", action="store_true", help="delete the stack")
+    for subparser in (apply_parser, next_parser, prev_parser, random_parser, stack_parser):
+        subparser.add_argument("--force", action="store_true", help="apply even if the shader fails validation")
+    commands.add_parser("disable", help="remove the custom shader from the Ghostty config")
+    status_parser = commands.add_parser("status", help="show the active shader")
+    status_parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    profile_parser = commands.add_parser("profile", help="measure render cost offscreen and store it in the shader cache")
+    profile_parser.add_argument("names", nargs="*", help="shaders to profile (default: all)")
+    profile_parser.add_argument("--frames", type=int, default=30, help="timed frames per resolution")
+    profile_parser.add_argument("--force", action="store_true", help="re-profile shaders that already have results")
+    profile_parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    build_parser = commands.add_parser("build", help="preprocess and minify shaders into the build cache")
+    build_parser.add_argument("names", nargs="*", help="shaders to build (default: all)")
+    dedup_parser = commands.add_parser("dedup", help="find copies of the same shader")
+    dedup_parser.add_argument("--apply", action="store_true",
+                              help="keep one file of each identical group and point favorites, stacks and history at it")
+    dedup_parser.add_argument("--similar", action="store_true",
+                              help="also consolidate files that differ only in comments or whitespace")
+    snapshot_parser = commands.add_parser("snapshot", help="take an incremental snapshot of the shader directory")
+    snapshot_action = snapshot_parser.add_mutually_exclusive_group()
+    snapshot_action.add_argument("--list", action="store_true", help="list snapshots and their sizes")
+    snapshot_action.add_argument("--prune", action="store_true", help="only apply the retention policy")
+    snapshot_action.add_argument("--restore", metavar="ID", help="restore a snapshot (whole directory unless paths are given)")
+    snapshot_parser.add_argument("paths", nargs="*", help="files to restore, relative to the shader directory")
+    args = parser.parse_args(argv)
+    
+    if args.command == "profile":
+        return _cli_profile(args)
+    if args.command == "build":
+        return _cli_build(args)
+    if args.command == "dedup":
+        return _cli_dedup(args)
+    if args.command == "snapshot":
+        return _cli_snapshot(args)
+    if args.command == "stack" and (not args.name or args.set or args.delete):
+        return _cli_stack(args)
+    
+    # Nothing below writes state, so the database is only read
+    state = StateStore.peek()
+    settings = state.get("settings", {})
+    library = load_library(settings)
+    builder = ShaderBuilder()
+    config = GhosttyConfig()
+    current_path = config.current_shader()
+    # Applied shaders may be builds or extracted pack members; map them back to library names
+    current = library.name_for_path(builder.source_for(current_path) or current_path) if current_path else None
+    chain = [library.name_for_path(builder.source_for(path) or path) for path in config.shader_paths()]
+    tracker = GhosttyProcessTracker()
+    history = UsageHistory()
+    
+    if args.command == "status":
+        names = library.names()
+        stack = match_stack(state.get("stacks", {}), chain)
+        if args.json:
+            pids = tracker.get_pids()
+            print(json.dumps({
+                "active": current,
+                "active_path": current_path,
+                "custom_shaders": config.shader_paths(),
+                "stack": stack,
+                "custom_shader_animation": (config.get(ANIMATION_CONFIG_KEY) or [None])[-1],
+                "shader_count": len(names),
+                "ghostty_running": bool(pids),
+                "ghostty_pids": pids,
+                "power": PowerSupply(settings.get("power_supply_root") or POWER_SUPPLY_ROOT).read(),
+            }))
+        elif len(chain) > 1:
+            print(f"{stack or 'Stack'}: {' -> '.join(chain)}")
+        else:
+            print(current or "No Active Shader")
+        return 0
+    
+    # Stepping and random picks try candidates in order; apply and stack name exactly what to use
+    targets, order = [], None
+    if args.command == "disable":
+        if not current_path:
+            print("No active shader to disable.")
+            return 0
+    else:
+        names = library.names()
+        if not names:
+            print(f"No shaders found in {SHADER_DIR}", file=sys.stderr)
+            return 1
+        if args.command == "stack":
+            targets = state.get("stacks", {}).get(args.name)
+            if not targets:
+                print(f"Stack not found: {args.name}", file=sys.stderr)
+                return 1
+            missing = [name for name in targets if name not in names]
+            if missing:
+                print(f"Stack {args.name} refers to missing shaders: {', '.join(missing)}", file=sys.stderr)
+                return 1
+        elif args.command == "apply":
+            target = _resolve_shader_name(args.name, names)
+            if target is None:
+                print(f"Shader not found: {args.name}", file=sys.stderr)
+                return 1
+        elif args.command in ("next", "prev"):
+            index = names.index(current) if current in names else -1
+            if args.command == "next":
+                order = names[index + 1:] + names[:index + 1]
+            else:
+                start = index if index >= 0 else len(names)
+                order = names[:start][::-1] + names[start:][::-1]
+        else:
+            candidates = [n for n in names if n != current] or names
+            order = _random_order(candidates, history.random_weights(candidates, random_weighting(settings)))
+        if args.command == "apply":
+            targets = [target]
+    
+    validator = None
+    if (targets or order is not None) and not args.force:
+        validator = ShaderValidator(command=ShaderValidator.resolve_command(settings.get("validator_command", "")))
+    if order is not None:
+        # Pack members are extracted here, on the way into the config
+        target, path = _pick_shader(order, library, validator)
+        if target is None:
+            print("No shader could be read and passed validation.\nUse --force to apply one anyway.", file=sys.stderr)
+            return 1
+        targets, paths = [target], [path]
+    else:
+        try:
+            paths = [library.materialize(target) for target in targets]
+        except OSError as e:
+            print(f"Cannot read shader: {e}", file=sys.stderr)
+            return 1
+        if validator is not None:
+            for target, path in zip(targets, paths):
+                valid, message = validator.validate_now(path)
+                if valid is False:
+                    print(f"{target} failed validation: {message}\nUse --force to apply it anyway.", file=sys.stderr)
+                    return 1
+    
+    animations = [shader_animation(settings, target, shader_animated(path)) for target, path in zip(targets, paths)]
+    
+    if paths and settings.get("build_shaders", False):
+        try:
+            paths = [builder.build(path) for path in paths]
+        except (ShaderBuildError, OSError) as e:
+            print(f"Build failed: {e}", file=sys.stderr)
+            return 1
+    
+    # The whole chain goes out in one write, so Ghostty reloads once
+    try:
+        write_shader_config(paths or None, animation=combine_animation(animations), config=config)
+    except OSError as e:
+        print(f"Error writing Ghostty config: {e}", file=sys.stderr)
+        return 1
+    
+    if len(targets) < 2:
+        history.record(targets[0] if targets else None)
+        history.save()
+    if settings.get("smart_reload", True):
+        tracker.send_signal(signal.SIGHUP)
+    
+    if args.command == "stack":
+        print(f"Applied stack {args.name}: {' -> '.join(targets)}")
+    else:
+        print(f"Applied shader: {targets[0]}" if targets else "Shader disabled")
+    return 0